@@ -0,0 +1,276 @@
+"""Offline benchmark suite of the scrapping, scoring and summarization stages.
+
+The scrapper requests a local server replaying the recorded paperswithcode pages and the
+summarizer uses a deterministic fake model, so the suite needs no network access and no api
+key. Every benchmark runs at several scales: a number of papers for the scrapping, parsing,
+scoring and full pipeline benchmarks, a number of copies of the sample pdf pages for the
+extraction, chunking and map reduce benchmarks.
+
+The results are written as json so two commits can be compared. Run from the root of the
+repository:
+
+    PYTHONPATH=src python -m benchmarks.bench_offline --output before.json
+    PYTHONPATH=src python -m benchmarks.bench_offline --output after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from bs4 import BeautifulSoup
+from fastapi.encoders import jsonable_encoder
+from langchain.schema.document import Document
+
+from ainewsbot.embedded import EmbeddedPaperRetrieverPipeline
+from benchmarks.fake_llm import DeterministicFakeLLM
+from benchmarks.stub_server import load_recorded_pages, serve_recorded_site
+from paperchooser.managers import BaseManager, ManagerFactory
+from scrapper.papers_with_code_scrapper import PapersWithCodeTrendingScrapper
+from summarizer.chains import MapReduceChain
+from summarizer.prompts import MapReduceNormal
+
+PAPERCHOOSER_CONFIG_PATH = Path("./src/paperchooser/config/base_chooser.yaml")
+PAPER_SCALES = (10, 50, 200)
+DOCUMENT_SCALES = (1, 10, 50)
+BENCHMARKS = ("scrape", "parse", "score", "extract", "chunk", "map_reduce", "pipeline")
+
+Benchmark = Callable[[], Any]
+
+
+class BenchmarkContext:
+    """Shared inputs of the benchmarks.
+
+    Args:
+        site_url (str): Base url of the recorded site.
+        llm (DeterministicFakeLLM): Fake model of the summarizer.
+    """
+
+    def __init__(self, site_url: str, llm: DeterministicFakeLLM) -> None:
+        """Initialize."""
+        self.site_url = site_url
+        self.llm = llm
+        self.trending_page = load_recorded_pages()["/"]
+        self.manager: BaseManager = ManagerFactory.create_class_from_config(
+            PAPERCHOOSER_CONFIG_PATH
+        )
+
+    def scrapper(self) -> PapersWithCodeTrendingScrapper:
+        """Return a scrapper of the recorded site."""
+        return PapersWithCodeTrendingScrapper(url=self.site_url)
+
+    def chain(self) -> MapReduceChain:
+        """Return a map reduce chain using the fake model."""
+        return MapReduceChain(model=self.llm, prompt=MapReduceNormal(), streaming=True)
+
+    def pdf_url(self, nb_repeats: int) -> str:
+        """Return the url of the sample pdf with its pages repeated."""
+        return f"{self.site_url}pdf/sample.pdf?repeats={nb_repeats}"
+
+    def papers(self, nb_papers: int) -> list[dict[str, Any]]:
+        """Return recorded trending papers, encoded like the scrapper api does."""
+        papers = parse_trending_page(self.trending_page)
+        return jsonable_encoder([papers[idx % len(papers)] for idx in range(nb_papers)])
+
+    def pages(self, nb_repeats: int) -> list[Document]:
+        """Return the extracted pages of the sample pdf repeated."""
+        return list(self.chain().load_document_page(self.pdf_url(nb_repeats)))
+
+
+def parse_trending_page(page: bytes) -> list[dict[str, Any]]:
+    """Parse the papers of a trending page like the scrapper does."""
+    soup = BeautifulSoup(page, "html.parser")
+    raw_papers = soup.find_all("div", {"class": "row infinite-item item paper-card"})
+    return [
+        PapersWithCodeTrendingScrapper._raw_paper_content_to_dict(paper)  # noqa: SLF001
+        for paper in raw_papers
+    ]
+
+
+def bench_scrape(context: BenchmarkContext, nb_papers: int) -> Benchmark:
+    """Fetch and parse the trending papers from the recorded site."""
+    scrapper = context.scrapper()
+    return lambda: scrapper.get_best_papers(nb_papers)
+
+
+def bench_parse(context: BenchmarkContext, nb_papers: int) -> Benchmark:
+    """Parse as many trending pages as needed for the papers, without any request."""
+    nb_pages = math.ceil(nb_papers / len(parse_trending_page(context.trending_page)))
+    return lambda: [parse_trending_page(context.trending_page) for _ in range(nb_pages)]
+
+
+def bench_score(context: BenchmarkContext, nb_papers: int) -> Benchmark:
+    """Rank the papers with the paperchooser manager."""
+    papers = context.papers(nb_papers)
+    return lambda: context.manager.rank_papers(papers)
+
+
+def bench_extract(context: BenchmarkContext, nb_repeats: int) -> Benchmark:
+    """Download the pdf and extract the text of its pages."""
+    return lambda: context.pages(nb_repeats)
+
+
+def bench_chunk(context: BenchmarkContext, nb_repeats: int) -> Benchmark:
+    """Split the extracted pages in chunks."""
+    chain = context.chain()
+    pages = context.pages(nb_repeats)
+    return lambda: list(chain.create_document_chunk(iter(pages)))
+
+
+def bench_map_reduce(context: BenchmarkContext, nb_repeats: int) -> Benchmark:
+    """Summarize the pdf, from its download to the final combine."""
+    chain = context.chain()
+    pdf_url = context.pdf_url(nb_repeats)
+    return lambda: chain.run_chain_with_usage(pdf_url)
+
+
+def bench_pipeline(context: BenchmarkContext, nb_papers: int) -> Benchmark:
+    """Run the embedded pipeline from the scrapping to the summary of the best paper."""
+
+    def run() -> Any:
+        # A new pipeline per run so the summary is not served from memory.
+        pipeline = EmbeddedPaperRetrieverPipeline(
+            nb_papers=nb_papers,
+            scrapper=context.scrapper(),
+            manager=context.manager,
+            chain=context.chain(),
+        )
+        return asyncio.run(pipeline.arun())
+
+    return run
+
+
+BENCHMARK_SETUPS: dict[str, tuple[Callable[[BenchmarkContext, int], Benchmark], str]] = {
+    "scrape": (bench_scrape, "papers"),
+    "parse": (bench_parse, "papers"),
+    "score": (bench_score, "papers"),
+    "extract": (bench_extract, "pdf_repeats"),
+    "chunk": (bench_chunk, "pdf_repeats"),
+    "map_reduce": (bench_map_reduce, "pdf_repeats"),
+    "pipeline": (bench_pipeline, "papers"),
+}
+
+
+def time_benchmark(benchmark: Benchmark, nb_runs: int) -> list[float]:
+    """Return the durations of the runs of a benchmark, after a warm up run."""
+    benchmark()
+    durations = []
+    for _ in range(nb_runs):
+        start = time.perf_counter()
+        benchmark()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def run_suite(
+    context: BenchmarkContext,
+    names: list[str],
+    paper_scales: list[int],
+    document_scales: list[int],
+    nb_runs: int,
+) -> Iterator[dict[str, Any]]:
+    """Yield the result of every benchmark at every scale."""
+    for name in names:
+        setup, unit = BENCHMARK_SETUPS[name]
+        scales = paper_scales if unit == "papers" else document_scales
+        for scale in scales:
+            durations = time_benchmark(setup(context, scale), nb_runs)
+            yield {
+                "benchmark": name,
+                "unit": unit,
+                "scale": scale,
+                "nb_runs": nb_runs,
+                "mean_seconds": statistics.mean(durations),
+                "p50_seconds": statistics.median(durations),
+                "min_seconds": min(durations),
+                "max_seconds": max(durations),
+            }
+
+
+def git_commit() -> Optional[str]:
+    """Return the current commit, None outside of a git repository."""
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],  # noqa: S603, S607
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+def compare(results: list[dict[str, Any]], baseline: dict[str, Any]) -> None:
+    """Print the p50 of every result relative to the same benchmark in a baseline."""
+    baseline_p50 = {
+        (result["benchmark"], result["scale"]): result["p50_seconds"]
+        for result in baseline["results"]
+    }
+    print(f"Compared to {baseline.get('commit')} (p50 ratio, lower is faster):")  # noqa: T201
+    for result in results:
+        before = baseline_p50.get((result["benchmark"], result["scale"]))
+        if before:
+            ratio = result["p50_seconds"] / before
+            print(f"{result['benchmark']:>12} {result['scale']:>6}: {ratio:6.2f}x")  # noqa: T201
+
+
+def main() -> None:
+    """Run the benchmark suite."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--benchmarks", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("--paper-scales", nargs="+", type=int, default=list(PAPER_SCALES))
+    parser.add_argument("--document-scales", nargs="+", type=int, default=list(DOCUMENT_SCALES))
+    parser.add_argument("--nb-runs", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds per call.")
+    parser.add_argument("--llm-seconds-per-token", type=float, default=0.0)
+    parser.add_argument("--completion-tokens", type=int, default=100)
+    parser.add_argument("--output", type=Path, help="Json file of the results.")
+    parser.add_argument("--compare", type=Path, help="Json results of a previous run.")
+    args = parser.parse_args()
+
+    llm = DeterministicFakeLLM(
+        latency_seconds=args.llm_latency,
+        seconds_per_completion_token=args.llm_seconds_per_token,
+        completion_tokens=args.completion_tokens,
+    )
+    # Two recorded trending papers miss attributes, their warnings would flood the output.
+    logging.disable(logging.WARNING)
+    results = []
+    with serve_recorded_site() as site_url:
+        context = BenchmarkContext(site_url, llm)
+        for result in run_suite(
+            context, args.benchmarks, args.paper_scales, args.document_scales, args.nb_runs
+        ):
+            print(  # noqa: T201
+                f"{result['benchmark']:>12} {result['scale']:>6} {result['unit']:<11} "
+                f"p50 {result['p50_seconds'] * 1000:10.2f}ms  "
+                f"mean {result['mean_seconds'] * 1000:10.2f}ms",
+                flush=True,
+            )
+            results.append(result)
+
+    report = {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "llm": llm.model_dump(),
+        "results": results,
+    }
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if args.compare is not None:
+        compare(results, json.loads(args.compare.read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
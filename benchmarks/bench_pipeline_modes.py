@@ -0,0 +1,195 @@
+"""Compare the http and embedded modes of the paper retriever pipeline.
+
+The http mode runs against the real scrapper, paperchooser and summarizer apps served in process
+through an ASGI transport, so the measured difference is the cost of the http and json round
+trips and of the summary job polling. The scrapping and the summarization are faked.
+
+Run from the root of the repository:
+
+    PYTHONPATH=src python -m benchmarks.bench_pipeline_modes --nb-runs 20
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import statistics
+import tempfile
+import time
+from collections.abc import Awaitable
+from pathlib import Path
+from typing import Any, Callable
+from unittest import mock
+
+import httpx
+
+from ainewsbot.embedded import EmbeddedPaperRetrieverPipeline
+from ainewsbot.pipeline import PaperRetrieverPipeline
+from paperchooser.managers import ManagerFactory
+from scrapper.papers_with_code_scrapper import PapersWithCodeTrendingScrapper
+from summarizer.chains import BaseChain
+
+SCRAPPER_URL = "http://scrapper:8000"
+PAPERCHOOSER_URL = "http://paperchooser:8000"
+SUMMARIZER_URL = "http://summarizer:8000"
+PAPERCHOOSER_CONFIG_PATH = Path("./src/paperchooser/config/base_chooser.yaml")
+
+
+class FakeChain(BaseChain):
+    """Chain returning a summary after a fixed latency."""
+
+    latency_seconds: float = 0.0
+
+    def run_chain(self, pdf_url: str) -> str:
+        """Return a fake summary."""
+        time.sleep(self.latency_seconds)
+        return f"Summary of {pdf_url}"
+
+
+class FakePaperScrapper:
+    """Paper scrapper returning the info of a paper without any request."""
+
+    def __init__(self, paper_url_path: str) -> None:
+        """Initialize."""
+        self.paper_url_path = paper_url_path
+
+    def get_all_paper_info(self) -> dict[str, Any]:
+        """Return fake paper info."""
+        return fake_paper_info(self.paper_url_path)
+
+
+def fake_paper_info(paper_url_path: str) -> dict[str, Any]:
+    """Return the fake info of a paper."""
+    return {
+        "pdf_url": f"https://arxiv.org/pdf/{paper_url_path}.pdf",
+        "official implementation": f"https://github.com/{paper_url_path}",
+        "abstract": "An abstract. " * 50,
+    }
+
+
+def fake_trending_papers(nb_papers: int) -> list[dict[str, Any]]:
+    """Return fake trending papers."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return [
+        {
+            "Title": f"Paper {idx}",
+            "URL": f"/paper/paper-{idx}",
+            "Publication date": now - datetime.timedelta(days=idx % 7),
+            "Stars": 10 * idx,
+            "Stars per hour": float(idx % 13),
+        }
+        for idx in range(nb_papers)
+    ]
+
+
+async def time_runs(run: Callable[[int], Awaitable[dict[str, Any]]], nb_runs: int) -> Any:
+    """Return the durations and the result of the runs."""
+    durations = []
+    result: dict[str, Any] = {}
+    for run_id in range(nb_runs):
+        start = time.perf_counter()
+        result = await run(run_id)
+        durations.append(time.perf_counter() - start)
+    return durations, result
+
+
+async def bench_http(nb_runs: int, nb_papers: int, tmp_dir: Path) -> Any:
+    """Time the pipeline calling the service apps through http."""
+    os.environ["JOBS_DB_PATH"] = str(tmp_dir / "jobs.sqlite")
+    from paperchooser.api import app as paperchooser_app
+    from scrapper.api import app as scrapper_app
+    from summarizer import api as summarizer_api
+    from summarizer.jobs import SQLiteJobStore
+
+    apps = {"scrapper": scrapper_app, "paperchooser": paperchooser_app}
+    apps["summarizer"] = summarizer_api.app
+
+    async def services_app(scope: dict[str, Any], receive: Any, send: Any) -> None:
+        host = dict(scope["headers"])[b"host"].decode().split(":")[0]
+        await apps[host](scope, receive, send)
+
+    pipeline = PaperRetrieverPipeline(
+        summarizer_url=SUMMARIZER_URL,
+        scrapper_url=SCRAPPER_URL,
+        paperchooser_url=PAPERCHOOSER_URL,
+        nb_papers=nb_papers,
+        summary_poll_interval_seconds=0.01,
+    )
+    summarizer_api.app.state.chain = FakeChain()
+    job_queue = summarizer_api.create_job_queue()
+    job_queue.start()
+    summarizer_api.app.state.job_queue = job_queue
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=services_app)) as client:
+
+            async def run(run_id: int) -> dict[str, Any]:
+                # A new store per run so every summary is computed.
+                job_queue.store = SQLiteJobStore(db_path=tmp_dir / f"jobs-{run_id}.sqlite")
+                return await pipeline.arun(client)
+
+            with mock.patch(
+                "scrapper.routers.trending_papers.PapersWithCodePaperScrapper", FakePaperScrapper
+            ):
+                return await time_runs(run, nb_runs)
+    finally:
+        job_queue.stop(timeout=10)
+
+
+async def bench_embedded(nb_runs: int, nb_papers: int) -> Any:
+    """Time the pipeline calling the services in process."""
+    manager = ManagerFactory.create_class_from_config(PAPERCHOOSER_CONFIG_PATH)
+
+    async def run(run_id: int) -> dict[str, Any]:
+        # A new pipeline per run so every summary is computed.
+        pipeline = EmbeddedPaperRetrieverPipeline(
+            nb_papers=nb_papers, manager=manager, chain=FakeChain()
+        )
+        return await pipeline.arun()
+
+    with mock.patch.object(
+        EmbeddedPaperRetrieverPipeline,
+        "_scrap_paper_info",
+        staticmethod(lambda paper_url_path, url: fake_paper_info(paper_url_path)),
+    ):
+        return await time_runs(run, nb_runs)
+
+
+def report(mode: str, durations: list[float]) -> None:
+    """Print the statistics of the durations of a mode."""
+    print(  # noqa: T201
+        f"{mode:>9}: mean {statistics.mean(durations) * 1000:8.2f}ms  "
+        f"p50 {statistics.median(durations) * 1000:8.2f}ms  "
+        f"max {max(durations) * 1000:8.2f}ms"
+    )
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nb-runs", type=int, default=20)
+    parser.add_argument("--nb-papers", type=int, default=20)
+    args = parser.parse_args()
+
+    with mock.patch.object(
+        PapersWithCodeTrendingScrapper,
+        "get_best_papers",
+        lambda self, nb_papers: fake_trending_papers(nb_papers),
+    ), tempfile.TemporaryDirectory() as tmp_dir:
+        http_durations, http_result = asyncio.run(
+            bench_http(args.nb_runs, args.nb_papers, Path(tmp_dir))
+        )
+        embedded_durations, embedded_result = asyncio.run(
+            bench_embedded(args.nb_runs, args.nb_papers)
+        )
+
+    if http_result != embedded_result:
+        msg = f"The modes disagree: {http_result} != {embedded_result}"
+        raise AssertionError(msg)
+    report("http", http_durations)
+    report("embedded", embedded_durations)
+    speedup = statistics.median(http_durations) / statistics.median(embedded_durations)
+    print(f"Embedded mode is {speedup:.1f}x faster (p50).")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Cold start benchmark of the summarizer service.
+
+Every run starts a new python process which imports the summarizer api, runs its startup
+events through a test client and sends a first summary request. The model calls go to the
+local fake of the openai api and the pdf is served by the recorded site, so no api key is
+needed. The token encoding is loaded by tiktoken from its cache, set TIKTOKEN_CACHE_DIR to a
+directory holding it when there is no network access, otherwise the first request fails and
+only the import and startup durations are meaningful.
+
+The results are written as json so two commits can be compared. Run from the root of the
+repository:
+
+    PYTHONPATH=src python -m benchmarks.bench_startup --output before.json
+    PYTHONPATH=src python -m benchmarks.bench_startup --warmup --output after.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+import yaml
+
+SUMMARIZER_CONFIG_PATH = Path("./src/summarizer/config/base.yaml")
+PHASES = ("import_seconds", "startup_seconds", "first_request_seconds")
+DEFERRED_MODULES = (
+    "langchain",
+    "openai",
+    "tiktoken",
+    "pypdf",
+    "azure.identity",
+    "azure.keyvault",
+)
+
+
+def measure_cold_start(pdf_url: str) -> dict[str, Any]:
+    """Import and start the summarizer api, then summarize a pdf, in the current process.
+
+    Args:
+        pdf_url (str): Url of the pdf of the first request.
+
+    Returns:
+        dict[str, Any]: Duration of every phase, the status of the first request and the slow
+            dependencies imported by the api module.
+    """
+    start = time.perf_counter()
+    from summarizer import api
+
+    imported = time.perf_counter()
+    imported_modules = [name for name in DEFERRED_MODULES if name in sys.modules]
+    from fastapi.testclient import TestClient
+
+    client_imported = time.perf_counter()
+    with TestClient(api.app, raise_server_exceptions=False) as client:
+        started = time.perf_counter()
+        response = client.post("/summarize", params={"paper_url": pdf_url})
+        answered = time.perf_counter()
+    return {
+        "import_seconds": imported - start,
+        "startup_seconds": started - client_imported,
+        "first_request_seconds": answered - started,
+        "first_request_status": response.status_code,
+        "imported_modules": imported_modules,
+    }
+
+
+def write_offline_config(config_path: Path) -> None:
+    """Write the summarizer config without the keyvault, the key is given by the environment.
+
+    The text store and the chunk checkpoints are removed so every run downloads, extracts and
+    summarizes the pdf.
+    """
+    config = yaml.safe_load(SUMMARIZER_CONFIG_PATH.read_text(encoding="utf-8"))
+    config["model-parameters"] = {}
+    config["chain-parameters"].pop("text_store", None)
+    config["chain-parameters"].pop("chunk_checkpoints", None)
+    config_path.write_text(yaml.safe_dump(config), encoding="utf-8")
+
+
+def run_cold_starts(nb_runs: int, warmup: bool) -> list[dict[str, Any]]:
+    """Return the measures of new processes starting the summarizer.
+
+    Args:
+        nb_runs (int): Number of processes.
+        warmup (bool): Warm up the chain at startup.
+
+    Returns:
+        list[dict[str, Any]]: Measures of every process, with its total duration.
+    """
+    # The servers import pypdf, the measured processes must not import them.
+    from benchmarks.fake_openai import serve_fake_openai
+    from benchmarks.stub_server import serve_recorded_site
+
+    measures = []
+    with tempfile.TemporaryDirectory() as tmp_dir, serve_recorded_site() as site_url:
+        config_path = Path(tmp_dir) / "summarizer.yaml"
+        write_offline_config(config_path)
+        with serve_fake_openai() as (api_base, _):
+            for run_id in range(nb_runs):
+                env = {
+                    **os.environ,
+                    "OPENAI_API_KEY": "fake-key",
+                    "OPENAI_API_BASE": api_base,
+                    "SUMMARIZER_CONFIG_PATH": str(config_path),
+                    "SUMMARIZER_WARMUP": "1" if warmup else "0",
+                    "JOBS_DB_PATH": str(Path(tmp_dir) / f"jobs-{run_id}.sqlite"),
+                }
+                start = time.perf_counter()
+                output = subprocess.run(
+                    [  # noqa: S603
+                        sys.executable,
+                        "-m",
+                        "benchmarks.bench_startup",
+                        "--measure",
+                        f"{site_url}pdf/sample.pdf",
+                    ],
+                    capture_output=True,
+                    check=True,
+                    env=env,
+                    text=True,
+                )
+                measure = json.loads(output.stdout.splitlines()[-1])
+                measure["process_seconds"] = time.perf_counter() - start
+                measures.append(measure)
+    return measures
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nb-runs", type=int, default=5)
+    parser.add_argument("--warmup", action="store_true", help="Warm up the chain at startup.")
+    parser.add_argument("--output", type=Path, help="Json file of the results.")
+    parser.add_argument("--measure", metavar="PDF_URL", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure is not None:
+        print(json.dumps(measure_cold_start(args.measure)))  # noqa: T201
+        return
+
+    measures = run_cold_starts(args.nb_runs, args.warmup)
+    summary = {
+        phase: statistics.median(measure[phase] for measure in measures)
+        for phase in (*PHASES, "process_seconds")
+    }
+    for phase, seconds in summary.items():
+        print(f"{phase:>22}: {seconds * 1000:10.2f}ms (p50)")  # noqa: T201
+    statuses = sorted({measure["first_request_status"] for measure in measures})
+    print(f"First request status: {statuses}")  # noqa: T201
+    print(f"Slow modules imported by the api: {measures[0]['imported_modules']}")  # noqa: T201
+    if args.output is not None:
+        report = {"warmup": args.warmup, "p50": summary, "runs": measures}
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Deterministic fake model for the offline benchmarks."""
+
+import hashlib
+import time
+from typing import Any, ClassVar
+
+from summarizer.models.base_model import BaseLLM
+from summarizer.usage import check_token_budget, has_token_budget, record_llm_call
+
+
+class DeterministicFakeLLM(BaseLLM):
+    """Fake model answering with words of its prompt after a simulated latency.
+
+    The answer only depends on the prompt, so two runs give the same summaries. The tokens are
+    estimated from the number of words, the calls are recorded in the token usage like the GPT
+    models do.
+
+    Attributes:
+        latency_seconds (float): Fixed latency of a call.
+        seconds_per_completion_token (float): Generation time of a completion token.
+        completion_tokens (int): Number of tokens of every completion.
+        tokens_per_word (float): Number of tokens counted for a word.
+    """
+
+    max_token: ClassVar[int] = 16000
+    name: ClassVar[str] = "Deterministic fake LLM"
+
+    latency_seconds: float = 0.0
+    seconds_per_completion_token: float = 0.0
+    completion_tokens: int = 100
+    tokens_per_word: float = 1.3
+
+    def predict(self, prompt: Any) -> str:
+        """Return the completion of the prompt."""
+        text = prompt if isinstance(prompt, str) else "\n".join(m["content"] for m in prompt)
+        prompt_tokens = self.count_tokens(text)
+        if has_token_budget():
+            check_token_budget(prompt_tokens)
+        time.sleep(
+            self.latency_seconds + self.seconds_per_completion_token * self.completion_tokens
+        )
+        completion = self._complete(text)
+        record_llm_call(self.name, prompt_tokens, self.count_tokens(completion))
+        return completion
+
+    def random_predict(self, prompt: Any) -> str:
+        """Return the completion of the prompt, the fake model has no randomness."""
+        return self.predict(prompt)
+
+    @property
+    def token_encoding(self) -> str:
+        """Get the name of the estimation, the counts depend on the tokens per word."""
+        return f"words-{self.tokens_per_word}"
+
+    def count_tokens(self, prompt: str) -> int:
+        """Return the estimated number of tokens of a text."""
+        return int(len(prompt.split()) * self.tokens_per_word)
+
+    def _complete(self, text: str) -> str:
+        """Return words of the text, starting at an offset given by its hash."""
+        words = text.split() or ["empty"]
+        offset = int(hashlib.sha256(text.encode()).hexdigest(), 16) % len(words)
+        nb_words = max(1, int(self.completion_tokens / self.tokens_per_word))
+        return " ".join(words[(offset + idx) % len(words)] for idx in range(nb_words))
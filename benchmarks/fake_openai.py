@@ -0,0 +1,203 @@
+"""Local fake of the OpenAI chat completions endpoint enforcing rate limits.
+
+The endpoint replenishes its requests and tokens capacities continuously like the api does and
+answers 429 with a Retry-After header once a capacity is exhausted, so the scheduler of the
+model calls can be tested and measured without network access. Server errors can be injected for
+the first calls. The completion is a fixed text and the tokens are counted as words, a streamed
+completion is sent one word per server-sent event.
+
+Point openai at the endpoint:
+
+    with serve_fake_openai(requests_per_minute=60) as (api_base, state):
+        openai.api_base = api_base
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+
+COMPLETION = "This paper presents a fake summary."
+
+
+class FakeOpenAIState:
+    """Limits and counters of the fake endpoint, shared by the request handlers.
+
+    Args:
+        requests_per_minute (Optional[int]): Maximum number of requests per period.
+        tokens_per_minute (Optional[int]): Maximum number of tokens per period.
+        period_seconds (float): Duration of the period of the limits.
+        server_errors (list[int]): Status codes answered to the first requests.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        period_seconds: float = 60.0,
+        server_errors: Optional[list[int]] = None,
+    ) -> None:
+        """Initialize."""
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.period_seconds = period_seconds
+        self.server_errors = deque(server_errors or [])
+        self.nb_requests = 0
+        self.nb_completions = 0
+        self.nb_rate_limited = 0
+        self.api_keys: set[str] = set()
+        self._available_requests = float(requests_per_minute or 0)
+        self._available_tokens = float(tokens_per_minute or 0)
+        self._refilled_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def admit(self, nb_tokens: int) -> tuple[int, float]:
+        """Return the status code of a request and the seconds before it could be retried."""
+        with self._lock:
+            self.nb_requests += 1
+            if self.server_errors:
+                return self.server_errors.popleft(), 0.0
+            self._refill()
+            retry_after = 0.0
+            if self.requests_per_minute is not None and self._available_requests < 1:
+                rate = self.requests_per_minute / self.period_seconds
+                retry_after = max(retry_after, (1 - self._available_requests) / rate)
+            if self.tokens_per_minute is not None and self._available_tokens < nb_tokens:
+                rate = self.tokens_per_minute / self.period_seconds
+                retry_after = max(retry_after, (nb_tokens - self._available_tokens) / rate)
+            if retry_after:
+                self.nb_rate_limited += 1
+                return 429, retry_after
+            self._available_requests -= 1
+            self._available_tokens -= nb_tokens
+            self.nb_completions += 1
+            return 200, 0.0
+
+    def _refill(self) -> None:
+        """Replenish the capacities for the time elapsed since the last refill."""
+        now = time.monotonic()
+        elapsed, self._refilled_at = now - self._refilled_at, now
+        if self.requests_per_minute is not None:
+            self._available_requests = min(
+                float(self.requests_per_minute),
+                self._available_requests + elapsed * self.requests_per_minute / self.period_seconds,
+            )
+        if self.tokens_per_minute is not None:
+            self._available_tokens = min(
+                float(self.tokens_per_minute),
+                self._available_tokens + elapsed * self.tokens_per_minute / self.period_seconds,
+            )
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Request handler of the chat completions route."""
+
+    def __init__(self, *args: Any, state: FakeOpenAIState, **kwargs: Any) -> None:
+        """Initialize."""
+        self.state = state
+        super().__init__(*args, **kwargs)
+
+    def do_POST(self) -> None:  # noqa: N802
+        """Answer a chat completion request."""
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.state.api_keys.add(self.headers.get("Authorization", "").removeprefix("Bearer "))
+        prompt_tokens = sum(len(message["content"].split()) for message in body["messages"])
+        completion_tokens = len(COMPLETION.split())
+        status, retry_after = self.state.admit(prompt_tokens + completion_tokens)
+        if status == 200 and body.get("stream"):  # noqa: PLR2004
+            self._send_stream(body["model"])
+        elif status == 200:  # noqa: PLR2004
+            self._send(
+                status,
+                {
+                    "object": "chat.completion",
+                    "model": body["model"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": COMPLETION},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                },
+            )
+        elif status == 429:  # noqa: PLR2004
+            error = {"message": "Rate limit reached.", "type": "requests", "code": None}
+            self._send(status, {"error": error}, retry_after=retry_after)
+        else:
+            error = {"message": "The server had an error.", "type": "server_error", "code": None}
+            self._send(status, {"error": error})
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        """Do not log the requests."""
+
+    def _send_stream(self, model: str) -> None:
+        """Send the completion as a stream of chunks, one word per chunk."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        words = COMPLETION.split(" ")
+        for index, word in enumerate(words):
+            content = word if index == 0 else f" {word}"
+            chunk = {
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def _send(self, status: int, payload: dict[str, Any], retry_after: float = 0.0) -> None:
+        """Send a json response."""
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if retry_after:
+            self.send_header("Retry-After", f"{retry_after:.3f}")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@contextmanager
+def serve_fake_openai(
+    requests_per_minute: Optional[int] = None,
+    tokens_per_minute: Optional[int] = None,
+    period_seconds: float = 60.0,
+    server_errors: Optional[list[int]] = None,
+) -> Iterator[tuple[str, FakeOpenAIState]]:
+    """Serve the fake endpoint on a free local port.
+
+    Args:
+        requests_per_minute (Optional[int]): Maximum number of requests per period.
+        tokens_per_minute (Optional[int]): Maximum number of tokens per period.
+        period_seconds (float): Duration of the period of the limits.
+        server_errors (Optional[list[int]]): Status codes answered to the first requests.
+
+    Yields:
+        tuple[str, FakeOpenAIState]: Api base of the endpoint and its counters.
+    """
+    state = FakeOpenAIState(requests_per_minute, tokens_per_minute, period_seconds, server_errors)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(FakeOpenAIHandler, state=state))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/v1", state
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
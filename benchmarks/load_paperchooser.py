@@ -0,0 +1,141 @@
+"""Load test of the paperchooser managers and api on a synthetic corpus.
+
+The corpus is streamed by requests of a fixed number of papers. Every request is sent to the
+manager in process and to the /selection/ranker and /selection/best routes through a test
+client, so the api numbers include the json validation and encoding. A second pass on a single
+request measures the peak memory of a call with tracemalloc, which would slow the timed pass.
+
+Run from the root of the repository:
+
+    PYTHONPATH=src python -m benchmarks.load_paperchooser --scales 1000 100000 --output load.json
+"""
+
+import argparse
+import json
+import logging
+import resource
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+from fastapi.testclient import TestClient
+
+from benchmarks.synthetic_papers import generate_papers
+from paperchooser.managers import BaseManager, ManagerFactory
+
+PAPERCHOOSER_CONFIG_PATH = Path("./src/paperchooser/config/base_chooser.yaml")
+SCALES = (1_000, 10_000, 100_000)
+TARGETS = ("manager.rank_papers", "manager.get_best_paper", "api.ranker", "api.best")
+
+Target = Callable[[list[dict[str, Any]]], Any]
+
+
+def create_targets(manager: BaseManager) -> dict[str, Target]:
+    """Return the functions sending a request of papers to every target."""
+    from paperchooser.api import app
+
+    client = TestClient(app)
+
+    def post(route: str) -> Target:
+        def send(papers: list[dict[str, Any]]) -> Any:
+            response = client.post(route, json=papers)
+            response.raise_for_status()
+            return response.json()
+
+        return send
+
+    return {
+        "manager.rank_papers": manager.rank_papers,
+        "manager.get_best_paper": manager.get_best_paper,
+        "api.ranker": post("/selection/ranker"),
+        "api.best": post("/selection/best"),
+    }
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Return a percentile of values by nearest rank.
+
+    Examples:
+        >>> percentile([1.0, 2.0, 3.0, 4.0], 0.5)
+        2.0
+        >>> percentile([1.0, 2.0, 3.0, 4.0], 0.99)
+        4.0
+    """
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def peak_call_memory(target: Target, papers: list[dict[str, Any]]) -> int:
+    """Return the peak of memory allocated by a call, in bytes."""
+    tracemalloc.start()
+    try:
+        target(papers)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def load_test(target: Target, nb_papers: int, request_size: int, seed: int) -> dict[str, Any]:
+    """Send a synthetic corpus to a target by requests and return the statistics."""
+    latencies = []
+    first_request: list[dict[str, Any]] = []
+    for papers in generate_papers(nb_papers, seed=seed, batch_size=request_size):
+        first_request = first_request or papers
+        start = time.perf_counter()
+        target(papers)
+        latencies.append(time.perf_counter() - start)
+    return {
+        "nb_requests": len(latencies),
+        "papers_per_second": nb_papers / sum(latencies),
+        "p50_seconds": statistics.median(latencies),
+        "p99_seconds": percentile(latencies, 0.99),
+        "max_seconds": max(latencies),
+        "peak_call_memory_bytes": peak_call_memory(target, first_request),
+    }
+
+
+def main() -> None:
+    """Run the load test."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", nargs="+", type=int, default=list(SCALES))
+    parser.add_argument("--request-size", type=int, default=1000, help="Papers per request.")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=list(TARGETS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Json file of the results.")
+    args = parser.parse_args()
+
+    # The papers missing attributes are logged one by one.
+    logging.disable(logging.WARNING)
+    manager = ManagerFactory.create_class_from_config(PAPERCHOOSER_CONFIG_PATH)
+    targets = create_targets(manager)
+    results = []
+    for name in args.targets:
+        for nb_papers in args.scales:
+            result = {
+                "target": name,
+                "nb_papers": nb_papers,
+                "request_size": args.request_size,
+                **load_test(targets[name], nb_papers, args.request_size, args.seed),
+            }
+            print(  # noqa: T201
+                f"{name:>22} {nb_papers:>9} papers: {result['papers_per_second']:>10.0f} papers/s"
+                f"  p50 {result['p50_seconds'] * 1000:8.2f}ms"
+                f"  p99 {result['p99_seconds'] * 1000:8.2f}ms"
+                f"  peak {result['peak_call_memory_bytes'] / 1024:8.0f}KiB",
+                flush=True,
+            )
+            results.append(result)
+
+    max_rss_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Peak resident memory of the process: {max_rss_mib:.0f}MiB")  # noqa: T201
+    if args.output is not None:
+        report = {"max_rss_mib": max_rss_mib, "results": results}
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Local http server replaying the recorded paperswithcode pages.
+
+The pages are read from the vcr cassettes of the scrapper tests, any cassette added to the
+fixtures directory is replayed too. Every trending page number returns the recorded trending
+page, and a paper page which was not recorded returns the default recorded paper page, so the
+scrapper can be run at any scale. The arxiv pdf links of the paper pages are rewritten to the
+server, which serves the sample pdf of the summarizer tests with its pages repeated, by default
+nb_pdf_repeats times or as many times as the repeats query parameter.
+"""
+
+import gzip
+import io
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+import yaml
+from pypdf import PdfReader, PdfWriter
+
+CASSETTES_DIR = Path("tests/scrapper/papers_with_code_scrapper/fixtures/vcr_cassettes")
+SAMPLE_PDF_PATH = Path("tests/summarizer/fixtures/sample_paper.pdf")
+DEFAULT_PAPER_PATH = "/paper/dreamgaussian-generative-gaussian-splatting"
+ARXIV_PDF_URL = b"https://arxiv.org/pdf/"
+
+
+def load_recorded_pages(cassettes_dir: Path = CASSETTES_DIR) -> dict[str, bytes]:
+    """Return the bodies of the recorded successful GET requests by url path.
+
+    Args:
+        cassettes_dir (Path): Directory of the vcr cassettes.
+
+    Returns:
+        dict[str, bytes]: Decompressed body of every recorded page.
+    """
+    pages = {}
+    for cassette_path in sorted(cassettes_dir.glob("*.yaml")):
+        cassette = yaml.safe_load(cassette_path.read_text(encoding="utf-8"))
+        for interaction in cassette["interactions"]:
+            request, response = interaction["request"], interaction["response"]
+            if request["method"] != "GET" or response["status"]["code"] != 200:  # noqa: PLR2004
+                continue
+            body = response["body"]["string"]
+            if isinstance(body, str):
+                body = body.encode()
+            if "gzip" in response["headers"].get("Content-Encoding", []):
+                body = gzip.decompress(body)
+            pages.setdefault(urlsplit(request["uri"]).path, body)
+    return pages
+
+
+@lru_cache(maxsize=16)
+def repeated_sample_pdf(nb_repeats: int) -> bytes:
+    """Return a pdf made of the pages of the sample pdf repeated several times.
+
+    Args:
+        nb_repeats (int): Number of copies of the pages.
+
+    Returns:
+        bytes: The new pdf.
+    """
+    reader = PdfReader(SAMPLE_PDF_PATH)
+    writer = PdfWriter()
+    for _ in range(nb_repeats):
+        for page in reader.pages:
+            writer.add_page(page)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+class RecordedSiteHandler(BaseHTTPRequestHandler):
+    """Request handler serving the recorded pages and the sample pdf."""
+
+    def __init__(
+        self, *args: Any, pages: dict[str, bytes], nb_pdf_repeats: int, **kwargs: Any
+    ) -> None:
+        """Initialize."""
+        self.pages = pages
+        self.nb_pdf_repeats = nb_pdf_repeats
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self) -> None:  # noqa: N802
+        """Serve a page, a paper page or the pdf."""
+        url = urlsplit(self.path)
+        path = url.path
+        if path.startswith("/pdf/"):
+            nb_repeats = int(parse_qs(url.query).get("repeats", [self.nb_pdf_repeats])[0])
+            self._send(repeated_sample_pdf(nb_repeats), "application/pdf")
+        elif path.startswith("/paper/"):
+            page = self.pages.get(path, self.pages[DEFAULT_PAPER_PATH])
+            base_url = f"http://{self.headers['Host']}/pdf/".encode()
+            self._send(page.replace(ARXIV_PDF_URL, base_url), "text/html")
+        elif path in self.pages:
+            self._send(self.pages[path], "text/html")
+        else:
+            self.send_error(404)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        """Do not log the requests."""
+
+    def _send(self, body: bytes, content_type: str) -> None:
+        """Send a successful response."""
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@contextmanager
+def serve_recorded_site(nb_pdf_repeats: int = 1) -> Iterator[str]:
+    """Serve the recorded site on a free local port.
+
+    Args:
+        nb_pdf_repeats (int): Default number of copies of the pages of the sample pdf.
+
+    Yields:
+        str: Base url of the site, ending with a slash like the scrapper urls.
+    """
+    handler = partial(
+        RecordedSiteHandler,
+        pages=load_recorded_pages(),
+        nb_pdf_repeats=nb_pdf_repeats,
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
@@ -0,0 +1,102 @@
+"""Generator of synthetic trending papers for the paperchooser load tests.
+
+The papers have the keys of the scrapper output, encoded like the scrapper api does, so they
+can be given to the paperchooser managers and api. The stars follow a heavy tailed lognormal
+distribution, most papers are a few days old and a fraction of the papers miss one of the
+scored attributes like badly parsed scrapper pages. The papers are generated by numpy batches
+so millions of papers can be streamed without holding the corpus in memory.
+
+Write a corpus as json lines from the root of the repository:
+
+    PYTHONPATH=src python -m benchmarks.synthetic_papers --nb-papers 1000000 --output papers.jsonl
+"""
+
+import argparse
+import datetime
+import json
+import sys
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+
+TITLE_WORDS = (
+    "Efficient", "Scalable", "Diffusion", "Transformers", "Learning", "Language", "Models",
+    "Vision", "Graph", "Neural", "Networks", "Reinforcement", "Self-Supervised", "Sparse",
+    "Attention", "Generative", "Retrieval", "Augmented", "Robust", "Multimodal", "Agents",
+)  # fmt: skip
+MAX_AGE_DAYS = 30
+SCORED_KEYS = ("Publication date", "Stars", "Stars per hour")
+
+
+def generate_papers(
+    nb_papers: int,
+    seed: int = 0,
+    missing_rate: float = 0.01,
+    batch_size: int = 10_000,
+    now: Optional[datetime.datetime] = None,
+) -> Iterator[list[dict[str, Any]]]:
+    """Yield batches of synthetic papers.
+
+    Args:
+        nb_papers (int): Total number of papers.
+        seed (int): Seed of the random generator, the same seed gives the same papers.
+        missing_rate (float): Fraction of the papers missing one scored attribute.
+        batch_size (int): Number of papers of a batch.
+        now (Optional[datetime.datetime]): Time of the generation, defaults to now.
+
+    Yields:
+        list[dict[str, Any]]: Papers of the batch.
+    """
+    rng = np.random.default_rng(seed)
+    now = (now or datetime.datetime.now(datetime.timezone.utc)).astimezone(datetime.timezone.utc)
+    now_seconds = np.datetime64(now.replace(tzinfo=None), "s")
+    for batch_start in range(0, nb_papers, batch_size):
+        size = min(batch_size, nb_papers - batch_start)
+        # Most papers are recent, the age is exponential and capped.
+        age_hours = np.minimum(rng.exponential(72.0, size), MAX_AGE_DAYS * 24) + 1
+        stars = rng.lognormal(mean=3.0, sigma=1.5, size=size).astype(np.int64)
+        stars_per_hour = np.round(stars / age_hours * rng.uniform(0.5, 1.5, size), 2)
+        dates = now_seconds - (age_hours * 3600).astype("timedelta64[s]")
+        iso_dates = np.datetime_as_string(dates, unit="s", timezone="UTC")
+        is_missing = rng.random(size) < missing_rate
+        missing_keys = rng.integers(len(SCORED_KEYS), size=size)
+        title_words = rng.integers(len(TITLE_WORDS), size=(size, 4))
+
+        batch = []
+        for idx in range(size):
+            paper_id = batch_start + idx
+            paper = {
+                "Title": " ".join(TITLE_WORDS[word] for word in title_words[idx]),
+                "URL": f"/paper/synthetic-paper-{paper_id}",
+                "Publication date": str(iso_dates[idx]),
+                "Stars": int(stars[idx]),
+                "Stars per hour": float(stars_per_hour[idx]),
+            }
+            if is_missing[idx]:
+                del paper[SCORED_KEYS[missing_keys[idx]]]
+            batch.append(paper)
+        yield batch
+
+
+def main() -> None:
+    """Write a synthetic corpus as json lines."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nb-papers", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--missing-rate", type=float, default=0.01)
+    parser.add_argument("--output", type=Path, help="Json lines file, defaults to stdout.")
+    args = parser.parse_args()
+
+    output = sys.stdout if args.output is None else args.output.open("w", encoding="utf-8")
+    try:
+        for batch in generate_papers(args.nb_papers, args.seed, args.missing_rate):
+            output.writelines(json.dumps(paper) + "\n" for paper in batch)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 """ainewsbot package."""
 from ainewsbot.api import app
+from ainewsbot.daily_paper import DailyPaperService, JSONResultStore
 from ainewsbot.pipeline import PaperRetrieverPipeline
 
-__all__ = ["app", "PaperRetrieverPipeline"]
+__all__ = ["app", "DailyPaperService", "JSONResultStore", "PaperRetrieverPipeline"]
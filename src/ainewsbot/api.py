@@ -1,32 +1,95 @@
 """ainewsbot REST API."""
 
 import logging
+import os
+from collections.abc import AsyncGenerator, AsyncIterator
+from datetime import time
+from pathlib import Path
 from typing import Any
 
 import coloredlogs
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Query
+from fastapi.responses import StreamingResponse
 
-from ainewsbot.pipeline import PaperRetrieverPipeline
+from ainewsbot.checkpoints import StageCheckpointStore
+from ainewsbot.daily_paper import DailyPaperService, JSONResultStore
+from ainewsbot.pipeline import PaperRetrieverPipeline, encode_sse
+from telemetry import instrument_app
 
 app = FastAPI()
+instrument_app(app)
 SUMMARIZER_URL = "http://summarizer:8000"
 SCRAPPER_URL = "http://scrapper:8000"
 EVALUATOR_URL = "http://paperchooser:8000"
+PIPELINE_MODE = os.environ.get("PIPELINE_MODE", "http")
+DAILY_PAPER_DIR = Path(os.environ.get("DAILY_PAPER_DIR", "./daily_papers"))
+DAILY_PAPER_RUN_AT = time.fromisoformat(os.environ.get("DAILY_PAPER_RUN_AT", "06:00"))
+DAILY_PAPER_STALE_WHILE_REVALIDATE = (
+    os.environ.get("DAILY_PAPER_STALE_WHILE_REVALIDATE", "false").lower() == "true"
+)
+PIPELINE_CHECKPOINT_DIR = Path(os.environ.get("PIPELINE_CHECKPOINT_DIR", "./pipeline_checkpoints"))
+SPECULATIVE_TOP_N = int(os.environ.get("SPECULATIVE_TOP_N", "3"))
+SPECULATIVE_BUDGET_USD = float(os.environ.get("SPECULATIVE_BUDGET_USD", "0.05"))
+
+
+def create_pipeline(mode: str) -> PaperRetrieverPipeline:
+    """Return the pipeline of the given mode.
+
+    Args:
+        mode (str): "http" to call the services apis, "embedded" to run the services in this
+            process.
+
+    Returns:
+        PaperRetrieverPipeline: The pipeline.
+    """
+    checkpoint_store = StageCheckpointStore(directory=PIPELINE_CHECKPOINT_DIR)
+    if mode == "http":
+        return PaperRetrieverPipeline(
+            summarizer_url=SUMMARIZER_URL,
+            scrapper_url=SCRAPPER_URL,
+            paperchooser_url=EVALUATOR_URL,
+            checkpoint_store=checkpoint_store,
+            speculative_top_n=SPECULATIVE_TOP_N,
+            speculative_budget_usd=SPECULATIVE_BUDGET_USD,
+        )
+    if mode == "embedded":
+        # The services packages are only needed, and installed, in embedded mode.
+        from ainewsbot.embedded import EmbeddedPaperRetrieverPipeline
 
-pipeline = PaperRetrieverPipeline(
-    summarizer_url=SUMMARIZER_URL, scrapper_url=SCRAPPER_URL, paperchooser_url=EVALUATOR_URL
+        return EmbeddedPaperRetrieverPipeline(
+            checkpoint_store=checkpoint_store,
+            speculative_top_n=SPECULATIVE_TOP_N,
+            speculative_budget_usd=SPECULATIVE_BUDGET_USD,
+        )
+    msg = f"Unknown pipeline mode {mode}, expected http or embedded."
+    raise ValueError(msg)
+
+
+pipeline = create_pipeline(PIPELINE_MODE)
+daily_paper = DailyPaperService(
+    pipeline=pipeline,
+    store=JSONResultStore(directory=DAILY_PAPER_DIR),
+    run_at=DAILY_PAPER_RUN_AT,
+    stale_while_revalidate=DAILY_PAPER_STALE_WHILE_REVALIDATE,
 )
 
 
 @app.on_event("startup")
-def startup_event() -> None:
+async def startup_event() -> None:
     """Run API startup events."""
     # Remove all handlers associated with the root logger object.
     for handler in logging.root.handlers:
         logging.root.removeHandler(handler)
     # Add coloredlogs' coloured StreamHandler to the root logger.
     coloredlogs.install()
+    daily_paper.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event() -> None:
+    """Run API shutdown events."""
+    await daily_paper.stop()
 
 
 @app.get("/")
@@ -36,10 +99,51 @@ def read_root() -> str:
 
 
 @app.get("/daily_paper")
-def get_daily_paper() -> dict[str, Any]:
-    """Read root."""
-    out = pipeline.run()
-    return out
+async def get_daily_paper() -> dict[str, Any]:
+    """Return the paper of the day, computed once a day by the scheduler."""
+    return await daily_paper.get()
+
+
+@app.get("/daily_paper/stream")
+async def stream_daily_paper() -> StreamingResponse:
+    """Stream the progress of the paper of the day as server-sent events.
+
+    A paper of the day not computed yet is computed while its progress is streamed: a paper
+    event with the best paper, the progress events of its summary and the tokens of the
+    summary. The last event is done, with what /daily_paper returns, or error. The streams and
+    the requests made meanwhile share the same run.
+    """
+    return StreamingResponse(_encode_events(daily_paper.stream()), media_type="text/event-stream")
+
+
+async def _encode_events(events: AsyncGenerator[dict[str, Any], None]) -> AsyncIterator[str]:
+    """Encode the events as server-sent events, a failure is sent as an error event.
+
+    The events are closed as soon as the client disconnects, so the run is cancelled if no one
+    else awaits it.
+    """
+    try:
+        async for event in events:
+            yield encode_sse(event)
+    except Exception as e:
+        # The status of the response is already sent, the failure is the last event.
+        logging.exception("Stream of the daily paper failed.")
+        yield encode_sse({"event": "error", "data": {"detail": str(e)}})
+    finally:
+        await events.aclose()
+
+
+@app.get("/digest")
+async def get_digest(nb_papers: int = Query(5, ge=1)) -> dict[str, Any]:
+    """Return the info and summary of the best trending papers.
+
+    Args:
+        nb_papers (int): Number of papers of the digest.
+
+    Returns:
+        dict[str, Any]: Papers of the digest, best first, and the urls of the failed papers.
+    """
+    return await pipeline.arun_digest(nb_papers)
 
 
 def main() -> None:
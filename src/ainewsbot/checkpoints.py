@@ -0,0 +1,118 @@
+"""This module implements the checkpoints of the pipeline stages.
+
+A run failing late, on a summary time out for instance, is usually retried the same day. The
+result of every completed stage is kept so the retry resumes from the first stage which did
+not complete, instead of scraping and scoring the papers again.
+"""
+
+import hashlib
+import json
+import logging
+import shutil
+from datetime import date
+from pathlib import Path
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+
+class StageCheckpoint(BaseModel):
+    """The result of a completed stage.
+
+    Attributes:
+        result (Any): Result of the stage.
+    """
+
+    result: Any
+
+
+class StageCheckpointStore(BaseModel):
+    """This store keeps the results of the stages in json files, one directory per day.
+
+    A result is keyed by the day of the run, the name of the stage and the hash of its inputs,
+    so a stage is resumed only if the stages it depends on gave the same results. A stage
+    without inputs, like the scraping of the trending papers, is resumed for the whole day.
+
+    Attributes:
+        directory (Path): Directory of the days directories.
+    """
+
+    directory: Path
+
+    def get(self, day: date, stage: str, inputs_hash: str) -> Optional[StageCheckpoint]:
+        """Return the result of a stage.
+
+        Args:
+            day (date): Day of the run.
+            stage (str): Name of the stage.
+            inputs_hash (str): Hash of the inputs of the stage.
+
+        Returns:
+            Optional[StageCheckpoint]: The result, None if the stage did not complete.
+        """
+        path = self._path(day, stage, inputs_hash)
+        if not path.exists():
+            return None
+        return StageCheckpoint.model_validate_json(path.read_text(encoding="utf-8"))
+
+    def put(self, day: date, stage: str, inputs_hash: str, result: Any) -> None:
+        """Store the result of a stage, a result which is not json is not stored.
+
+        Args:
+            day (date): Day of the run.
+            stage (str): Name of the stage.
+            inputs_hash (str): Hash of the inputs of the stage.
+            result (Any): Result of the stage.
+        """
+        try:
+            content = json.dumps({"result": result})
+        except TypeError:
+            logging.warning("Result of stage %s is not json, it is not checkpointed.", stage)
+            return
+        path = self._path(day, stage, inputs_hash)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(content, encoding="utf-8")
+        tmp_path.replace(path)
+
+    def prune(self, before: date) -> None:
+        """Delete the checkpoints of the days before a day, the other directories are kept.
+
+        Args:
+            before (date): First day kept.
+        """
+        if not self.directory.exists():
+            return
+        for day_directory in self.directory.iterdir():
+            if not day_directory.is_dir():
+                continue
+            try:
+                day = date.fromisoformat(day_directory.name)
+            except ValueError:
+                logging.warning("Skipping %s, it is not a checkpoint day.", day_directory)
+                continue
+            if day < before:
+                shutil.rmtree(day_directory)
+
+    def _path(self, day: date, stage: str, inputs_hash: str) -> Path:
+        """Return the path of the result of a stage."""
+        return self.directory / day.isoformat() / f"{stage}-{inputs_hash}.json"
+
+
+def hash_inputs(inputs: dict[str, Any]) -> str:
+    """Return the hash of the inputs of a stage.
+
+    Args:
+        inputs (dict[str, Any]): Results of the dependencies of the stage by name.
+
+    Returns:
+        str: Hexadecimal sha256 of the inputs.
+
+    Examples:
+        >>> hash_inputs({"a": 1, "b": [2]}) == hash_inputs({"b": [2], "a": 1})
+        True
+        >>> hash_inputs({"a": 1}) == hash_inputs({"a": 2})
+        False
+    """
+    content = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(content.encode()).hexdigest()
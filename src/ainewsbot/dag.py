@@ -0,0 +1,203 @@
+"""This module implements a small asyncio executor for a DAG of pipeline stages."""
+
+import asyncio
+import logging
+import time
+from datetime import date
+from typing import Any, Awaitable, Callable, Optional
+
+from pydantic import BaseModel, Field
+
+from ainewsbot.checkpoints import StageCheckpointStore, hash_inputs
+from ainewsbot.exceptions import StageTimeOutError
+from telemetry import REGISTRY, span
+
+
+class Stage(BaseModel):
+    """A stage of a pipeline DAG.
+
+    Attributes:
+        name (str): Unique name of the stage, its result is given to the dependent stages
+            under this name.
+        func (Callable[..., Awaitable[Any]]): Coroutine function called with the results of the
+            dependencies as keyword arguments.
+        dependencies (list[str]): Names of the stages which must be completed first.
+        timeout_seconds (Optional[float]): Maximum duration of the stage.
+        checkpoint (bool): Resume the stage from its checkpoint if the run has a checkpoint
+            store, and checkpoint its result.
+        required (bool): Fail the run if the stage fails. A stage which only speeds up the
+            run is not required: its failure or time out is logged and its result is None.
+    """
+
+    name: str
+    func: Callable[..., Awaitable[Any]]
+    dependencies: list[str] = Field(default_factory=list)
+    timeout_seconds: Optional[float] = None
+    checkpoint: bool = True
+    required: bool = True
+
+
+class StageTiming(BaseModel):
+    """Timing of a completed stage.
+
+    Attributes:
+        name (str): Name of the stage.
+        start_seconds (float): Start of the stage relative to the start of the run.
+        duration_seconds (float): Duration of the stage.
+        resumed (bool): Whether the result was read from a checkpoint.
+    """
+
+    name: str
+    start_seconds: float
+    duration_seconds: float
+    resumed: bool = False
+
+
+class DAGRun(BaseModel):
+    """Outputs of a DAG run.
+
+    Attributes:
+        results (dict[str, Any]): Result of every stage by name.
+        timings (list[StageTiming]): Timing of every stage in completion order.
+    """
+
+    results: dict[str, Any]
+    timings: list[StageTiming]
+
+    @property
+    def duration_seconds(self) -> float:
+        """Return the duration of the whole run."""
+        return max(
+            (timing.start_seconds + timing.duration_seconds for timing in self.timings),
+            default=0.0,
+        )
+
+
+async def run_dag(
+    stages: list[Stage],
+    checkpoint_store: Optional[StageCheckpointStore] = None,
+    run_day: Optional[date] = None,
+) -> DAGRun:
+    """Run every stage as soon as its dependencies are completed.
+
+    Independent stages run concurrently. If a stage fails, the stages still running are
+    cancelled and the error is raised. With a checkpoint store, a stage which completed
+    earlier in the day with the same inputs is not run again, its result is read instead.
+
+    Args:
+        stages (list[Stage]): Stages of the DAG.
+        checkpoint_store (Optional[StageCheckpointStore]): Store of the stage results.
+        run_day (Optional[date]): Day of the run, required with a checkpoint store.
+
+    Returns:
+        DAGRun: Results and timings of the stages.
+    """
+    _check_dag(stages)
+    if checkpoint_store is not None and run_day is None:
+        msg = "A run with a checkpoint store needs a run day."
+        raise ValueError(msg)
+
+    run_start = time.perf_counter()
+    timings: list[StageTiming] = []
+    tasks: dict[str, asyncio.Task[Any]] = {}
+
+    async def run_stage(stage: Stage) -> Any:
+        inputs = {name: await tasks[name] for name in stage.dependencies}
+        stage_start = time.perf_counter()
+        inputs_hash = None
+        if checkpoint_store is not None and run_day is not None and stage.checkpoint:
+            inputs_hash = hash_inputs(inputs)
+            checkpoint = checkpoint_store.get(run_day, stage.name, inputs_hash)
+            if checkpoint is not None:
+                REGISTRY.increment("pipeline_checkpoint_hits_total", stage=stage.name)
+                timings.append(
+                    StageTiming(
+                        name=stage.name,
+                        start_seconds=stage_start - run_start,
+                        duration_seconds=time.perf_counter() - stage_start,
+                        resumed=True,
+                    )
+                )
+                logging.info("Stage %s resumed from its checkpoint.", stage.name)
+                return checkpoint.result
+        completed, result = await _call_stage(stage, inputs)
+        if not completed:
+            return None
+        if checkpoint_store is not None and run_day is not None and inputs_hash is not None:
+            checkpoint_store.put(run_day, stage.name, inputs_hash, result)
+        duration = time.perf_counter() - stage_start
+        timings.append(
+            StageTiming(
+                name=stage.name,
+                start_seconds=stage_start - run_start,
+                duration_seconds=duration,
+            )
+        )
+        logging.info("Stage %s done in %.3fs.", stage.name, duration)
+        return result
+
+    for stage in stages:
+        tasks[stage.name] = asyncio.create_task(run_stage(stage), name=stage.name)
+    try:
+        await asyncio.gather(*tasks.values())
+    finally:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+    return DAGRun(
+        results={name: task.result() for name, task in tasks.items()},
+        timings=timings,
+    )
+
+
+async def _call_stage(stage: Stage, inputs: dict[str, Any]) -> tuple[bool, Any]:
+    """Run a stage within its time out.
+
+    Args:
+        stage (Stage): The stage.
+        inputs (dict[str, Any]): Results of the dependencies of the stage by name.
+
+    Returns:
+        tuple[bool, Any]: Whether the stage completed and its result, None if a stage which
+            is not required failed.
+    """
+    try:
+        with span(f"pipeline.{stage.name}"):
+            return True, await asyncio.wait_for(stage.func(**inputs), stage.timeout_seconds)
+    except Exception as e:  # noqa: BLE001
+        if stage.required and isinstance(e, asyncio.TimeoutError):
+            msg = f"Stage {stage.name} took more than {stage.timeout_seconds}s."
+            raise StageTimeOutError(msg) from e
+        if stage.required:
+            raise
+        REGISTRY.increment("pipeline_optional_stage_failures_total", stage=stage.name)
+        logging.warning("Optional stage %s failed.", stage.name, exc_info=True)
+        return False, None
+
+
+def _check_dag(stages: list[Stage]) -> None:
+    """Check that the dependencies exist and do not form a cycle.
+
+    Args:
+        stages (list[Stage]): Stages of the DAG.
+    """
+    dependencies = {stage.name: stage.dependencies for stage in stages}
+    for name, stage_dependencies in dependencies.items():
+        missing = [
+            dependency for dependency in stage_dependencies if dependency not in dependencies
+        ]
+        if missing:
+            msg = f"Stage {name} depends on unknown stages {missing}."
+            raise ValueError(msg)
+
+    done: set[str] = set()
+    while len(done) < len(dependencies):
+        ready = {
+            name
+            for name, stage_dependencies in dependencies.items()
+            if name not in done and done.issuperset(stage_dependencies)
+        }
+        if not ready:
+            msg = f"Stages {sorted(set(dependencies) - done)} have cyclic dependencies."
+            raise ValueError(msg)
+        done |= ready
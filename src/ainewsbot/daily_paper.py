@@ -0,0 +1,238 @@
+"""This module implements the scheduled and cached computation of the daily paper."""
+
+import asyncio
+import json
+import logging
+from collections.abc import AsyncGenerator
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+from pydantic import BaseModel, PrivateAttr
+
+from ainewsbot.exceptions import SummaryFailedError
+from ainewsbot.pipeline import PaperRetrieverPipeline
+
+
+class JSONResultStore(BaseModel):
+    """This store keeps one json file per day in a local directory.
+
+    Attributes:
+        directory (Path): Directory of the json files.
+    """
+
+    directory: Path
+
+    def get(self, day: date) -> Optional[dict[str, Any]]:
+        """Return the result of a day.
+
+        Args:
+            day (date): Day of the result.
+
+        Returns:
+            Optional[dict[str, Any]]: The result, None if the day was not computed.
+        """
+        path = self._path(day)
+        if not path.exists():
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def put(self, day: date, result: dict[str, Any]) -> None:
+        """Store the result of a day, replacing the previous one atomically.
+
+        Args:
+            day (date): Day of the result.
+            result (dict[str, Any]): The result.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path(day).with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(result), encoding="utf-8")
+        tmp_path.replace(self._path(day))
+
+    def latest(self) -> Optional[tuple[date, dict[str, Any]]]:
+        """Return the most recent result.
+
+        Returns:
+            Optional[tuple[date, dict[str, Any]]]: Day and result, None if the store is empty.
+        """
+        days = sorted(date.fromisoformat(path.stem) for path in self.directory.glob("*.json"))
+        if not days:
+            return None
+        result = self.get(days[-1])
+        return None if result is None else (days[-1], result)
+
+    def _path(self, day: date) -> Path:
+        """Return the path of the result of a day."""
+        return self.directory / f"{day.isoformat()}.json"
+
+
+class DailyPaperService(BaseModel):
+    """This service computes the daily paper once a day and serves it from memory.
+
+    A scheduler runs the pipeline every day at run_at (UTC) and persists the result, the latest
+    result is kept in memory so requests are answered without any api call. A request for a
+    day not computed yet starts the pipeline, concurrent requests share the same run.
+
+    Attributes:
+        pipeline (PaperRetrieverPipeline): Pipeline computing the daily paper.
+        store (JSONResultStore): Persistent store of the daily results.
+        run_at (time): Time of the day (UTC) at which the scheduler runs the pipeline.
+        stale_while_revalidate (bool): If set, a request for a day not computed yet gets the
+            previous result while the new one is computed in the background.
+    """
+
+    pipeline: PaperRetrieverPipeline
+    store: JSONResultStore
+    run_at: time = time(hour=6)
+    stale_while_revalidate: bool = False
+
+    _latest: Optional[tuple[date, dict[str, Any]]] = PrivateAttr(default=None)
+    _in_flight: Optional[asyncio.Task[dict[str, Any]]] = PrivateAttr(default=None)
+    _in_flight_awaited: bool = PrivateAttr(default=False)
+    _subscribers: set[asyncio.Queue[Optional[dict[str, Any]]]] = PrivateAttr(default_factory=set)
+    _scheduler: Optional[asyncio.Task[None]] = PrivateAttr(default=None)
+
+    def start(self) -> None:
+        """Load the latest stored result and start the scheduler in the running loop."""
+        self._latest = self.store.latest()
+        self._scheduler = asyncio.create_task(self._schedule(), name="daily-paper-scheduler")
+
+    async def stop(self) -> None:
+        """Stop the scheduler and the run in progress."""
+        tasks = [task for task in (self._scheduler, self._in_flight) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._scheduler = None
+        self._in_flight = None
+
+    async def get(self) -> dict[str, Any]:
+        """Return the paper of the day.
+
+        Returns:
+            dict[str, Any]: Info of the best paper with its summary.
+        """
+        if self._latest is not None:
+            day, result = self._latest
+            if day == self.today():
+                return result
+            if self.stale_while_revalidate:
+                self.refresh()
+                return result
+        return await asyncio.shield(self.refresh())
+
+    async def stream(self) -> AsyncGenerator[dict[str, Any], None]:
+        """Yield the progress of the paper of the day, then the paper.
+
+        The paper of the day already computed is yielded as a single done event. Otherwise the
+        stream subscribes to the run in progress, or starts a streamed run of the pipeline, and
+        relays its events as they come. The streamed run is the run in progress of the day:
+        the requests and the streams made meanwhile share it. It is cancelled when its last
+        stream disconnects, unless a request or the scheduler awaits it.
+
+        Yields:
+            dict[str, Any]: The events of the run, the last one is done with the info of the
+                best paper and its summary.
+        """
+        if self._latest is not None and self._latest[0] == self.today():
+            yield {"event": "done", "data": self._latest[1]}
+            return
+        if self._in_flight is None or self._in_flight.done():
+            self._in_flight = asyncio.create_task(self._stream_run(self.today()))
+            self._in_flight.add_done_callback(_log_failure)
+            self._in_flight_awaited = False
+        run = self._in_flight
+        events: asyncio.Queue[Optional[dict[str, Any]]] = asyncio.Queue()
+        self._subscribers.add(events)
+        run.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+            yield {"event": "done", "data": run.result()}
+        finally:
+            self._subscribers.discard(events)
+            if not self._subscribers and not self._in_flight_awaited and not run.done():
+                logging.info("Last stream of the daily paper disconnected, cancelling its run.")
+                run.cancel()
+
+    def refresh(self) -> asyncio.Task[dict[str, Any]]:
+        """Start a run of the pipeline for today, or return the run already in progress.
+
+        Returns:
+            asyncio.Task[dict[str, Any]]: The run computing the paper of the day.
+        """
+        if self._in_flight is None or self._in_flight.done():
+            self._in_flight = asyncio.create_task(self._run(self.today()))
+            self._in_flight.add_done_callback(_log_failure)
+        self._in_flight_awaited = True
+        return self._in_flight
+
+    @staticmethod
+    def today() -> date:
+        """Return the current day (UTC)."""
+        return datetime.now(timezone.utc).date()
+
+    async def _run(self, day: date) -> dict[str, Any]:
+        """Run the pipeline and store its result as the result of the day."""
+        result = await self.pipeline.arun()
+        self._store(day, result)
+        return result
+
+    def _store(self, day: date, result: dict[str, Any]) -> None:
+        """Store a result as the result of the day."""
+        self.store.put(day, result)
+        self._latest = (day, result)
+        if self.pipeline.checkpoint_store is not None:
+            self.pipeline.checkpoint_store.prune(before=day)
+
+    async def _stream_run(self, day: date) -> dict[str, Any]:
+        """Run the pipeline, sending its progress to the streams, and store its result."""
+        async for event in self.pipeline.astream_run():
+            if event["event"] != "done":
+                for subscriber in self._subscribers:
+                    subscriber.put_nowait(event)
+                continue
+            result: dict[str, Any] = event["data"]
+            self._store(day, result)
+            return result
+        msg = "Stream of the daily paper ended without paper."
+        raise SummaryFailedError(msg)
+
+    async def _schedule(self) -> None:
+        """Run the pipeline every day at run_at unless the day was already computed."""
+        while True:
+            await asyncio.sleep(seconds_until(self.run_at, datetime.now(timezone.utc)))
+            if self._latest is not None and self._latest[0] == self.today():
+                continue
+            try:
+                await asyncio.shield(self.refresh())
+            except Exception:
+                logging.exception("Scheduled run of the daily paper failed.")
+
+
+def seconds_until(run_at: time, now: datetime) -> float:
+    """Return the number of seconds from now to the next occurrence of a time of the day.
+
+    Args:
+        run_at (time): Time of the day, in the timezone of now.
+        now (datetime): Current time.
+
+    Returns:
+        float: Number of seconds to wait.
+
+    Examples:
+        >>> seconds_until(time(hour=6), datetime(2024, 1, 1, 5, 30))
+        1800.0
+        >>> seconds_until(time(hour=6), datetime(2024, 1, 1, 6, 0))
+        86400.0
+    """
+    next_run = datetime.combine(now.date(), run_at, tzinfo=now.tzinfo)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+def _log_failure(task: asyncio.Task[dict[str, Any]]) -> None:
+    """Log the error of a failed run, which may not be awaited by anyone."""
+    if not task.cancelled() and task.exception() is not None:
+        logging.error("Run of the daily paper failed.", exc_info=task.exception())
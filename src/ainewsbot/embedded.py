@@ -0,0 +1,245 @@
+"""This module implements the pipeline running the services in the same process."""
+
+import asyncio
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Any, Optional
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+from pydantic import Field, PrivateAttr
+
+from ainewsbot.exceptions import SummaryFailedError
+from ainewsbot.pipeline import PaperRetrieverPipeline
+from paperchooser.managers import BaseManager, ManagerFactory
+from scrapper.papers_with_code_scrapper import (
+    PapersWithCodePaperScrapper,
+    PapersWithCodeTrendingScrapper,
+)
+from summarizer.chains import BaseChain, ChainFactory
+
+PAPERCHOOSER_CONFIG_PATH = Path("./src/paperchooser/config/base_chooser.yaml")
+SUMMARIZER_CONFIG_PATH = Path("./src/summarizer/config/base.yaml")
+
+
+class EmbeddedPaperRetrieverPipeline(PaperRetrieverPipeline):
+    """This pipeline calls the scrapper, the manager and the chain directly instead of the apis.
+
+    It runs the same stages as PaperRetrieverPipeline without any http call or json round trip,
+    for small deployments and batch jobs. The blocking scrapping and summarization calls run in
+    threads. The latest summaries are kept in memory, so a paper is summarized once per process
+    while it is trending and the speculative summaries are reused like the summarizer jobs.
+
+    Args:
+        paperchooser_config_path (Path): Config of the manager, used if manager is not set.
+        summarizer_config_path (Path): Config of the chain, used if chain is not set.
+        scrapper (PapersWithCodeTrendingScrapper): Scrapper of the trending papers.
+        manager (Optional[BaseManager]): Manager choosing the papers, built on first use.
+        chain (Optional[BaseChain]): Chain summarizing the papers, built on first use.
+        max_cached_summaries (int): Number of summaries kept in memory, the least recently
+            used summary is dropped first.
+    """
+
+    summarizer_url: str = ""
+    paperchooser_url: str = ""
+    scrapper_url: str = ""
+    paperchooser_config_path: Path = PAPERCHOOSER_CONFIG_PATH
+    summarizer_config_path: Path = SUMMARIZER_CONFIG_PATH
+    scrapper: PapersWithCodeTrendingScrapper = Field(default_factory=PapersWithCodeTrendingScrapper)
+    manager: Optional[BaseManager] = None
+    chain: Optional[BaseChain] = None
+    max_cached_summaries: int = 64
+
+    _summaries: OrderedDict[str, str] = PrivateAttr(default_factory=OrderedDict)
+    _summary_tasks: dict[str, asyncio.Task[str]] = PrivateAttr(default_factory=dict)
+
+    def get_manager(self) -> BaseManager:
+        """Return the manager, building it from its config on first use."""
+        if self.manager is None:
+            self.manager = ManagerFactory.create_class_from_config(self.paperchooser_config_path)
+        return self.manager
+
+    def get_chain(self) -> BaseChain:
+        """Return the chain, building it from its config on first use."""
+        if self.chain is None:
+            self.chain = ChainFactory.build_chain_from_yaml(self.summarizer_config_path)
+        return self.chain
+
+    def create_client(self) -> httpx.AsyncClient:
+        """Return a client refusing any request, this pipeline does not call the apis."""
+        return httpx.AsyncClient(transport=httpx.MockTransport(_refuse_request), trust_env=False)
+
+    async def aget_papers(self, client: httpx.AsyncClient, nb_papers: int = 20) -> Any:
+        """This method scrap the trending papers.
+
+        The papers are encoded like the scrapper api does, so the dates are iso strings in
+        both modes.
+
+        Args:
+            client (httpx.AsyncClient): Unused.
+            nb_papers (int, optional): Number of papers. Defaults to 20.
+
+        Returns:
+            list[dict[str, Any]]: Trending papers.
+        """
+        papers = await asyncio.to_thread(self.scrapper.get_best_papers, nb_papers)
+        return jsonable_encoder(papers)
+
+    async def ascore_papers(self, client: httpx.AsyncClient, papers: list[dict[str, Any]]) -> Any:
+        """This method get the best paper from the manager.
+
+        Args:
+            client (httpx.AsyncClient): Unused.
+            papers (list[dict[str, Any]]): Candidate papers.
+
+        Returns:
+            dict[str, Any]: The best paper.
+        """
+        return await asyncio.to_thread(lambda: self.get_manager().get_best_paper(papers))
+
+    async def arank_papers(self, client: httpx.AsyncClient, papers: list[dict[str, Any]]) -> Any:
+        """This method rank the papers with the manager.
+
+        Args:
+            client (httpx.AsyncClient): Unused.
+            papers (list[dict[str, Any]]): Candidate papers.
+
+        Returns:
+            list[dict[str, Any]]: Papers ordered by increasing score.
+        """
+        return await asyncio.to_thread(lambda: self.get_manager().rank_papers(papers))
+
+    async def aget_all_info(self, client: httpx.AsyncClient, paper_url: str) -> Any:
+        """This returns full paper info."""
+        return await asyncio.to_thread(self._scrap_paper_info, paper_url[1:], self.scrapper.url)
+
+    async def asubmit_summary(self, client: httpx.AsyncClient, paper_url: str) -> Any:
+        """This method start the summary of a paper in the background.
+
+        Args:
+            client (httpx.AsyncClient): Unused.
+            paper_url (str): Url of the paper pdf.
+
+        Returns:
+            dict[str, Any]: The summarization job.
+        """
+        self._get_summary_task(paper_url)
+        return self._summary_job(paper_url)
+
+    async def afind_summary_job(self, client: httpx.AsyncClient, paper_url: str) -> Any:
+        """This method get the summarization job of a paper without starting it.
+
+        Args:
+            client (httpx.AsyncClient): Unused.
+            paper_url (str): Url of the paper pdf.
+
+        Returns:
+            Optional[dict[str, Any]]: The running or done job of the paper, None if there is
+                none.
+        """
+        if paper_url not in self._summaries and paper_url not in self._summary_tasks:
+            return None
+        return self._summary_job(paper_url)
+
+    async def aget_summary(self, client: httpx.AsyncClient, paper_url: str) -> Any:
+        """This method get the summary of a paper, sharing the summary already in progress.
+
+        Args:
+            client (httpx.AsyncClient): Unused.
+            paper_url (str): Url of the paper pdf.
+
+        Returns:
+            str: Summary of the paper.
+        """
+        summary = self._get_cached_summary(paper_url)
+        if summary is not None:
+            return summary
+        try:
+            return await asyncio.shield(self._get_summary_task(paper_url))
+        except Exception as e:  # noqa: BLE001
+            msg = f"Summary of {paper_url} failed: {e}"
+            raise SummaryFailedError(msg) from e
+
+    async def astream_summary(
+        self, client: httpx.AsyncClient, paper_url: str
+    ) -> AsyncIterator[dict[str, Any]]:
+        """This method stream the events of the summary of a paper from the chain.
+
+        A paper already summarized is yielded as a single done event, the streamed summary is
+        kept like the other summaries.
+
+        Args:
+            client (httpx.AsyncClient): Unused.
+            paper_url (str): Url of the paper pdf.
+
+        Yields:
+            dict[str, Any]: The events of the summary, as dicts with an event and its data.
+        """
+        summary = self._get_cached_summary(paper_url)
+        if summary is not None:
+            yield {"event": "done", "data": {"summary": summary}}
+            return
+        events = self.get_chain().stream_chain_with_usage(paper_url)
+        while (event := await asyncio.to_thread(next, events, None)) is not None:
+            if event.event == "done":
+                self._cache_summary(paper_url, event.data["summary"])
+            yield event.model_dump()
+
+    def _get_summary_task(self, paper_url: str) -> asyncio.Task[str]:
+        """Return the task summarizing a paper, starting it if needed."""
+        task = self._summary_tasks.get(paper_url)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.create_task(self._summarize(paper_url))
+            task.add_done_callback(lambda done: self._store_summary(paper_url, done))
+            self._summary_tasks[paper_url] = task
+        return task
+
+    async def _summarize(self, paper_url: str) -> str:
+        """Return the summary of a paper, recording its cost for the speculation budget."""
+        result = await asyncio.to_thread(self.get_chain().run_chain_with_usage, paper_url)
+        self.record_summary_cost(result.usage.cost_usd)
+        return result.summary
+
+    def _store_summary(self, paper_url: str, task: asyncio.Task[str]) -> None:
+        """Keep the summary of a finished task, a failed summary is retried on next request."""
+        if self._summary_tasks.get(paper_url) is task:
+            del self._summary_tasks[paper_url]
+        if not task.cancelled() and task.exception() is None:
+            self._cache_summary(paper_url, task.result())
+
+    def _get_cached_summary(self, paper_url: str) -> Optional[str]:
+        """Return the summary of a paper kept in memory, marking it as recently used."""
+        if paper_url not in self._summaries:
+            return None
+        self._summaries.move_to_end(paper_url)
+        return self._summaries[paper_url]
+
+    def _cache_summary(self, paper_url: str, summary: str) -> None:
+        """Keep the summary of a paper, dropping the least recently used ones beyond the limit."""
+        self._summaries[paper_url] = summary
+        self._summaries.move_to_end(paper_url)
+        while len(self._summaries) > self.max_cached_summaries:
+            self._summaries.popitem(last=False)
+
+    def _summary_job(self, paper_url: str) -> dict[str, Any]:
+        """Return the summary of a paper in the format of the summarizer jobs."""
+        summary = self._summaries.get(paper_url)
+        return {
+            "job_id": paper_url,
+            "paper_url": paper_url,
+            "status": "running" if summary is None else "done",
+            "summary": summary,
+        }
+
+    @staticmethod
+    def _scrap_paper_info(paper_url_path: str, url: str) -> dict[str, Any]:
+        """Scrap the full info of a paper from the website of the trending scrapper."""
+        scrapper = PapersWithCodePaperScrapper(paper_url_path=paper_url_path, url=url)
+        return scrapper.get_all_paper_info()
+
+
+def _refuse_request(request: httpx.Request) -> httpx.Response:
+    """Refuse a request made by the embedded pipeline."""
+    msg = f"The embedded pipeline must not request {request.url}."
+    raise RuntimeError(msg)
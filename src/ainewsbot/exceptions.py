@@ -0,0 +1,25 @@
+"""This module create the exceptions for the ainewsbot pipeline."""
+
+
+class SummaryFailedError(Exception):
+    """Exception raised when the summarizer could not summarize a paper.
+
+    Attributes:
+        message: Explanation of the error.
+    """
+
+
+class SummaryTimeOutError(Exception):
+    """Exception raised when a summary is not ready before the pipeline time out.
+
+    Attributes:
+        message: Explanation of the error.
+    """
+
+
+class StageTimeOutError(Exception):
+    """Exception raised when a pipeline stage takes longer than its time out.
+
+    Attributes:
+        message: Explanation of the error.
+    """
@@ -1,13 +1,38 @@
 """This module contains the pipeline for the paper retriever."""
 
-from typing import Any
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Optional
 from urllib.parse import urljoin
 
-import requests
-from pydantic import BaseModel
+import httpx
+from pydantic import BaseModel, Field, PrivateAttr
+
+from ainewsbot.checkpoints import StageCheckpointStore
+from ainewsbot.dag import DAGRun, Stage, run_dag
+from ainewsbot.exceptions import SummaryFailedError, SummaryTimeOutError
+from telemetry import get_trace_id, trace, trace_headers
 
 TRENDING_PAPERS_ENDPOINT = "paper/trending_papers"
 EVALUATE_PAPERS_ENDPOINT = "selection/best"
+RANK_PAPERS_ENDPOINT = "selection/ranker"
+PAPER_INFO_ENDPOINT = "paper/"
+SUMMARY_JOBS_ENDPOINT = "jobs"
+SUMMARY_STREAM_ENDPOINT = "summarize/stream"
+PENDING_JOB_STATUSES = ("pending", "running")
+FAILED_JOB_STATUS = "failed"
+DEFAULT_STAGE_TIMEOUTS_SECONDS = {
+    "papers": 60.0,
+    "best_paper": 30.0,
+    "ranked_papers": 30.0,
+    "paper_info": 60.0,
+    "speculative_summaries": 60.0,
+}
 
 
 class PaperRetrieverPipeline(BaseModel):
@@ -19,73 +44,553 @@ class PaperRetrieverPipeline(BaseModel):
         summarizer_url (str): Summarizer api url
         paperchooser_url (str): Paperchooser api url
         scrapper_url (str): Scrapper api url
+        summary_timeout_seconds (float): Maximum time to wait for a summary.
+        summary_poll_interval_seconds (float): Time between two checks of a summary job.
+        nb_papers (int): Number of trending papers to score.
+        nb_prefetched_candidates (int): Number of top ranked papers whose info is fetched while
+            the best paper is being chosen.
+        stage_timeouts_seconds (dict[str, float]): Time out of the stages of the async run, the
+            summary stage uses summary_timeout_seconds.
+        max_connections (int): Size of the connection pool of the async run.
+        speculative_top_n (int): Number of top ranked papers whose summary is submitted before
+            the best paper is confirmed, 0 disables the speculation.
+        speculative_budget_usd (float): Maximum estimated cost of the summaries started by the
+            speculation in a run. Papers already summarized or being summarized are free.
+        speculative_summary_cost_usd (float): Estimated cost of a summary until the cost of
+            summaries done by this pipeline is known.
+        nb_costed_summaries (int): Number of the latest done summaries whose mean cost is the
+            estimated cost of a summary.
+        max_concurrent_summaries (int): Maximum number of summaries awaited at once by the
+            digests of this pipeline, shared by the concurrent digests.
+        checkpoint_store (Optional[StageCheckpointStore]): Store of the results of the stages,
+            a run retried the same day resumes from the stages which did not complete.
     """
 
     summarizer_url: str
     paperchooser_url: str
     scrapper_url: str
+    summary_timeout_seconds: float = 600
+    summary_poll_interval_seconds: float = 5
+    nb_papers: int = 20
+    nb_prefetched_candidates: int = 3
+    stage_timeouts_seconds: dict[str, float] = Field(
+        default_factory=lambda: dict(DEFAULT_STAGE_TIMEOUTS_SECONDS)
+    )
+    max_connections: int = 10
+    speculative_top_n: int = 0
+    speculative_budget_usd: float = 0.05
+    speculative_summary_cost_usd: float = 0.05
+    nb_costed_summaries: int = 20
+    max_concurrent_summaries: int = 3
+    checkpoint_store: Optional[StageCheckpointStore] = None
+
+    _summary_slots: Optional[tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = PrivateAttr(
+        default=None
+    )
+    _summary_costs_usd: deque[float] = PrivateAttr(default_factory=deque)
+
+    def run(self) -> dict[str, Any]:
+        """Run the pipeline, the synchronous entry point of arun.
+
+        Returns:
+            dict[str, Any]: Info of the best paper with its summary.
+        """
+        return asyncio.run(self.arun())
+
+    async def arun(self, client: Optional[httpx.AsyncClient] = None) -> dict[str, Any]:
+        """Run the pipeline as a DAG of concurrent stages.
+
+        Args:
+            client (Optional[httpx.AsyncClient]): Client used for the api calls. Defaults to a
+                new pooled client closed at the end of the run.
+
+        Returns:
+            dict[str, Any]: Info of the best paper with its summary.
+        """
+        if client is None:
+            async with self.create_client() as new_client:
+                return await self.arun(new_client)
+
+        # Continue the trace of the request, or start one for the scheduled runs.
+        with trace(get_trace_id()):
+            dag_run = await self.arun_stages(client)
+        self._log_run(dag_run)
+        paper_info: dict[str, Any] = dag_run.results["paper_info"]
+        paper_info["Summary"] = dag_run.results["summary"]
+        return paper_info
+
+    async def astream_run(
+        self, client: Optional[httpx.AsyncClient] = None
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Run the pipeline, yielding the progress of the summary as it is made.
+
+        The best paper is chosen like in arun, then its summary is streamed by the summarizer
+        and its events relayed: page, chunks, chunk_mapped, combine and token.
+
+        Args:
+            client (Optional[httpx.AsyncClient]): Client used for the api calls. Defaults to a
+                new pooled client closed at the end of the run.
+
+        Yields:
+            dict[str, Any]: The events of the run, as dicts with an event and its data. The
+                first event is paper, with the info of the best paper, the last one is done,
+                with the info of the best paper and its summary like arun returns.
+
+        Raises:
+            SummaryFailedError: If the summarizer could not summarize the paper.
+        """
+        if client is None:
+            async with self.create_client() as new_client:
+                async for event in self.astream_run(new_client):
+                    yield event
+            return
+
+        async def papers() -> Any:
+            return await self.aget_papers(client, self.nb_papers)
+
+        async def best_paper(papers: list[dict[str, Any]]) -> Any:
+            return await self.ascore_papers(client, papers)
+
+        async def paper_info(best_paper: dict[str, Any]) -> Any:
+            return await self.aget_all_info(client, best_paper["URL"])
+
+        stages = [
+            Stage(name="papers", func=papers),
+            Stage(name="best_paper", func=best_paper, dependencies=["papers"]),
+            Stage(name="paper_info", func=paper_info, dependencies=["best_paper"]),
+        ]
+        with trace(get_trace_id()):
+            dag_run = await self._run_dag(stages)
+            self._log_run(dag_run)
+            info: dict[str, Any] = dag_run.results["paper_info"]
+            yield {"event": "paper", "data": dict(info)}
+            async for event in self.astream_summary(client, info["pdf_url"]):
+                if event["event"] == "error":
+                    msg = f"Summary of {info['pdf_url']} failed: {event['data'].get('detail')}"
+                    raise SummaryFailedError(msg)
+                if event["event"] == "done":
+                    info["Summary"] = event["data"]["summary"]
+                    yield {"event": "done", "data": info}
+                    return
+                yield event
+        msg = f"Summary stream of {info['pdf_url']} ended without summary."
+        raise SummaryFailedError(msg)
+
+    async def arun_stages(self, client: httpx.AsyncClient) -> DAGRun:
+        """Run the stages of the pipeline.
+
+        The best paper and the ranking are requested at the same time. As soon as the ranking
+        is known, the info of the top candidates is fetched in the background so the info of
+        the best paper is usually ready when it is confirmed. The summary is submitted as soon
+        as the pdf url of the best paper is known.
+
+        With speculative_top_n set, the summaries of the top candidates are also submitted once
+        their info is known. The summarizer coalesces them with the summary of the best paper
+        and keeps the unused ones in its job store, which serves them to the next runs.
+
+        The ranking and the speculation only speed up the run, the run goes on without them if
+        they fail or time out.
+
+        Args:
+            client (httpx.AsyncClient): Client used for the api calls.
+
+        Returns:
+            DAGRun: Results and timings of the stages.
+        """
+        info_tasks: dict[str, asyncio.Task[Any]] = {}
+
+        def get_info_task(paper_url: str) -> asyncio.Task[Any]:
+            if paper_url not in info_tasks:
+                info_tasks[paper_url] = asyncio.create_task(self.aget_all_info(client, paper_url))
+            return info_tasks[paper_url]
+
+        async def papers() -> Any:
+            return await self.aget_papers(client, self.nb_papers)
+
+        async def best_paper(papers: list[dict[str, Any]]) -> Any:
+            return await self.ascore_papers(client, papers)
+
+        async def ranked_papers(papers: list[dict[str, Any]]) -> Any:
+            ranked = await self.arank_papers(client, papers)
+            # The ranker orders the papers by increasing score.
+            for candidate in ranked[::-1][: self.nb_prefetched_candidates]:
+                get_info_task(candidate["URL"])
+            return ranked
+
+        async def speculative_summaries(ranked_papers: Optional[list[dict[str, Any]]]) -> Any:
+            # The ranking is not required, the speculation is skipped if it failed.
+            candidates = (ranked_papers or [])[::-1][: self.speculative_top_n]
+            candidate_infos = [get_info_task(candidate["URL"]) for candidate in candidates]
+            return await self.aspeculate_summaries(client, candidate_infos)
+
+        async def paper_info(best_paper: dict[str, Any]) -> Any:
+            return await get_info_task(best_paper["URL"])
+
+        async def summary(paper_info: dict[str, Any]) -> Any:
+            return await self.aget_summary(client, paper_info["pdf_url"])
+
+        stages = [
+            Stage(name="papers", func=papers),
+            Stage(name="best_paper", func=best_paper, dependencies=["papers"]),
+            Stage(
+                name="ranked_papers", func=ranked_papers, dependencies=["papers"], required=False
+            ),
+            Stage(
+                name="speculative_summaries",
+                func=speculative_summaries,
+                dependencies=["ranked_papers"],
+                required=False,
+            ),
+            Stage(name="paper_info", func=paper_info, dependencies=["best_paper"]),
+            Stage(
+                name="summary",
+                func=summary,
+                dependencies=["paper_info"],
+                timeout_seconds=self.summary_timeout_seconds,
+            ),
+        ]
+        try:
+            return await self._run_dag(stages)
+        finally:
+            await self._cancel_tasks(list(info_tasks.values()))
+
+    async def arun_digest(
+        self, nb_digest_papers: int = 5, client: Optional[httpx.AsyncClient] = None
+    ) -> dict[str, Any]:
+        """Run the digest of the top ranked papers.
+
+        The info and summary of every selected paper are requested concurrently, the number of
+        summaries in progress being limited by max_concurrent_summaries. A paper whose info or
+        summary fails is left out of the digest instead of failing it.
+
+        Args:
+            nb_digest_papers (int, optional): Number of papers of the digest. Defaults to 5.
+            client (Optional[httpx.AsyncClient]): Client used for the api calls. Defaults to a
+                new pooled client closed at the end of the run.
+
+        Returns:
+            dict[str, Any]: Info and summary of the papers, best first, under "Papers" and the
+                urls of the papers which failed under "Failed".
+        """
+        if client is None:
+            async with self.create_client() as new_client:
+                return await self.arun_digest(nb_digest_papers, new_client)
+
+        async def papers() -> Any:
+            return await self.aget_papers(client, self.nb_papers)
+
+        async def ranked_papers(papers: list[dict[str, Any]]) -> Any:
+            return await self.arank_papers(client, papers)
+
+        async def digest(ranked_papers: list[dict[str, Any]]) -> Any:
+            # The ranker orders the papers by increasing score.
+            selected = ranked_papers[::-1][:nb_digest_papers]
+            return await asyncio.gather(*(self._adigest_paper(client, paper) for paper in selected))
+
+        stages = [
+            Stage(name="papers", func=papers),
+            Stage(name="ranked_papers", func=ranked_papers, dependencies=["papers"]),
+            # The failed papers of a digest are retried by the next run.
+            Stage(name="digest", func=digest, dependencies=["ranked_papers"], checkpoint=False),
+        ]
+        with trace(get_trace_id()):
+            dag_run = await self._run_dag(stages)
+        self._log_run(dag_run)
+        digest_papers = list(zip(dag_run.results["digest"], dag_run.results["ranked_papers"][::-1]))
+        return {
+            "Papers": [paper_info for paper_info, _ in digest_papers if paper_info is not None],
+            "Failed": [paper["URL"] for paper_info, paper in digest_papers if paper_info is None],
+        }
+
+    async def _adigest_paper(
+        self, client: httpx.AsyncClient, paper: dict[str, Any]
+    ) -> Optional[dict[str, Any]]:
+        """Return the info of a paper with its summary, None if it failed."""
+        try:
+            paper_info: dict[str, Any] = await self.aget_all_info(client, paper["URL"])
+            async with self._get_summary_slots():
+                paper_info["Summary"] = await asyncio.wait_for(
+                    self.aget_summary(client, paper_info["pdf_url"]),
+                    self.summary_timeout_seconds,
+                )
+        except (SummaryFailedError, asyncio.TimeoutError, httpx.HTTPError, KeyError, ValueError):
+            logging.exception("Digest of %s failed.", paper["URL"])
+            return None
+        return paper_info
+
+    def _get_summary_slots(self) -> asyncio.Semaphore:
+        """Return the semaphore limiting the summaries in progress in the running loop."""
+        loop = asyncio.get_running_loop()
+        if self._summary_slots is None or self._summary_slots[0] is not loop:
+            self._summary_slots = (loop, asyncio.Semaphore(self.max_concurrent_summaries))
+        return self._summary_slots[1]
+
+    @staticmethod
+    def _log_run(dag_run: DAGRun) -> None:
+        """Log the duration of a run and of its stages."""
+        logging.info(
+            "Pipeline done in %.3fs (%s).",
+            dag_run.duration_seconds,
+            ", ".join(f"{t.name}: {t.duration_seconds:.3f}s" for t in dag_run.timings),
+        )
+
+    @staticmethod
+    async def _cancel_tasks(tasks: list[asyncio.Task[Any]]) -> None:
+        """Cancel the tasks still running and wait for them."""
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run_dag(self, stages: list[Stage]) -> DAGRun:
+        """Run the stages with their time outs, resuming from the checkpoints of the day."""
+        run_day = datetime.now(timezone.utc).date()
+        return await run_dag(self._apply_stage_timeouts(stages), self.checkpoint_store, run_day)
+
+    def _apply_stage_timeouts(self, stages: list[Stage]) -> list[Stage]:
+        """Set the configured time out of the stages."""
+        for stage in stages:
+            stage.timeout_seconds = self.stage_timeouts_seconds.get(
+                stage.name, stage.timeout_seconds
+            )
+        return stages
+
+    def create_client(self) -> httpx.AsyncClient:
+        """Return a pooled client for the async run."""
+        limits = httpx.Limits(max_connections=self.max_connections)
+        return httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(30.0))
 
-    def get_papers(self, nb_papers: int = 20) -> Any:
+    async def aget_papers(self, client: httpx.AsyncClient, nb_papers: int = 20) -> Any:
         """This method scrap the papers from the scrapper.
 
         Args:
-            nb_papers (int, optional): [description]. Defaults to 20.
+            client (httpx.AsyncClient): Client used for the api call.
+            nb_papers (int, optional): Number of papers. Defaults to 20.
 
         Returns:
-            list[dict[str, Any]]: [description]
+            list[dict[str, Any]]: Trending papers.
         """
         url = urljoin(self.scrapper_url, TRENDING_PAPERS_ENDPOINT)
-        params = {"nb_papers": nb_papers}
-        response = requests.get(url, params=params, timeout=10)
-        papers = response.json()
-        return papers
+        response = await client.get(url, params={"nb_papers": nb_papers}, headers=trace_headers())
+        response.raise_for_status()
+        return response.json()
 
-    def score_papers(self, papers: list[dict[str, Any]]) -> Any:
-        """This method score the papers with the paperchooser.
+    async def ascore_papers(self, client: httpx.AsyncClient, papers: list[dict[str, Any]]) -> Any:
+        """This method get the best paper from the paperchooser.
 
         Args:
-            papers (list[dict[str, Any]]): [description]
+            client (httpx.AsyncClient): Client used for the api call.
+            papers (list[dict[str, Any]]): Candidate papers.
 
         Returns:
-            list[dict[str, Any]]: [description]
+            dict[str, Any]: The best paper.
         """
         url = urljoin(self.paperchooser_url, EVALUATE_PAPERS_ENDPOINT)
-        response = requests.post(url, json=papers, timeout=10)
-        paper = response.json()
-        return paper
+        response = await client.post(url, json=papers, headers=trace_headers())
+        response.raise_for_status()
+        return response.json()
 
-    def get_all_info(self, paper_url: str) -> Any:
+    async def arank_papers(self, client: httpx.AsyncClient, papers: list[dict[str, Any]]) -> Any:
+        """This method rank the papers with the paperchooser.
+
+        Args:
+            client (httpx.AsyncClient): Client used for the api call.
+            papers (list[dict[str, Any]]): Candidate papers.
+
+        Returns:
+            list[dict[str, Any]]: Papers ordered by increasing score.
+        """
+        url = urljoin(self.paperchooser_url, RANK_PAPERS_ENDPOINT)
+        response = await client.post(url, json=papers, headers=trace_headers())
+        response.raise_for_status()
+        return response.json()
+
+    async def aget_all_info(self, client: httpx.AsyncClient, paper_url: str) -> Any:
         """This returns full paper info."""
-        url = urljoin(self.scrapper_url, "paper/")
-        params = {"paper_url": paper_url[1:]}
-        response = requests.post(url, params=params, timeout=10)
-        paper = response.json()
-        return paper
+        url = urljoin(self.scrapper_url, PAPER_INFO_ENDPOINT)
+        response = await client.post(
+            url, params={"paper_url": paper_url[1:]}, headers=trace_headers()
+        )
+        response.raise_for_status()
+        return response.json()
 
-    def get_summary(self, paper_url: str) -> Any:
-        """This method get the summary of a paper.
+    async def asubmit_summary(self, client: httpx.AsyncClient, paper_url: str) -> Any:
+        """This method submit a summarization job to the summarizer.
 
         Args:
-            paper_url (str): [description]
+            client (httpx.AsyncClient): Client used for the api call.
+            paper_url (str): Url of the paper pdf.
 
         Returns:
-            str: [description]
+            dict[str, Any]: The summarization job.
         """
-        url = urljoin(self.summarizer_url, "summarize")
-        params = {"paper_url": paper_url}
-        response = requests.post(url, params=params, timeout=600)
-        summary = response.json()
-        return summary
+        url = urljoin(self.summarizer_url, SUMMARY_JOBS_ENDPOINT)
+        response = await client.post(url, params={"paper_url": paper_url}, headers=trace_headers())
+        response.raise_for_status()
+        return response.json()
 
-    def run(self) -> dict[str, Any]:
-        """Run the pipeline.
+    async def afind_summary_job(self, client: httpx.AsyncClient, paper_url: str) -> Any:
+        """This method get the summarization job of a paper without submitting it.
+
+        Args:
+            client (httpx.AsyncClient): Client used for the api call.
+            paper_url (str): Url of the paper pdf.
 
         Returns:
-            dict[str, Any]: [description]
+            Optional[dict[str, Any]]: The pending, running or done job of the paper, None if
+                there is none.
         """
-        papers = self.get_papers()
-        paper = self.score_papers(papers)
-        paper_info = self.get_all_info(paper["URL"])
-        summary = self.get_summary(paper_info["pdf_url"])
-        paper_info["Summary"] = summary
-        return paper_info
+        url = urljoin(self.summarizer_url, SUMMARY_JOBS_ENDPOINT)
+        response = await client.get(url, params={"paper_url": paper_url}, headers=trace_headers())
+        if response.status_code == httpx.codes.NOT_FOUND:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    async def aspeculate_summaries(
+        self, client: httpx.AsyncClient, candidate_infos: list[Awaitable[Any]]
+    ) -> list[str]:
+        """This method submit the summaries of the candidates within the speculation budget.
+
+        The candidates are given best first. Candidates with a job which did not fail cost
+        nothing, the others are submitted while the estimated cost of the summaries started
+        stays within speculative_budget_usd. The speculation is an optimization, so its errors
+        are logged instead of raised.
+
+        Args:
+            client (httpx.AsyncClient): Client used for the api calls.
+            candidate_infos (list[Awaitable[Any]]): Full info of the candidates, best first.
+
+        Returns:
+            list[str]: Pdf urls of the summaries started by the speculation.
+        """
+        submitted: list[str] = []
+        summary_cost_usd = self.estimate_summary_cost_usd()
+        try:
+            for candidate_info in candidate_infos:
+                if (len(submitted) + 1) * summary_cost_usd > self.speculative_budget_usd:
+                    break
+                pdf_url = (await candidate_info)["pdf_url"]
+                if await self.afind_summary_job(client, pdf_url) is not None:
+                    continue
+                await self.asubmit_summary(client, pdf_url)
+                submitted.append(pdf_url)
+        except (httpx.HTTPError, KeyError, ValueError):
+            logging.warning("Speculative summaries failed.", exc_info=True)
+        if submitted:
+            logging.info(
+                "Speculatively submitted the summaries of %s, estimated at %.4f USD each.",
+                submitted,
+                summary_cost_usd,
+            )
+        return submitted
+
+    def estimate_summary_cost_usd(self) -> float:
+        """Return the mean cost of the latest summaries, or the configured estimate if none."""
+        if not self._summary_costs_usd:
+            return self.speculative_summary_cost_usd
+        return sum(self._summary_costs_usd) / len(self._summary_costs_usd)
+
+    def record_summary_cost(self, cost_usd: float) -> None:
+        """Record the cost of a done summary, as measured by the summarizer.
+
+        Args:
+            cost_usd (float): Cost of the model calls of the summary.
+        """
+        self._summary_costs_usd.append(cost_usd)
+        while len(self._summary_costs_usd) > self.nb_costed_summaries:
+            self._summary_costs_usd.popleft()
+
+    async def astream_summary(
+        self, client: httpx.AsyncClient, paper_url: str
+    ) -> AsyncIterator[dict[str, Any]]:
+        """This method stream the events of the summary of a paper from the summarizer.
+
+        The connection is held open during the summarization, a read waits at most
+        summary_timeout_seconds for the next event.
+
+        Args:
+            client (httpx.AsyncClient): Client used for the api call.
+            paper_url (str): Url of the paper pdf.
+
+        Yields:
+            dict[str, Any]: The server-sent events of the summarizer, as dicts with an event
+                and its data. The last one is done, with the summary, or error.
+        """
+        url = urljoin(self.summarizer_url, SUMMARY_STREAM_ENDPOINT)
+        timeout = httpx.Timeout(30.0, read=self.summary_timeout_seconds)
+        async with client.stream(
+            "POST", url, params={"paper_url": paper_url}, headers=trace_headers(), timeout=timeout
+        ) as response:
+            response.raise_for_status()
+            async for event in parse_sse(response.aiter_lines()):
+                yield event
+
+    async def aget_summary(self, client: httpx.AsyncClient, paper_url: str) -> Any:
+        """This method get the summary of a paper by polling its summarization job.
+
+        Args:
+            client (httpx.AsyncClient): Client used for the api calls.
+            paper_url (str): Url of the paper pdf.
+
+        Returns:
+            str: Summary of the paper.
+
+        Raises:
+            SummaryTimeOutError: If the job is not done after summary_timeout_seconds.
+            SummaryFailedError: If the job failed.
+            httpx.HTTPStatusError: If the summarizer answered with an error status.
+        """
+        jobs_url = urljoin(self.summarizer_url, SUMMARY_JOBS_ENDPOINT)
+        job = await self.asubmit_summary(client, paper_url)
+        deadline = time.monotonic() + self.summary_timeout_seconds
+        while job["status"] in PENDING_JOB_STATUSES:
+            if time.monotonic() > deadline:
+                msg = f"Summary of {paper_url} not ready after {self.summary_timeout_seconds}s."
+                raise SummaryTimeOutError(msg)
+            await asyncio.sleep(self.summary_poll_interval_seconds)
+            response = await client.get(f"{jobs_url}/{job['job_id']}", headers=trace_headers())
+            response.raise_for_status()
+            job = response.json()
+        if job["status"] == FAILED_JOB_STATUS:
+            msg = f"Summary of {paper_url} failed: {job['error']}"
+            raise SummaryFailedError(msg)
+        if job.get("usage") is not None:
+            self.record_summary_cost(job["usage"]["cost_usd"])
+        return job["summary"]
+
+
+async def parse_sse(lines: AsyncIterator[str]) -> AsyncIterator[dict[str, Any]]:
+    """Yield the server-sent events of a stream of lines.
+
+    Args:
+        lines (AsyncIterator[str]): Lines of the stream, without their line break.
+
+    Yields:
+        dict[str, Any]: The events, as dicts with an event and its json data.
+    """
+    event, data = "message", []
+    async for line in lines:
+        if not line:
+            if data:
+                yield {"event": event, "data": json.loads("\n".join(data))}
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line.removeprefix("event:").strip()
+        elif line.startswith("data:"):
+            data.append(line.removeprefix("data:").strip())
+
+
+def encode_sse(event: dict[str, Any]) -> str:
+    r"""Return an event encoded as a server-sent event.
+
+    Args:
+        event (dict[str, Any]): The event, a dict with an event and its data.
+
+    Returns:
+        str: The event and its json data.
+
+    Examples:
+        >>> encode_sse({"event": "token", "data": {"text": "A"}})
+        'event: token\ndata: {"text": "A"}\n\n'
+    """
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
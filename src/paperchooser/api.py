@@ -7,6 +7,7 @@ from fastapi import FastAPI
 from rich.logging import RichHandler
 
 from paperchooser.routers.manager import manager_router
+from telemetry import instrument_app
 
 logging.basicConfig(
     level="WARNING",
@@ -16,6 +17,7 @@ logging.basicConfig(
 )
 app = FastAPI()
 app.include_router(manager_router)
+instrument_app(app)
 
 
 @app.on_event("startup")
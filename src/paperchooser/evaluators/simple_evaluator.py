@@ -51,15 +51,17 @@ class SimpleEvaluator(BaseEvaluator):
             all_paper_info (List[dict]): Dictionnaries containing information about the papers.
 
         Returns:
-            List[float]: A list of evaluation scores for each paper.
+            List[float]: A list of evaluation scores for each paper, a paper missing attributes
+                gets the lowest score so the scores stay aligned with the papers.
         """
         batch_out = []
         for paper_info in all_paper_info:
             try:
                 batch_out.append(self.evaluate(paper_info))
             except PaperAttributeNotFoundError:
-                msg = f"Paper {paper_info['Title']} does not have all the required attributes."
+                msg = f"Paper {paper_info.get('Title')} does not have all the required attributes."
                 logging.warning(msg)
+                batch_out.append(-np.inf)
         return np.array(batch_out)
 
     @staticmethod
@@ -8,6 +8,7 @@ from fastapi import FastAPI
 from rich.logging import RichHandler
 
 from scrapper.routers import trending_papers
+from telemetry import instrument_app
 
 logging.basicConfig(
     level="WARNING",
@@ -17,6 +18,7 @@ logging.basicConfig(
 )
 app = FastAPI()
 app.include_router(trending_papers.router)
+instrument_app(app)
 
 
 @app.on_event("startup")
@@ -10,6 +10,7 @@ from pydantic import BaseModel
 
 from scrapper.papers_with_code_scrapper import utils
 from scrapper.papers_with_code_scrapper.exceptions import PaperAttributeNotFoundError
+from telemetry import span
 
 SUCCESS_STATUS_CODE = 200
 NOT_FOUND_STATUS_CODE = 404
@@ -61,11 +62,13 @@ class PapersWithCodePaperScrapper(BaseModel):
     def get_all_paper_info(self) -> dict[str, Any]:
         """Get all the paper info."""
         paper_info = {}
-        paper_response = self._connect_to_paper()
-        page_content = BeautifulSoup(paper_response.content, "html.parser")
-        paper_info["pdf_url"] = self._get_pdf_url(page_content)
-        paper_info["official implementation"] = self._get_official_code_url(page_content)
-        paper_info["abstract"] = self._get_abstract(page_content)
+        with span("scrapper.fetch_paper_page"):
+            paper_response = self._connect_to_paper()
+        with span("scrapper.parse_paper_page"):
+            page_content = BeautifulSoup(paper_response.content, "html.parser")
+            paper_info["pdf_url"] = self._get_pdf_url(page_content)
+            paper_info["official implementation"] = self._get_official_code_url(page_content)
+            paper_info["abstract"] = self._get_abstract(page_content)
         return paper_info
 
     def _connect_to_paper(self) -> requests.Response:
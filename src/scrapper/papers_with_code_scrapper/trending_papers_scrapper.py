@@ -10,40 +10,31 @@ from bs4 import BeautifulSoup
 from pydantic import BaseModel
 
 from scrapper.papers_with_code_scrapper import PapersWithCodeNoResponseTimeOutError, utils
+from telemetry import span
 
 SUCCESS_STATUS_CODE = 200
 DATE_FORMAT = "%d %b %Y"
 
 
-def check_status_code(url: str, time_out_seconds: float) -> Callable[..., Any]:
-    """A decorator that checks the status code of a HTTP response.
+def check_status_code(func: Callable[..., Any]) -> Callable[..., Any]:
+    """A decorator that checks the status code of the website of the scrapper.
 
     Args:
-        url (str): The URL to check.
-        time_out_seconds (float): The time out in seconds.
-    """
-
-    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
-        """A decorator that checks the status code of a HTTP response.
-
-        Args:
-            func: The function to decorate.
+        func: The function to decorate.
 
-        Returns:
-            The decorated function.
-        """
-
-        @wraps(func)
-        def wrapper(self: object, *args: Any, **kwargs: Any) -> Any:
-            response = requests.get(url, timeout=time_out_seconds)
-            if response.status_code != SUCCESS_STATUS_CODE:
-                msg = f"Request to {url} returned status code {response.status_code}"
-                raise PapersWithCodeNoResponseTimeOutError(msg)
-            return func(self, *args, **kwargs)
+    Returns:
+        The decorated function.
+    """
 
-        return wrapper
+    @wraps(func)
+    def wrapper(self: "PapersWithCodeTrendingScrapper", *args: Any, **kwargs: Any) -> Any:
+        response = requests.get(self.url, timeout=self.time_out_seconds)
+        if response.status_code != SUCCESS_STATUS_CODE:
+            msg = f"Request to {self.url} returned status code {response.status_code}"
+            raise PapersWithCodeNoResponseTimeOutError(msg)
+        return func(self, *args, **kwargs)
 
-    return decorator
+    return wrapper
 
 
 class PapersWithCodeTrendingScrapper(BaseModel):
@@ -57,7 +48,7 @@ class PapersWithCodeTrendingScrapper(BaseModel):
     time_out_seconds: int = 20
     url: str = "https://paperswithcode.com/"
 
-    @check_status_code(url, time_out_seconds)
+    @check_status_code
     def get_best_papers(self, nb_papers: int = 10) -> List[Dict[str, Any]]:
         """Retrieves a list of paper titles from the Papers with Code website.
 
@@ -75,7 +66,7 @@ class PapersWithCodeTrendingScrapper(BaseModel):
             papers.extend(page_papers)
         return papers[:nb_papers]
 
-    @check_status_code(url, time_out_seconds)
+    @check_status_code
     def get_page_papers(self, page_number: int) -> List[Dict[str, Any]]:
         """Retrieves a list of paper titles from a specified page on the Papers with Code website.
 
@@ -86,14 +77,15 @@ class PapersWithCodeTrendingScrapper(BaseModel):
             List[Dict[str, Any]]: List of infos of the best papers.
         """
         endpoint = f"{self.url}?page={page_number}"
-        response = requests.get(endpoint, timeout=self.time_out_seconds)
-        soup = BeautifulSoup(response.content, "html.parser")
-        raw_paper_content = soup.find_all("div", {"class": "row infinite-item item paper-card"})
-
-        return [
-            PapersWithCodeTrendingScrapper._raw_paper_content_to_dict(paper)
-            for paper in raw_paper_content
-        ]
+        with span("scrapper.fetch_trending_page"):
+            response = requests.get(endpoint, timeout=self.time_out_seconds)
+        with span("scrapper.parse_trending_page"):
+            soup = BeautifulSoup(response.content, "html.parser")
+            raw_paper_content = soup.find_all("div", {"class": "row infinite-item item paper-card"})
+            return [
+                PapersWithCodeTrendingScrapper._raw_paper_content_to_dict(paper)
+                for paper in raw_paper_content
+            ]
 
     @staticmethod
     def _raw_paper_content_to_dict(raw_paper_content: bs4.element.Tag) -> Dict[str, Any]:
@@ -1,17 +1,55 @@
-"""ainewsbot REST API."""
+"""ainewsbot REST API.
 
+The chain and the queue of the summarization jobs are created once by the startup event and
+kept in the state of the app. The heavy dependencies of the chain are imported on the first
+summary, or at startup when the SUMMARIZER_WARMUP environment variable is set, which also reads
+the api key.
+"""
+
+import asyncio
 import logging
+import os
+from collections.abc import AsyncIterator
 from pathlib import Path
+from typing import Annotated, Optional, Union
 
 import coloredlogs
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 
-from summarizer.chains import ChainFactory
+from summarizer.chains import ChainFactory, EmptyDocumentError, UnknownStyleError
+from summarizer.jobs import Job, JobQueue, SQLiteJobStore
+from summarizer.loaders import shutdown_extraction_pools
+from summarizer.usage import SummaryResult, TokenBudgetExceededError
+from telemetry import instrument_app
 
 app = FastAPI()
+instrument_app(app)
+
+CONFIG_PATH = Path(os.environ.get("SUMMARIZER_CONFIG_PATH", "./src/summarizer/config/base.yaml"))
+JOBS_DB_PATH = Path(os.environ.get("JOBS_DB_PATH", "./summarizer_jobs.sqlite"))
+NB_JOB_WORKERS = int(os.environ.get("NB_JOB_WORKERS", "2"))
+JOBS_DONE_TTL_SECONDS = float(os.environ.get("JOBS_DONE_TTL_SECONDS", str(7 * 24 * 3600)))
+WARMUP = os.environ.get("SUMMARIZER_WARMUP", "0") == "1"
+
 
-CONFIG_PATH = Path("./src/summarizer/config/base.yaml")
+def run_summary(paper_url: str) -> SummaryResult:
+    """Return the summary of the given paper with the configured chain."""
+    return app.state.chain.run_chain_with_usage(paper_url)
+
+
+def create_job_queue() -> JobQueue:
+    """Return the queue of the summarization jobs of the chain of the app.
+
+    The jobs summarized by another config of the chain are not served, whatever their status.
+    """
+    store = SQLiteJobStore(
+        db_path=JOBS_DB_PATH,
+        fingerprint=app.state.chain.fingerprint(),
+        done_ttl_seconds=JOBS_DONE_TTL_SECONDS,
+    )
+    return JobQueue(store=store, runner=run_summary, nb_workers=NB_JOB_WORKERS)
 
 
 @app.on_event("startup")
@@ -22,6 +60,18 @@ def startup_event() -> None:
         logging.root.removeHandler(handler)
     # Add coloredlogs' coloured StreamHandler to the root logger.
     coloredlogs.install()
+    app.state.chain = ChainFactory.build_chain_from_yaml(CONFIG_PATH)
+    if WARMUP:
+        app.state.chain.warmup()
+    app.state.job_queue = create_job_queue()
+    app.state.job_queue.start()
+
+
+@app.on_event("shutdown")
+def shutdown_event() -> None:
+    """Run API shutdown events."""
+    app.state.job_queue.stop(timeout=10)
+    shutdown_extraction_pools()
 
 
 @app.get("/")
@@ -31,16 +81,126 @@ def read_root() -> str:
 
 
 @app.post("/summarize")
-async def summarize_paper(paper_url: str) -> str:
+def summarize_paper(
+    paper_url: str,
+    with_usage: bool = False,
+    token_budget: Optional[int] = Query(None, ge=1),
+    styles: Annotated[Optional[list[str]], Query()] = None,
+) -> Union[str, dict[str, str], SummaryResult]:
     """Post method returning a summary of the given paper.
 
+    The route is synchronous so the summary runs in the threadpool of the app, not in its
+    event loop.
+
+    Args:
+        paper_url (str): Url to the paper.
+        with_usage (bool): Return the tokens used with the summary.
+        token_budget (Optional[int]): Maximum number of tokens used by the summary, overriding
+            the budget of the chain.
+        styles (Optional[list[str]]): Styles of the summaries, the chunks are summarized once
+            for all the styles.
+
+    Returns:
+        Union[str, dict[str, str], SummaryResult] : Summary of the paper, or the summary of
+            every style if styles are given, with its token usage if requested.
+    """
+    try:
+        result = app.state.chain.run_chain_with_usage(paper_url, token_budget, styles)
+    except TokenBudgetExceededError as e:
+        raise HTTPException(status_code=413, detail=str(e)) from e
+    except (UnknownStyleError, EmptyDocumentError) as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+    if with_usage:
+        return result
+    return result.summaries if styles else result.summary
+
+
+@app.post("/summarize/stream")
+async def stream_summary(
+    request: Request, paper_url: str, token_budget: Optional[int] = Query(None, ge=1)
+) -> StreamingResponse:
+    """Post method streaming the progress of the summary of the given paper.
+
+    The response is a stream of server-sent events: a page event per page loaded, a chunks
+    event once the paper is chunked, a chunk_mapped event per chunk summarized, then a token
+    event per token of the final summary. The last event is done, with the summary and its
+    token usage, or error, with the status code the summary route would have answered.
+
+    The summary runs in a thread of the chain, its events are awaited without holding a
+    thread of the app. Once the client disconnects, the summary is cancelled: it stops at its
+    next progress report and no model call is started anymore.
+
+    Args:
+        request (Request): The request, to detect the disconnection of the client.
+        paper_url (str): Url to the paper.
+        token_budget (Optional[int]): Maximum number of tokens used by the summary, overriding
+            the budget of the chain.
+
+    Returns:
+        StreamingResponse: The server-sent events of the summary.
+    """
+    listener = app.state.chain.start_streamed_summary(paper_url, token_budget)
+
+    async def sse_events() -> AsyncIterator[str]:
+        try:
+            while (event := await asyncio.to_thread(listener.next_event)) is not None:
+                if await request.is_disconnected():
+                    return
+                yield event.to_sse()
+        finally:
+            # Also run when the response is cancelled by the disconnection of the client.
+            listener.cancel()
+
+    return StreamingResponse(sse_events(), media_type="text/event-stream")
+
+
+@app.post("/jobs", status_code=202)
+def submit_summary_job(paper_url: str) -> Job:
+    """Submit a paper to summarize in the background.
+
+    Submitting a paper which already has a pending, running or done job returns that job. Only
+    the jobs of the current config of the chain are returned, and the done jobs for
+    JOBS_DONE_TTL_SECONDS, a week by default.
+
     Args:
         paper_url (str): Url to the paper.
 
     Returns:
-        str : Summary of the paper.
+        Job : The job summarizing the paper.
+    """
+    return app.state.job_queue.submit(paper_url)
+
+
+@app.get("/jobs")
+def find_summary_job(paper_url: str) -> Job:
+    """Return the job covering a paper without submitting it.
+
+    Args:
+        paper_url (str): Url to the paper.
+
+    Returns:
+        Job : The pending, running or done job of the paper.
+    """
+    job = app.state.job_queue.find(paper_url)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job for {paper_url}")
+    return job
+
+
+@app.get("/jobs/{job_id}")
+def get_summary_job(job_id: str) -> Job:
+    """Return the status of a summarization job and its summary once done.
+
+    Args:
+        job_id (str): Id of the job.
+
+    Returns:
+        Job : The job.
     """
-    return chain.run_chain(paper_url)
+    job = app.state.job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
 
 
 def main() -> None:
@@ -49,5 +209,4 @@ def main() -> None:
 
 
 if __name__ == "__main__":
-    chain = ChainFactory.build_chain_from_yaml(CONFIG_PATH)
     main()
@@ -0,0 +1,5 @@
+"""This modules implements the summarization of batches of papers."""
+
+from summarizer.batch.batch_summarizer import BatchItemResult, BatchReport, BatchSummarizer
+
+__all__ = ["BatchItemResult", "BatchReport", "BatchSummarizer"]
@@ -0,0 +1,5 @@
+"""Run the batch summarization command line."""
+from summarizer.batch.cli import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""This module implements the summarization of a batch of papers.
+
+The results are appended to a jsonl file as the papers are summarized, so an interrupted batch
+is resumed by running it again: the papers already summarized are skipped, the failed ones are
+retried.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from pydantic import BaseModel, PrivateAttr, ValidationError
+
+from summarizer.chains import BaseChain
+from summarizer.usage import TokenUsage
+
+DONE_STATUS = "done"
+FAILED_STATUS = "failed"
+
+
+class BatchItemResult(BaseModel):
+    """The result of a paper of the batch, a line of the jsonl output.
+
+    Attributes:
+        item (str): Url or path of the pdf, as given in the batch.
+        status (str): done or failed.
+        summary (Optional[str]): Summary of the paper if done.
+        usage (Optional[TokenUsage]): Tokens used by the summary if done.
+        error (Optional[str]): Error of the summary if failed.
+        duration_seconds (float): Duration of the summary.
+    """
+
+    item: str
+    status: str
+    summary: Optional[str] = None
+    usage: Optional[TokenUsage] = None
+    error: Optional[str] = None
+    duration_seconds: float
+
+
+class BatchReport(BaseModel):
+    """The throughput of a batch run.
+
+    Attributes:
+        nb_done (int): Number of papers summarized by the run.
+        nb_failed (int): Number of papers whose summary failed.
+        nb_skipped (int): Number of papers already summarized by a previous run.
+        duration_seconds (float): Duration of the run.
+        total_tokens (int): Number of tokens used by the summaries of the run.
+        cost_usd (float): Cost of the summaries of the run.
+    """
+
+    nb_done: int = 0
+    nb_failed: int = 0
+    nb_skipped: int = 0
+    duration_seconds: float = 0.0
+    total_tokens: int = 0
+    cost_usd: float = 0.0
+
+    @property
+    def papers_per_minute(self) -> float:
+        """Return the number of papers summarized per minute."""
+        return 60 * self.nb_done / self.duration_seconds if self.duration_seconds else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        """Return the number of tokens used per second."""
+        return self.total_tokens / self.duration_seconds if self.duration_seconds else 0.0
+
+
+class BatchSummarizer(BaseModel):
+    """This summarizer runs a chain over a batch of papers, several papers at once.
+
+    The model calls of all the papers go through the rate limit schedulers of the models, which
+    are shared by the process, so the batch stays under the limits of the api whatever the
+    number of papers summarized at once.
+
+    Attributes:
+        chain (BaseChain): Chain summarizing the papers.
+        output_path (Path): Jsonl file of the results, appended to.
+        max_concurrency (int): Maximum number of papers summarized at once.
+        token_budget (Optional[int]): Token budget of every summary, overriding the budget of
+            the chain.
+    """
+
+    chain: BaseChain
+    output_path: Path
+    max_concurrency: int = 4
+    token_budget: Optional[int] = None
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def done_items(self) -> set[str]:
+        """Return the papers already summarized in the output file.
+
+        Returns:
+            set[str]: Urls or paths of the papers summarized.
+        """
+        if not self.output_path.exists():
+            return set()
+        done = set()
+        with self.output_path.open(encoding="utf-8") as output:
+            for line in output:
+                try:
+                    result = BatchItemResult.model_validate_json(line)
+                except ValidationError:
+                    # The last line of an interrupted batch may be incomplete.
+                    logging.warning("Skipping invalid result line %r.", line[:80])
+                    continue
+                if result.status == DONE_STATUS:
+                    done.add(result.item)
+        return done
+
+    def run(self, items: list[str]) -> BatchReport:
+        """Summarize the papers not summarized yet and append their results to the output.
+
+        Args:
+            items (list[str]): Urls or paths of the pdfs.
+
+        Returns:
+            BatchReport: The throughput of the run.
+        """
+        done = self.done_items()
+        pending = [item for item in dict.fromkeys(items) if item not in done]
+        report = BatchReport(nb_skipped=len(dict.fromkeys(items)) - len(pending))
+        logging.info("Summarizing %d papers, %d already done.", len(pending), report.nb_skipped)
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            for result in executor.map(self._summarize, pending):
+                if result.status == DONE_STATUS and result.usage is not None:
+                    report.nb_done += 1
+                    report.total_tokens += result.usage.total_tokens
+                    report.cost_usd += result.usage.cost_usd
+                else:
+                    report.nb_failed += 1
+        report.duration_seconds = time.perf_counter() - start
+        return report
+
+    def _summarize(self, item: str) -> BatchItemResult:
+        """Summarize a paper and append its result to the output."""
+        start = time.perf_counter()
+        try:
+            summary_result = self.chain.run_chain_with_usage(item, self.token_budget)
+        except Exception as e:
+            logging.exception("Summary of %s failed.", item)
+            result = BatchItemResult(
+                item=item,
+                status=FAILED_STATUS,
+                error=f"{type(e).__name__}: {e}",
+                duration_seconds=time.perf_counter() - start,
+            )
+        else:
+            result = BatchItemResult(
+                item=item,
+                status=DONE_STATUS,
+                summary=summary_result.summary,
+                usage=summary_result.usage,
+                duration_seconds=time.perf_counter() - start,
+            )
+        self._append(result)
+        logging.info("Summary of %s %s in %.1fs.", item, result.status, result.duration_seconds)
+        return result
+
+    def _append(self, result: BatchItemResult) -> None:
+        """Append a result to the output, a line at a time so a crash loses no result."""
+        line = result.model_dump_json() + "\n"
+        with self._lock, self.output_path.open("a", encoding="utf-8") as output:
+            output.write(line)
@@ -0,0 +1,98 @@
+"""Command line summarizing a batch of papers with the configured chain.
+
+The papers are read from a text file, one pdf url or local path per line, or from a directory
+of pdfs. The results are appended to a jsonl file, run the same command again to resume an
+interrupted batch:
+
+    PYTHONPATH=src python -m summarizer.batch papers.txt --output summaries.jsonl
+"""
+import argparse
+import logging
+import os
+from pathlib import Path
+from typing import Any, Optional
+
+import coloredlogs
+from omegaconf import OmegaConf
+
+from summarizer.batch.batch_summarizer import BatchSummarizer
+from summarizer.chains import ChainFactory
+from summarizer.loaders import shutdown_extraction_pools
+
+CONFIG_PATH = Path(os.environ.get("SUMMARIZER_CONFIG_PATH", "./src/summarizer/config/base.yaml"))
+
+
+def read_items(input_path: Path) -> list[str]:
+    """Return the pdfs of a batch.
+
+    Args:
+        input_path (Path): Text file of pdf urls or paths, the blank lines and the lines
+            starting with # are ignored, or directory of pdfs.
+
+    Returns:
+        list[str]: Urls or paths of the pdfs.
+    """
+    if input_path.is_dir():
+        return [str(path) for path in sorted(input_path.glob("*.pdf"))]
+    lines = (line.strip() for line in input_path.read_text(encoding="utf-8").splitlines())
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def load_config(
+    config_path: Path,
+    requests_per_minute: Optional[int] = None,
+    tokens_per_minute: Optional[int] = None,
+) -> dict[str, Any]:
+    """Return the config of the chain, with the rate limit of the batch if given.
+
+    Args:
+        config_path (Path): The path to the YAML configuration file.
+        requests_per_minute (Optional[int]): Maximum number of model calls per minute.
+        tokens_per_minute (Optional[int]): Maximum number of tokens per minute.
+
+    Returns:
+        dict[str, Any]: The config of the chain.
+    """
+    config_dict: dict[str, Any] = OmegaConf.to_container(  # type: ignore[assignment]
+        OmegaConf.load(config_path), resolve=True
+    )
+    rate_limit = dict(config_dict.get("rate-limit") or {})
+    if requests_per_minute is not None:
+        rate_limit["requests_per_minute"] = requests_per_minute
+    if tokens_per_minute is not None:
+        rate_limit["tokens_per_minute"] = tokens_per_minute
+    if rate_limit:
+        config_dict["rate-limit"] = rate_limit
+    return config_dict
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Summarize a batch of papers and print its throughput."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", type=Path, help="File of pdf urls or paths, or pdf directory.")
+    parser.add_argument("--output", type=Path, required=True, help="Jsonl file of the results.")
+    parser.add_argument("--config", type=Path, default=CONFIG_PATH, help="Config of the chain.")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="Papers at once.")
+    parser.add_argument("--requests-per-minute", type=int, help="Rate limit of the model calls.")
+    parser.add_argument("--tokens-per-minute", type=int, help="Rate limit of the tokens.")
+    parser.add_argument("--token-budget", type=int, help="Maximum tokens of a summary.")
+    args = parser.parse_args(argv)
+
+    coloredlogs.install(level=logging.INFO)
+    config_dict = load_config(args.config, args.requests_per_minute, args.tokens_per_minute)
+    batch = BatchSummarizer(
+        chain=ChainFactory.build_chain(config_dict),
+        output_path=args.output,
+        max_concurrency=args.max_concurrency,
+        token_budget=args.token_budget,
+    )
+    try:
+        report = batch.run(read_items(args.input))
+    finally:
+        shutdown_extraction_pools()
+    print(  # noqa: T201
+        f"{report.nb_done} papers summarized, {report.nb_failed} failed and "
+        f"{report.nb_skipped} skipped in {report.duration_seconds:.1f}s: "
+        f"{report.papers_per_minute:.2f} papers/minute, "
+        f"{report.tokens_per_second:.1f} tokens/second, ${report.cost_usd:.4f}."
+    )
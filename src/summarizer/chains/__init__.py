@@ -1,7 +1,18 @@
 """This module implements all the chains."""
 
-from summarizer.chains.base_chain import BaseChain
+from summarizer.chains.base_chain import BaseChain, EmptyDocumentError, UnknownStyleError
 from summarizer.chains.chain_builder import ChainFactory
-from summarizer.chains.map_reduce import MapReduceChain
+from summarizer.chains.chain_stage import ChainStage
+from summarizer.chains.map_reduce import CombineDepthExceededError, MapReduceChain
+from summarizer.chains.progress import SummaryEvent
 
-__all__ = ["BaseChain", "MapReduceChain", "ChainFactory"]
+__all__ = [
+    "BaseChain",
+    "ChainStage",
+    "CombineDepthExceededError",
+    "EmptyDocumentError",
+    "MapReduceChain",
+    "ChainFactory",
+    "SummaryEvent",
+    "UnknownStyleError",
+]
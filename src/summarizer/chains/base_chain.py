@@ -1,12 +1,169 @@
 """This module contains the BaseChain class."""
+import contextvars
+import hashlib
+import logging
+import threading
 from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from typing import Optional
 
 from pydantic import BaseModel
 
+from summarizer.chains.progress import (
+    ProgressListener,
+    SummaryCancelledError,
+    SummaryEvent,
+    listen_progress,
+)
+from summarizer.usage import TOKEN_BUCKETS, SummaryResult, TokenBudgetExceededError, track_usage
+from telemetry import REGISTRY
+
 
 class BaseChain(BaseModel, ABC):
-    """Base class for all chains."""
+    """Base class for all chains.
+
+    Attributes:
+        token_budget (Optional[int]): Maximum number of tokens used by a summary, a document
+            exceeding it is aborted. No limit if None.
+    """
+
+    token_budget: Optional[int] = None
 
     @abstractmethod
     def run_chain(self, pdf_url: str) -> str:
         """Return prediction from model."""
+
+    def run_chain_styles(self, pdf_url: str, styles: list[str]) -> dict[str, str]:
+        """Return the summaries of the paper in several styles.
+
+        Args:
+            pdf_url (str): Url of the pdf.
+            styles (list[str]): Names of the styles.
+
+        Returns:
+            dict[str, str]: Summary of every style.
+
+        Raises:
+            UnknownStyleError: If the chain has no such style, by default it has no style.
+        """
+        msg = f"{type(self).__name__} has no summary style, {styles} cannot be summarized."
+        raise UnknownStyleError(msg)
+
+    def warmup(self) -> None:
+        """Load what the chain loads lazily on its first summary, nothing by default."""
+
+    def fingerprint(self) -> str:
+        """Return the hash of what the summaries of the chain depend on.
+
+        Two chains with the same fingerprint give the same summaries, so their summaries can be
+        shared. By default the fingerprint is the name of the chain.
+
+        Returns:
+            str: Hexadecimal sha256 of the settings of the chain.
+        """
+        return hashlib.sha256(type(self).__name__.encode()).hexdigest()
+
+    def run_chain_with_usage(
+        self,
+        pdf_url: str,
+        token_budget: Optional[int] = None,
+        styles: Optional[list[str]] = None,
+    ) -> SummaryResult:
+        """Return the summary with the tokens used by every model call.
+
+        Args:
+            pdf_url (str): Url of the pdf.
+            token_budget (Optional[int]): Token budget of this summary, overriding the budget
+                of the chain.
+            styles (Optional[list[str]]): Styles of the summaries, the summary of the first
+                style is the main summary. The default summary only if None.
+
+        Returns:
+            SummaryResult: The summary and its token usage.
+
+        Raises:
+            TokenBudgetExceededError: If the summary needs more tokens than the budget.
+        """
+        summaries = {}
+        with track_usage(token_budget or self.token_budget) as tracker:
+            if styles:
+                summaries = self.run_chain_styles(pdf_url, styles)
+                summary = summaries[styles[0]]
+            else:
+                summary = self.run_chain(pdf_url)
+        usage = tracker.usage()
+        REGISTRY.observe("summary_tokens", usage.total_tokens, buckets=TOKEN_BUCKETS)
+        REGISTRY.observe("summary_cost_usd", usage.cost_usd)
+        return SummaryResult(summary=summary, summaries=summaries, usage=usage, calls=tracker.calls)
+
+    def stream_chain_with_usage(
+        self, pdf_url: str, token_budget: Optional[int] = None
+    ) -> Iterator[SummaryEvent]:
+        """Yield the progress of the summary, then the summary with its token usage.
+
+        The events are those of start_streamed_summary, yielded as soon as they are reported.
+        Closing the events before the end cancels the summary.
+
+        Args:
+            pdf_url (str): Url of the pdf.
+            token_budget (Optional[int]): Token budget of this summary, overriding the budget
+                of the chain.
+
+        Yields:
+            SummaryEvent: The events of the summary.
+        """
+        listener = self.start_streamed_summary(pdf_url, token_budget)
+        try:
+            yield from listener.events()
+        finally:
+            # The events are closed early when the client disconnects, the summary is stopped.
+            listener.cancel()
+
+    def start_streamed_summary(
+        self, pdf_url: str, token_budget: Optional[int] = None
+    ) -> ProgressListener:
+        """Start the summary in a background thread reporting its progress to a listener.
+
+        The chains which report nothing only queue the last event: done with the summary
+        result, or error with the status code and the detail of the failure. Cancelling the
+        listener stops the summary at its next report or model call.
+
+        Args:
+            pdf_url (str): Url of the pdf.
+            token_budget (Optional[int]): Token budget of this summary, overriding the budget
+                of the chain.
+
+        Returns:
+            ProgressListener: The listener queueing the events of the summary.
+        """
+        listener = ProgressListener()
+
+        def run() -> None:
+            with listen_progress(listener):
+                try:
+                    result = self.run_chain_with_usage(pdf_url, token_budget)
+                except SummaryCancelledError as e:
+                    logging.info("Streamed summary of %s cancelled.", pdf_url)
+                    listener.close("error", status_code=499, detail=str(e))
+                except TokenBudgetExceededError as e:
+                    listener.close("error", status_code=413, detail=str(e))
+                except EmptyDocumentError as e:
+                    listener.close("error", status_code=422, detail=str(e))
+                except Exception as e:
+                    logging.exception("Streamed summary of %s failed.", pdf_url)
+                    listener.close("error", status_code=500, detail=str(e))
+                else:
+                    listener.close("done", **result.model_dump())
+
+        # The summary runs in a copy of the context so its spans keep the trace id.
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(run,), daemon=True)
+        thread.start()
+        return listener
+
+
+class UnknownStyleError(Exception):
+    """Exception raised when a summary style is not configured in the chain."""
+
+
+class EmptyDocumentError(Exception):
+    """Exception raised when a document has no text to summarize."""
@@ -3,13 +3,14 @@ import os
 from pathlib import Path
 from typing import Any, ClassVar, Optional
 
-from azure.identity import DefaultAzureCredential
-from azure.keyvault.secrets import SecretClient
 from omegaconf import OmegaConf
 
 from summarizer.chains.base_chain import BaseChain
+from summarizer.chains.chain_stage import ChainStage
 from summarizer.chains.map_reduce import MapReduceChain
-from summarizer.models.gpt_models import GPT4oMini, GPTModel
+from summarizer.credentials import get_secret_provider
+from summarizer.models.gpt_models import GPT4oMini, GPT4Turbo128, GPT35Turbo16, GPTModel
+from summarizer.models.rate_limit import get_scheduler
 from summarizer.prompts import MapReduceBase, MapReduceChild, MapReduceNormal
 
 
@@ -17,7 +18,11 @@ class ChainFactory:
     """Factory class for creating chains."""
 
     _chain_registry: ClassVar[dict[str, BaseChain]] = {MapReduceChain.__name__: MapReduceChain}
-    _model_registry: ClassVar[dict[str, GPTModel]] = {GPT4oMini.name: GPT4oMini}
+    _model_registry: ClassVar[dict[str, GPTModel]] = {
+        GPT35Turbo16.name: GPT35Turbo16,
+        GPT4Turbo128.name: GPT4Turbo128,
+        GPT4oMini.name: GPT4oMini,
+    }
     _prompt_registry: ClassVar[dict[str, MapReduceBase]] = {
         MapReduceBase.__name__: MapReduceBase,
         MapReduceChild.__name__: MapReduceChild,
@@ -81,12 +86,46 @@ class ChainFactory:
             raise ValueError(msg)
         return cls._prompt_registry[name](**kwargs)
 
+    @classmethod
+    def create_stages(
+        cls, stages_config: dict[str, dict[str, Any]], model_params: dict[str, Any]
+    ) -> dict[str, ChainStage]:
+        """Creates the stages of a chain, their models share the parameters of the chain model.
+
+        A stage without model runs on the model of the chain, for instance the stages below
+        summarize the chunks with the chain model, 8 at once, and write the final summary with
+        GPT 4 turbo:
+
+            stages:
+              chunk:
+                max_concurrency: 8
+              combine:
+                model: "GPT 4 turbo 128k context"
+
+        Args:
+            stages_config (dict[str, dict[str, Any]]): Registered name of the model and maximum
+                concurrency of every stage, both optional.
+            model_params (dict[str, Any]): Parameters of the models.
+
+        Returns:
+            dict[str, ChainStage]: The stages by name.
+        """
+        stages = {}
+        for stage, stage_config in stages_config.items():
+            model_name = stage_config.get("model")
+            stages[stage] = ChainStage(
+                model=None if model_name is None else cls.create_model(model_name, **model_params),
+                max_concurrency=stage_config.get("max_concurrency"),
+            )
+        return stages
+
     @classmethod
     def build_chain(cls, config_dict: dict[str, Any]) -> BaseChain:
         """Build the chain."""
         model_name = config_dict.get("model")
         model_params = config_dict.get("model-parameters")
         model = cls.create_model(model_name, **model_params)
+        stages = cls.create_stages(config_dict.get("stages") or {}, model_params)
         prompt_name = config_dict.get("prompt")
         prompt_params = config_dict.get("prompt-parameters")
         prompt = (
@@ -94,8 +133,24 @@ class ChainFactory:
             if prompt_params
             else cls.create_prompt(prompt_name)
         )
+        styles = {
+            style: cls.create_prompt(style_prompt_name)
+            for style, style_prompt_name in (config_dict.get("styles") or {}).items()
+        }
+        rate_limit_params = config_dict.get("rate-limit")
+        if rate_limit_params:
+            model_api_names = {model.model_api_name}
+            model_api_names.update(
+                stage.model.model_api_name for stage in stages.values() if stage.model is not None
+            )
+            for model_api_name in model_api_names:
+                get_scheduler(model_api_name).configure(**rate_limit_params)
         chain_name = config_dict.get("chain")
         chain_params = config_dict.get("chain-parameters")
+        if styles:
+            chain_params = {**(chain_params or {}), "styles": styles}
+        if stages:
+            chain_params = {**(chain_params or {}), "stages": stages}
         chain = (
             cls.create_chain(chain_name, model=model, prompt=prompt, **chain_params)
             if chain_params
@@ -176,10 +231,7 @@ class ChainBuilder:
         Returns:
             str: secret value
         """
-        credential = DefaultAzureCredential()
-        secret_client = SecretClient(vault_url=kv_url, credential=credential)
-        secret = secret_client.get_secret(secret_name)
-        return secret.value
+        return get_secret_provider(kv_url).get_secret(secret_name)
 
 
 class BadConfigError(Exception):
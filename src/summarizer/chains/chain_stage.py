@@ -0,0 +1,46 @@
+"""This module implements the configuration of the stages of the map reduce chain."""
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Optional
+
+from pydantic import BaseModel, PrivateAttr
+
+from summarizer.models.base_model import BaseLLM
+
+CHUNK_STAGE = "chunk"
+COLLAPSE_STAGE = "collapse"
+COMBINE_STAGE = "combine"
+STAGES = (CHUNK_STAGE, COLLAPSE_STAGE, COMBINE_STAGE)
+
+
+class ChainStage(BaseModel):
+    """The model and the concurrency of a stage of the chain.
+
+    The chunk stage summarizes the chunks, the collapse stage combines groups of chunk
+    summaries too long for a single prompt and the combine stage writes the final summary.
+    A fast model can summarize the many chunks while a stronger one writes the summary.
+
+    Attributes:
+        model (Optional[BaseLLM]): Model of the stage, the model of the chain if None.
+        max_concurrency (Optional[int]): Maximum number of model calls of the stage running
+            at once, over all the summaries of the chain. The concurrency of the chain if None.
+    """
+
+    model: Optional[BaseLLM] = None
+    max_concurrency: Optional[int] = None
+
+    _semaphore: Optional[threading.BoundedSemaphore] = PrivateAttr(default=None)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Wait until a call of the stage can run, then run the block."""
+        if self.max_concurrency is None:
+            yield
+            return
+        with self._lock:
+            if self._semaphore is None:
+                self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        with self._semaphore:
+            yield
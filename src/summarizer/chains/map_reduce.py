@@ -1,62 +1,442 @@
 """This module implements the map reduce chain."""
-import langchain
-from langchain.document_loaders import PyPDFLoader
+import contextvars
+import hashlib
+import json
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Optional, TypeVar
 
-from summarizer.chains.base_chain import BaseChain
+import pydantic
+from pydantic import Field
+
+from summarizer.chains.base_chain import BaseChain, EmptyDocumentError, UnknownStyleError
+from summarizer.chains.chain_stage import (
+    CHUNK_STAGE,
+    COLLAPSE_STAGE,
+    COMBINE_STAGE,
+    STAGES,
+    ChainStage,
+)
+from summarizer.chains.progress import ProgressListener, get_progress_listener
+from summarizer.checkpoints import SQLiteChunkCheckpointStore, chunk_key
+from summarizer.chunkers import TokenChunker
+from summarizer.extraction import ExtractedDocument, SQLiteTextStore
+from summarizer.loaders import StreamingPDFLoader
 from summarizer.models.base_model import BaseLLM
+from summarizer.preprocessors import TextPreprocessor
 from summarizer.prompts.map_reduce_base import MapReduceBase
+from summarizer.usage import usage_label
+from telemetry import REGISTRY, span, traced, traced_iter
+
+if TYPE_CHECKING:
+    from langchain.schema.document import Document
+
+T = TypeVar("T")
 
 
 class MapReduceChain(BaseChain):
-    """Map reduce chain."""
+    """Map reduce chain.
+
+    Attributes:
+        streaming (bool): Send each chunk to the model as soon as it is created instead of
+            waiting for the whole document to be chunked.
+        max_concurrency (int): Maximum number of model calls running at once, used by the
+            streaming mode and by the intermediate combine levels, unless their stage has its
+            own limit.
+        chunker (TokenChunker): Splits the pages in chunks, its chunk size is capped by the
+            model context minus the text buffer.
+        max_combine_depth (int): Maximum number of intermediate combine levels run when the
+            chunk summaries do not fit in a single combine prompt.
+        text_store (Optional[SQLiteTextStore]): Store of the extracted texts and of their
+            token counts, a stored document is neither downloaded, extracted nor tokenized
+            again.
+        preprocessor (Optional[TextPreprocessor]): Cleans the pages before they are chunked,
+            removing the text not worth summarizing. The pages are chunked as loaded if None.
+        styles (dict[str, MapReduceBase]): Prompts of the summary styles by name. The chunks
+            are summarized once with the prompt of the chain, only the final combine uses the
+            prompt of the style.
+        stages (dict[str, ChainStage]): Model and concurrency of the chunk, collapse and
+            combine stages, a stage missing or without model uses the model of the chain.
+        chunk_checkpoints (Optional[SQLiteChunkCheckpointStore]): Store of the recent chunk
+            summaries, a summary retried after a failure only summarizes the chunks which were
+            not done.
+    """
 
     prompt: MapReduceBase
     model: BaseLLM
     text_buffer: int = 1000
+    loader: StreamingPDFLoader = Field(default_factory=StreamingPDFLoader)
+    chunker: TokenChunker = Field(default_factory=TokenChunker)
+    streaming: bool = False
+    max_concurrency: int = 4
+    max_combine_depth: int = 5
+    text_store: Optional[SQLiteTextStore] = None
+    preprocessor: Optional[TextPreprocessor] = None
+    styles: dict[str, MapReduceBase] = Field(default_factory=dict)
+    stages: dict[str, ChainStage] = Field(default_factory=dict)
+    chunk_checkpoints: Optional[SQLiteChunkCheckpointStore] = None
+
+    @pydantic.field_validator("stages")
+    @classmethod
+    def check_stages(cls, stages: dict[str, ChainStage]) -> dict[str, ChainStage]:
+        """Validate that the stages are stages of the chain."""
+        unknown_stages = set(stages) - set(STAGES)
+        if unknown_stages:
+            msg = f"Unknown stages {sorted(unknown_stages)}, the stages are {list(STAGES)}."
+            raise ValueError(msg)
+        return stages
+
+    def get_stage_model(self, stage: str) -> BaseLLM:
+        """Return the model of a stage.
+
+        Args:
+            stage (str): Name of the stage.
+
+        Returns:
+            BaseLLM: The model of the stage if it has one, else the model of the chain.
+        """
+        config = self.stages.get(stage)
+        return self.model if config is None or config.model is None else config.model
+
+    def fingerprint(self) -> str:
+        """Return the hash of the models, the prompts and the chunking of the chain.
+
+        Returns:
+            str: Hexadecimal sha256 of the settings of the chain.
+        """
+        settings = {
+            "chain": type(self).__name__,
+            "models": {stage: self.get_stage_model(stage).name for stage in STAGES},
+            "prompts": {
+                style: [prompt.get_reduce(""), prompt.get_map([])]
+                for style, prompt in {"": self.prompt, **self.styles}.items()
+            },
+            "text_buffer": self.text_buffer,
+            "chunker": self.chunker.model_dump(),
+            "preprocessor": None if self.preprocessor is None else self.preprocessor.model_dump(),
+            "max_combine_depth": self.max_combine_depth,
+        }
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+    def _get_stage(self, stage: str) -> ChainStage:
+        """Return the configuration of a stage, an unbounded stage if it is not configured."""
+        return self.stages.get(stage) or ChainStage()
+
+    def _predict(self, stage: str, prompt: list[dict[str, str]]) -> str:
+        """Return the prediction of the model of a stage once the stage has a free slot.
 
+        The tokens of the final combine are reported as they are generated if the progress
+        of the summary is streamed. A streamed summary cancelled while waiting for the slot
+        does not call the model.
+        """
+        listener = get_progress_listener()
+        with self._get_stage(stage).slot():
+            if listener is not None:
+                listener.check_cancelled()
+            model = self.get_stage_model(stage)
+            if stage != COMBINE_STAGE or listener is None:
+                prediction: str = model.predict(prompt)
+                return prediction
+            listener.emit("combine")
+            parts = []
+            for token in model.stream_predict(prompt):
+                parts.append(token)
+                listener.emit("token", text=token)
+            return "".join(parts)
+
+    @traced("summarizer.run_chain")
     def run_chain(self, pdf_url: str) -> str:
         """Return prediction from model."""
-        docs = self.load_document_page(pdf_url)
-        map_out = self.create_document_chunk(docs)
-        reduce_out = self.run_reduce(map_out)
+        reduce_out = self._summarize_chunks(pdf_url)
         map_out: str = self.run_map(reduce_out)
         return map_out
 
-    def run_reduce(self, content: list[str]) -> list[str]:
+    @traced("summarizer.run_chain_styles")
+    def run_chain_styles(self, pdf_url: str, styles: list[str]) -> dict[str, str]:
+        """Return the summaries of the paper in several styles from a single map phase.
+
+        The chunk summaries are computed and collapsed once, then the final combine of every
+        style runs in parallel, so an extra style costs a single model call.
+        """
+        unknown_styles = [style for style in styles if style not in self.styles]
+        if unknown_styles:
+            msg = f"Unknown summary styles {unknown_styles}, the styles are {list(self.styles)}."
+            raise UnknownStyleError(msg)
+        styles = list(dict.fromkeys(styles))
+        prompts = [self.styles[style] for style in styles]
+        summaries = self._collapse_summaries(self._summarize_chunks(pdf_url), prompts)
+
+        def combine_style(style: str) -> str:
+            with span("summarizer.combine"), usage_label(f"combine-{style}"):
+                prompt = self.styles[style].get_map(summaries)
+                return self._predict(COMBINE_STAGE, prompt)
+
+        return dict(zip(styles, self._run_concurrently(combine_style, styles, COMBINE_STAGE)))
+
+    def _summarize_chunks(self, pdf_url: str) -> list[str]:
+        """Return the model summaries of the chunks of the document.
+
+        Raises:
+            EmptyDocumentError: If the document has no text, so no chunk to summarize.
+        """
+        if self.chunk_checkpoints is not None:
+            self.chunk_checkpoints.prune()
+        if self.text_store is None:
+            docs = self.load_document_page(pdf_url)
+            map_out = self.create_document_chunk(docs)
+        else:
+            map_out = self.create_stored_document_chunk(pdf_url, self.text_store)
+        listener = get_progress_listener()
+        if listener is not None:
+            map_out = self._report_chunks(map_out, listener)
+        summaries = (
+            self.run_reduce_streaming(map_out) if self.streaming else self.run_reduce(map_out)
+        )
+        if not summaries:
+            msg = f"No text to summarize in {pdf_url}."
+            raise EmptyDocumentError(msg)
+        return summaries
+
+    def run_reduce(self, content: Iterable[str]) -> list[str]:
         """Return prediction from model."""
         predictions = []
-        for chunk in content:
-            prompt = self.prompt.get_reduce(chunk)
-            map_response = self.model.predict(prompt)
-            predictions.append(map_response)
+        for indexed_chunk in enumerate(content):
+            predictions.append(self._reduce_indexed_chunk(indexed_chunk))
         return predictions
 
+    def run_reduce_streaming(self, content: Iterable[str]) -> list[str]:
+        """Return predictions in chunk order, dispatching each chunk as soon as it is yielded.
+
+        Chunk extraction keeps running in the calling thread while the model calls run in a
+        thread pool, so loading the document overlaps with the remote inference.
+        """
+        return self._run_concurrently(self._reduce_indexed_chunk, enumerate(content), CHUNK_STAGE)
+
+    def _reduce_indexed_chunk(self, indexed_chunk: tuple[int, str]) -> str:
+        """Return the model summary of a chunk, labelling its model call with the chunk index."""
+        index, chunk = indexed_chunk
+        with usage_label(f"chunk-{index}"):
+            summary = self._reduce_chunk(chunk)
+        listener = get_progress_listener()
+        if listener is not None:
+            listener.chunk_mapped()
+        return summary
+
+    def _reduce_chunk(self, chunk: str) -> str:
+        """Return the model summary of a single chunk."""
+        prompt = self.prompt.get_reduce(chunk)
+        if self.chunk_checkpoints is None:
+            return self._predict(CHUNK_STAGE, prompt)
+        key = chunk_key(self.get_stage_model(CHUNK_STAGE).name, prompt)
+        summary = self.chunk_checkpoints.get(key)
+        if summary is not None:
+            REGISTRY.increment("chunk_checkpoint_hits_total")
+            return summary
+        summary = self._predict(CHUNK_STAGE, prompt)
+        self.chunk_checkpoints.put(key, summary)
+        return summary
+
     def run_map(self, content: list[str]) -> str:
         """Return prediction from model."""
-        prompt = self.prompt.get_map(content)
-        map_response = self.model.predict(prompt)
-        return map_response
+        summaries = self._collapse_summaries(content, [self.prompt])
+        with span("summarizer.combine"), usage_label("combine"):
+            prompt = self.prompt.get_map(summaries)
+            return self._predict(COMBINE_STAGE, prompt)
+
+    def _collapse_summaries(self, summaries: list[str], prompts: list[MapReduceBase]) -> list[str]:
+        """Combine groups of summaries level by level until they fit in one combine prompt.
 
-    def load_document_page(self, document_url: str) -> list[langchain.schema.document.Document]:
-        """Return document chunk."""
-        loader = PyPDFLoader(document_url)
-        return loader.load_and_split()
+        Each level packs the summaries in groups fitting the model budget and combines the
+        groups in parallel, so a long document needs a logarithmic number of sequential calls.
+        The summaries must fit the combine prompt of every style requested, the intermediate
+        levels are shared by the styles so they use the prompt of the chain.
 
-    def create_document_chunk(
-        self, doc_content: list[langchain.schema.document.Document]
+        Raises:
+            CombineDepthExceededError: If the summaries still do not fit after
+                max_combine_depth levels.
+        """
+        combine_model = self.get_stage_model(COMBINE_STAGE)
+        budget = combine_model.max_token - self.text_buffer
+        collapse_budget = self.get_stage_model(COLLAPSE_STAGE).max_token - self.text_buffer
+
+        def fits(summaries: list[str]) -> bool:
+            return len(summaries) <= 1 or all(
+                self._count_prompt_tokens(summaries, combine_model, prompt) <= budget
+                for prompt in prompts
+            )
+
+        for _ in range(self.max_combine_depth):
+            if fits(summaries):
+                return summaries
+            groups = self._group_summaries(summaries, min(budget, collapse_budget))
+            summaries = self._run_concurrently(self._combine_group, groups, COLLAPSE_STAGE)
+        if not fits(summaries):
+            msg = (
+                f"{len(summaries)} summaries are still over the combine budget of {budget} "
+                f"tokens after {self.max_combine_depth} combine levels."
+            )
+            raise CombineDepthExceededError(msg)
+        return summaries
+
+    def _group_summaries(self, summaries: list[str], budget: int) -> list[list[str]]:
+        """Pack consecutive summaries in groups whose combine prompt fits the budget.
+
+        Groups hold at least two summaries so every level reduces the number of summaries.
+        """
+        model = self.get_stage_model(COLLAPSE_STAGE)
+        prompt_overhead = self._count_prompt_tokens([], model, self.prompt)
+        groups: list[list[str]] = []
+        group: list[str] = []
+        nb_token = prompt_overhead
+        for summary in summaries:
+            nb_token_summary = model.count_tokens(summary) + 1
+            if len(group) > 1 and nb_token + nb_token_summary > budget:
+                groups.append(group)
+                group = []
+                nb_token = prompt_overhead
+            group.append(summary)
+            nb_token += nb_token_summary
+        groups.append(group)
+        return groups
+
+    def _combine_group(self, group: list[str]) -> str:
+        """Return the model summary of a group of summaries."""
+        if len(group) == 1:
+            return group[0]
+        prompt = self.prompt.get_map(group)
+        with usage_label("collapse"):
+            return self._predict(COLLAPSE_STAGE, prompt)
+
+    @staticmethod
+    def _count_prompt_tokens(summaries: list[str], model: BaseLLM, prompt: MapReduceBase) -> int:
+        """Return the number of tokens of the combine prompt of the summaries."""
+        messages = prompt.get_map(summaries)
+        return sum(model.count_tokens(message["content"]) for message in messages)
+
+    def _run_concurrently(
+        self, func: Callable[[T], str], items: Iterable[T], stage: str
     ) -> list[str]:
-        """Return document chunk."""
-        chunk = []
-        content = ""
-        nb_token = 0
-        for page in doc_content:
-            nb_token_page = self.model.count_tokens(page.page_content)
-            if nb_token + nb_token_page < self.model.max_token - self.text_buffer:
-                content += "\n" + page.page_content
-                nb_token += self.model.count_tokens(page.page_content)
-            else:
-                chunk.append(content)
-                content = "\n" + page.page_content
-                nb_token = nb_token_page
-        chunk.append(content)
-        return chunk
+        """Return the results of func on every item, in order, using a bounded thread pool.
+
+        The pool has as many threads as the stage allows concurrent calls. Once a streamed
+        summary is cancelled, no item is submitted anymore and the items not started are
+        dropped.
+        """
+        max_workers = self._get_stage(stage).max_concurrency or self.max_concurrency
+        listener = get_progress_listener()
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            futures: list[Future[str]] = []
+            for item in items:
+                if listener is not None:
+                    listener.check_cancelled()
+                # Each call runs in a copy of the context so the spans keep the trace id.
+                futures.append(executor.submit(contextvars.copy_context().run, func, item))
+            results = [future.result() for future in futures]
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        return results
+
+    def warmup(self) -> None:
+        """Load the dependencies of the models before the first summary."""
+        models = [self.get_stage_model(stage) for stage in STAGES]
+        for model in {id(model): model for model in models}.values():
+            model.warmup()
+
+    def load_document_page(self, document_url: str) -> Iterator["Document"]:
+        """Lazily yield the pages of the document."""
+        return traced_iter("summarizer.load_page", self.loader.lazy_load(document_url))
+
+    def create_document_chunk(self, doc_content: Iterable["Document"]) -> Iterator[str]:
+        """Yield document chunks as soon as they reach the token budget."""
+        return self._split(doc_content, self.get_stage_model(CHUNK_STAGE).count_tokens)
+
+    def create_stored_document_chunk(
+        self, document_url: str, text_store: SQLiteTextStore
+    ) -> Iterator[str]:
+        """Yield document chunks, reading the text and the token counts of its pages from the store.
+
+        A document missing from the store is loaded and chunked as usual, then its text and
+        the token counts of its pages are stored once it is fully read. The pieces of the pages
+        cut by the chunker are counted on the fly, their counts are only kept for the chunking.
+        """
+        document = text_store.get(document_url)
+        model = self.get_stage_model(CHUNK_STAGE)
+        encoding = model.token_encoding
+        counts: dict[str, int] = {}
+        page_counts = None
+        if document is None:
+            pages: list[str] = []
+            docs = self._record_pages(self.load_document_page(document_url), pages)
+        else:
+            pages = document.pages
+            page_counts = text_store.get_token_counts(document.content_hash, encoding)
+            if page_counts is not None:
+                counts.update(zip(pages, page_counts))
+            docs = self._stored_pages(document_url, document)
+
+        def count_tokens(text: str) -> int:
+            nb_token = counts.get(text)
+            if nb_token is None:
+                nb_token = counts[text] = model.count_tokens(text)
+            return nb_token
+
+        yield from self._split(docs, count_tokens)
+        if document is None:
+            document = text_store.put(document_url, pages)
+        if page_counts is None:
+            page_counts = [count_tokens(page) for page in pages]
+            text_store.save_token_counts(document.content_hash, encoding, page_counts)
+
+    def _split(
+        self, doc_content: Iterable["Document"], count_tokens: Callable[[str], int]
+    ) -> Iterator[str]:
+        """Yield the chunks of the pages, cleaned first by the preprocessor if any."""
+        listener = get_progress_listener()
+        if listener is not None:
+            doc_content = self._report_pages(doc_content, listener)
+        if self.preprocessor is not None:
+            doc_content = traced_iter(
+                "summarizer.preprocess", self.preprocessor.clean_pages(doc_content, count_tokens)
+            )
+        budget = self.get_stage_model(CHUNK_STAGE).max_token - self.text_buffer
+        chunks = self.chunker.split(doc_content, count_tokens, budget)
+        return traced_iter("summarizer.chunk", chunks)
+
+    @staticmethod
+    def _report_pages(
+        docs: Iterable["Document"], listener: ProgressListener
+    ) -> Iterator["Document"]:
+        """Yield the pages, reporting every page loaded."""
+        for doc in docs:
+            listener.page_loaded()
+            yield doc
+
+    @staticmethod
+    def _report_chunks(chunks: Iterable[str], listener: ProgressListener) -> Iterator[str]:
+        """Yield the chunks, reporting their number once they are all created."""
+        for chunk in chunks:
+            listener.chunk_created()
+            yield chunk
+        listener.chunking_done()
+
+    @staticmethod
+    def _record_pages(docs: Iterable["Document"], pages: list[str]) -> Iterator["Document"]:
+        """Yield the pages, appending their text to the list."""
+        for doc in docs:
+            pages.append(doc.page_content)
+            yield doc
+
+    @staticmethod
+    def _stored_pages(document_url: str, document: ExtractedDocument) -> Iterator["Document"]:
+        """Yield the stored pages of a document like the loader does."""
+        from langchain.schema.document import Document
+
+        for page_number, text in enumerate(document.pages):
+            yield Document(
+                page_content=text, metadata={"source": document_url, "page": page_number}
+            )
+
+
+class CombineDepthExceededError(Exception):
+    """Exception raised when the summaries do not fit the combine prompt within the depth."""
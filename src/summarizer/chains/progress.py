@@ -0,0 +1,159 @@
+"""This module implements the progress events of a streamed summary.
+
+The chain reports its progress to the listener of the current context, the context is copied
+to the threads of the chain so the model calls of the chunks report to the same listener.
+Without listener, the reports do nothing.
+"""
+import json
+import queue
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+
+class SummaryEvent(BaseModel):
+    """An event of a streamed summary.
+
+    Attributes:
+        event (str): Kind of the event: page, chunk_mapped, chunks, combine, token, done or
+            error.
+        data (dict[str, Any]): Content of the event.
+    """
+
+    event: str
+    data: dict[str, Any] = Field(default_factory=dict)
+
+    def to_sse(self) -> str:
+        r"""Return the event encoded as a server-sent event.
+
+        Returns:
+            str: The event and its json data.
+
+        Examples:
+            >>> SummaryEvent(event="token", data={"text": "A"}).to_sse()
+            'event: token\ndata: {"text": "A"}\n\n'
+        """
+        return f"event: {self.event}\ndata: {json.dumps(self.data)}\n\n"
+
+
+class ProgressListener(BaseModel):
+    """This listener counts the progress of a summary and queues its events.
+
+    It is shared by the threads of the summary, so it is safe to use concurrently. Once the
+    listener is cancelled, because no one reads its events anymore, the next report raises so
+    the summary stops instead of calling the models for nothing.
+    """
+
+    _events: queue.Queue[Optional[SummaryEvent]] = PrivateAttr(default_factory=queue.Queue)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _nb_pages: int = PrivateAttr(default=0)
+    _nb_chunks: int = PrivateAttr(default=0)
+    _nb_mapped: int = PrivateAttr(default=0)
+    _chunking_done: bool = PrivateAttr(default=False)
+    _cancelled: threading.Event = PrivateAttr(default_factory=threading.Event)
+
+    def emit(self, event: str, **data: Any) -> None:
+        """Queue an event.
+
+        Args:
+            event (str): Kind of the event.
+            **data (Any): Content of the event.
+
+        Raises:
+            SummaryCancelledError: If the listener is cancelled.
+        """
+        self.check_cancelled()
+        self._events.put(SummaryEvent(event=event, data=data))
+
+    def check_cancelled(self) -> None:
+        """Raise if the listener is cancelled, before starting work nobody waits for.
+
+        Raises:
+            SummaryCancelledError: If the listener is cancelled.
+        """
+        if self._cancelled.is_set():
+            msg = "The summary was cancelled by its listener."
+            raise SummaryCancelledError(msg)
+
+    def close(self, event: str, **data: Any) -> None:
+        """Queue the last event, even if the listener is cancelled, and mark the end.
+
+        Args:
+            event (str): Kind of the last event: done or error.
+            **data (Any): Content of the event.
+        """
+        self._events.put(SummaryEvent(event=event, data=data))
+        self._events.put(None)
+
+    def cancel(self) -> None:
+        """Stop the summary at its next report."""
+        self._cancelled.set()
+
+    def next_event(self) -> Optional[SummaryEvent]:
+        """Return the next event once it is queued, None once the listener is closed."""
+        return self._events.get()
+
+    def events(self) -> Iterator[SummaryEvent]:
+        """Yield the events as they are queued, until the listener is closed."""
+        while (event := self.next_event()) is not None:
+            yield event
+
+    def page_loaded(self) -> None:
+        """Report a page loaded."""
+        with self._lock:
+            self._nb_pages += 1
+            nb_pages = self._nb_pages
+        self.emit("page", nb_pages=nb_pages)
+
+    def chunk_created(self) -> None:
+        """Count a chunk created, the chunks are reported once they are all created."""
+        with self._lock:
+            self._nb_chunks += 1
+
+    def chunking_done(self) -> None:
+        """Report the number of chunks once the document is chunked."""
+        with self._lock:
+            self._chunking_done = True
+            nb_chunks = self._nb_chunks
+        self.emit("chunks", nb_chunks=nb_chunks)
+
+    def chunk_mapped(self) -> None:
+        """Report a chunk summarized, with the number of chunks if they are all created."""
+        with self._lock:
+            self._nb_mapped += 1
+            nb_mapped = self._nb_mapped
+            nb_chunks = self._nb_chunks if self._chunking_done else None
+        self.emit("chunk_mapped", nb_mapped=nb_mapped, nb_chunks=nb_chunks)
+
+
+_listener: ContextVar[Optional[ProgressListener]] = ContextVar("progress_listener", default=None)
+
+
+@contextmanager
+def listen_progress(listener: ProgressListener) -> Iterator[ProgressListener]:
+    """Report the progress of the summary run in the block to a listener.
+
+    Args:
+        listener (ProgressListener): The listener.
+
+    Yields:
+        ProgressListener: The listener.
+    """
+    token = _listener.set(listener)
+    try:
+        yield listener
+    finally:
+        _listener.reset(token)
+
+
+def get_progress_listener() -> Optional[ProgressListener]:
+    """Return the listener of the current summary, None if its progress is not streamed."""
+    return _listener.get()
+
+
+class SummaryCancelledError(Exception):
+    """Exception raised when a streamed summary is no longer listened to."""
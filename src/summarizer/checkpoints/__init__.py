@@ -0,0 +1,5 @@
+"""This modules implements the checkpoints of the chunk summaries."""
+
+from summarizer.checkpoints.chunk_checkpoints import SQLiteChunkCheckpointStore, chunk_key
+
+__all__ = ["SQLiteChunkCheckpointStore", "chunk_key"]
@@ -0,0 +1,99 @@
+"""This module implements a persistent store for the summaries of the chunks.
+
+A summary which fails or times out, after most of its chunks were summarized, is usually
+requested again. The chunk summaries are kept for a while so the retry only summarizes the
+chunks which were not done, then combines them.
+"""
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+from summarizer.sqlite_utils import transaction
+
+CREATE_TABLE_QUERY = """
+    CREATE TABLE IF NOT EXISTS chunk_summaries (
+        key TEXT PRIMARY KEY,
+        summary TEXT NOT NULL,
+        created_at REAL NOT NULL
+    )
+"""
+
+
+class SQLiteChunkCheckpointStore(BaseModel):
+    """This store keeps the summaries of the chunks in a SQLite database.
+
+    A summary is keyed by the model and the prompt of its chunk, so a change of the prompt, of
+    the model or of the chunking does not reuse it. The summaries older than max_age_seconds
+    are neither served nor kept, they are checkpoints of the recent runs, not a cache.
+
+    Attributes:
+        db_path (Path): Path of the SQLite database file.
+        max_age_seconds (float): Time a chunk summary is kept.
+    """
+
+    db_path: Path
+    max_age_seconds: float = 24 * 3600
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the summary of a chunk.
+
+        Args:
+            key (str): Key of the chunk.
+
+        Returns:
+            Optional[str]: The summary, None if the chunk was not summarized recently.
+        """
+        with transaction(self.db_path, (CREATE_TABLE_QUERY,)) as connection:
+            row = connection.execute(
+                "SELECT summary FROM chunk_summaries WHERE key = ? AND created_at >= ?",
+                (key, time.time() - self.max_age_seconds),
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def put(self, key: str, summary: str) -> None:
+        """Store the summary of a chunk.
+
+        Args:
+            key (str): Key of the chunk.
+            summary (str): Summary of the chunk.
+        """
+        with transaction(self.db_path, (CREATE_TABLE_QUERY,)) as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO chunk_summaries (key, summary, created_at) "
+                "VALUES (?, ?, ?)",
+                (key, summary, time.time()),
+            )
+
+    def prune(self) -> int:
+        """Delete the summaries older than max_age_seconds.
+
+        Returns:
+            int: Number of summaries deleted.
+        """
+        with transaction(self.db_path, (CREATE_TABLE_QUERY,)) as connection:
+            cursor = connection.execute(
+                "DELETE FROM chunk_summaries WHERE created_at < ?",
+                (time.time() - self.max_age_seconds,),
+            )
+        return cursor.rowcount
+
+
+def chunk_key(model_name: str, prompt: Any) -> str:
+    """Return the key of the summary of a chunk.
+
+    Args:
+        model_name (str): Name of the model summarizing the chunk.
+        prompt (Any): Prompt of the chunk.
+
+    Returns:
+        str: Hexadecimal sha256 of the model name and of the prompt.
+
+    Examples:
+        >>> chunk_key("GPT", [{"content": "a"}]) != chunk_key("Other", [{"content": "a"}])
+        True
+    """
+    return hashlib.sha256(json.dumps([model_name, prompt]).encode()).hexdigest()
@@ -0,0 +1,5 @@
+"""This modules implements the document chunkers."""
+
+from summarizer.chunkers.token_chunker import TokenChunker
+
+__all__ = ["TokenChunker"]
@@ -0,0 +1,180 @@
+"""This module implements a token budgeted chunker."""
+import re
+from collections.abc import Iterable, Iterator
+from typing import TYPE_CHECKING, Callable, Optional
+
+import pydantic
+from pydantic import BaseModel
+
+if TYPE_CHECKING:
+    from langchain.schema.document import Document
+
+PARAGRAPH_SEPARATOR = re.compile(r"\n\s*\n")
+SENTENCE_SEPARATOR = re.compile(r"(?<=[.!?])\s+")
+
+
+class TokenChunker(BaseModel):
+    """This chunker packs pages into chunks of a target number of tokens.
+
+    Pages are cut on paragraph boundaries, paragraphs bigger than the budget are cut on
+    sentence boundaries and sentences bigger than the budget are cut between words. A small
+    chunk size gives more chunks summarized in parallel, a big one gives fewer model calls.
+
+    Attributes:
+        chunk_size (Optional[int]): Target number of tokens per chunk. Defaults to the budget
+            given by the model context.
+        chunk_overlap (int): Number of tokens from the end of a chunk repeated at the start of
+            the next one.
+    """
+
+    chunk_size: Optional[int] = None
+    chunk_overlap: int = 0
+
+    @pydantic.model_validator(mode="after")
+    def check_overlap(self) -> "TokenChunker":
+        """Validate that the overlap is smaller than the chunk size."""
+        if self.chunk_overlap < 0:
+            msg = "Chunk overlap cannot be negative."
+            raise ValueError(msg)
+        if self.chunk_size is not None and self.chunk_overlap >= self.chunk_size:
+            msg = "Chunk overlap must be smaller than the chunk size."
+            raise ValueError(msg)
+        return self
+
+    def split(
+        self,
+        pages: Iterable["Document"],
+        count_tokens: Callable[[str], int],
+        max_tokens: int,
+    ) -> Iterator[str]:
+        """Yield chunks as soon as they are full.
+
+        Args:
+            pages (Iterable[Document]): Pages of the document.
+            count_tokens (Callable[[str], int]): Function returning the number of tokens of a text.
+            max_tokens (int): Maximum number of tokens of a chunk allowed by the model.
+
+        Yields:
+            str: Text of a chunk, never empty.
+        """
+        budget = max_tokens if self.chunk_size is None else min(self.chunk_size, max_tokens)
+        chunk: list[tuple[str, int]] = []
+        nb_token = 0
+        for page in pages:
+            for unit, nb_token_unit in self._split_text(page.page_content, count_tokens, budget):
+                if chunk and nb_token + nb_token_unit > budget:
+                    yield "\n".join(text for text, _ in chunk)
+                    chunk = self._get_overlap(chunk, budget - nb_token_unit, count_tokens)
+                    nb_token = sum(nb_token_text for _, nb_token_text in chunk)
+                chunk.append((unit, nb_token_unit))
+                nb_token += nb_token_unit
+        if chunk:
+            yield "\n".join(text for text, _ in chunk)
+
+    def _get_overlap(
+        self, chunk: list[tuple[str, int]], room: int, count_tokens: Callable[[str], int]
+    ) -> list[tuple[str, int]]:
+        """Return the end of a chunk to repeat in the next one.
+
+        The last units are repeated whole while they fit in the overlap, the rest of the
+        overlap is filled with the last words of the unit before them, so a long last sentence
+        still gives an overlap.
+
+        Args:
+            chunk (list[tuple[str, int]]): Units of the closed chunk with their number of tokens.
+            room (int): Number of tokens left in the next chunk once its first unit is added.
+            count_tokens (Callable[[str], int]): Function returning the number of tokens of a text.
+
+        Returns:
+            list[tuple[str, int]]: Trailing units and words fitting in the overlap.
+        """
+        max_overlap = min(self.chunk_overlap, room)
+        overlap: list[tuple[str, int]] = []
+        nb_token = 0
+        for text, nb_token_text in reversed(chunk):
+            if nb_token + nb_token_text > max_overlap:
+                tail, nb_token_tail = self._tail_words(text, count_tokens, max_overlap - nb_token)
+                if tail:
+                    overlap.insert(0, (tail, nb_token_tail))
+                break
+            overlap.insert(0, (text, nb_token_text))
+            nb_token += nb_token_text
+        return overlap
+
+    @staticmethod
+    def _tail_words(text: str, count_tokens: Callable[[str], int], budget: int) -> tuple[str, int]:
+        """Return the last words of a text within the budget.
+
+        Args:
+            text (str): Text of a unit.
+            count_tokens (Callable[[str], int]): Function returning the number of tokens of a text.
+            budget (int): Maximum number of tokens of the words.
+
+        Returns:
+            tuple[str, int]: The last words, empty if none fits, and their number of tokens.
+        """
+        words: list[str] = []
+        nb_token = 0
+        for word in reversed(text.split()):
+            nb_token_word = count_tokens(" " + word)
+            if nb_token + nb_token_word > budget:
+                break
+            words.append(word)
+            nb_token += nb_token_word
+        return " ".join(reversed(words)), nb_token
+
+    @staticmethod
+    def _split_text(
+        text: str, count_tokens: Callable[[str], int], budget: int
+    ) -> Iterator[tuple[str, int]]:
+        """Cut a text in units smaller than the budget on the most natural boundary.
+
+        Args:
+            text (str): Text of a page.
+            count_tokens (Callable[[str], int]): Function returning the number of tokens of a text.
+            budget (int): Maximum number of tokens of a unit.
+
+        Yields:
+            tuple[str, int]: A unit of text and its number of tokens.
+        """
+        for raw_paragraph in PARAGRAPH_SEPARATOR.split(text):
+            paragraph = raw_paragraph.strip()
+            if not paragraph:
+                continue
+            nb_token = count_tokens(paragraph)
+            if nb_token <= budget:
+                yield paragraph, nb_token
+                continue
+            for sentence in SENTENCE_SEPARATOR.split(paragraph):
+                nb_token = count_tokens(sentence)
+                if nb_token <= budget:
+                    yield sentence, nb_token
+                    continue
+                yield from TokenChunker._split_words(sentence, count_tokens, budget)
+
+    @staticmethod
+    def _split_words(
+        text: str, count_tokens: Callable[[str], int], budget: int
+    ) -> Iterator[tuple[str, int]]:
+        """Cut a text between words in units smaller than the budget.
+
+        Args:
+            text (str): Text without a paragraph or sentence boundary.
+            count_tokens (Callable[[str], int]): Function returning the number of tokens of a text.
+            budget (int): Maximum number of tokens of a unit.
+
+        Yields:
+            tuple[str, int]: A unit of text and its number of tokens.
+        """
+        words: list[str] = []
+        nb_token = 0
+        for word in text.split():
+            nb_token_word = count_tokens(" " + word)
+            if words and nb_token + nb_token_word > budget:
+                yield " ".join(words), nb_token
+                words = []
+                nb_token = 0
+            words.append(word)
+            nb_token += nb_token_word
+        if words:
+            yield " ".join(words), nb_token
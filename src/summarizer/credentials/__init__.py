@@ -0,0 +1,21 @@
+"""This modules implements the providers of the secrets."""
+
+from summarizer.credentials.secret_provider import (
+    CachedSecretProvider,
+    EnvSecretProvider,
+    FileSecretProvider,
+    KeyVaultSecretProvider,
+    SecretNotFoundError,
+    SecretProvider,
+    get_secret_provider,
+)
+
+__all__ = [
+    "CachedSecretProvider",
+    "EnvSecretProvider",
+    "FileSecretProvider",
+    "KeyVaultSecretProvider",
+    "SecretNotFoundError",
+    "SecretProvider",
+    "get_secret_provider",
+]
@@ -0,0 +1,252 @@
+"""This module implements the providers of the secrets used by the summarizer."""
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Optional
+
+from pydantic import BaseModel, PrivateAttr
+
+SECRETS_DIR_ENV_VAR = "SECRETS_DIR"
+
+
+class SecretProvider(BaseModel, ABC):
+    """Base class of the secret providers."""
+
+    @abstractmethod
+    def get_secret(self, name: str) -> str:
+        """Return the value of a secret.
+
+        Args:
+            name (str): Name of the secret.
+
+        Returns:
+            str: Value of the secret.
+
+        Raises:
+            SecretNotFoundError: If the provider has no such secret.
+        """
+
+
+class KeyVaultSecretProvider(SecretProvider):
+    """This provider reads the secrets of an azure keyvault.
+
+    The credential and the client are created once, on the first read, the azure sdk being
+    slow to import and the credential slow to create.
+
+    Attributes:
+        kv_url (str): URI of the azure keyvault.
+    """
+
+    kv_url: str
+
+    _client: Any = PrivateAttr(default=None)
+    _client_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def get_secret(self, name: str) -> str:
+        """Return the value of a secret of the keyvault."""
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            secret = self._get_client().get_secret(name)
+        except ResourceNotFoundError as e:
+            msg = f"Secret {name} not found in the keyvault {self.kv_url}."
+            raise SecretNotFoundError(msg) from e
+        return secret.value
+
+    def _get_client(self) -> Any:
+        """Return the client of the keyvault, creating it on the first call."""
+        with self._client_lock:
+            if self._client is None:
+                from azure.identity import DefaultAzureCredential
+                from azure.keyvault.secrets import SecretClient
+
+                self._client = SecretClient(
+                    vault_url=self.kv_url, credential=DefaultAzureCredential()
+                )
+            return self._client
+
+
+class EnvSecretProvider(SecretProvider):
+    """This provider reads the secrets from environment variables, for offline use.
+
+    The variable of a secret is its name in upper case prefixed, e.g. SECRET_OPENAI.
+
+    Attributes:
+        prefix (str): Prefix of the environment variables.
+    """
+
+    prefix: str = "SECRET_"
+
+    def get_secret(self, name: str) -> str:
+        """Return the value of the environment variable of a secret."""
+        variable = f"{self.prefix}{name.upper().replace('-', '_')}"
+        value = os.environ.get(variable)
+        if value is None:
+            msg = f"Secret {name} not found, the environment variable {variable} is not set."
+            raise SecretNotFoundError(msg)
+        return value
+
+
+class FileSecretProvider(SecretProvider):
+    """This provider reads the secrets from the files of a directory, for offline use.
+
+    Every secret is a file named after the secret, like the docker and kubernetes secrets.
+
+    Attributes:
+        directory (Path): Directory of the secret files.
+    """
+
+    directory: Path
+
+    def get_secret(self, name: str) -> str:
+        """Return the content of the file of a secret, without the trailing whitespace."""
+        path = self.directory / name
+        if not path.is_file():
+            msg = f"Secret {name} not found, the file {path} does not exist."
+            raise SecretNotFoundError(msg)
+        return path.read_text(encoding="utf-8").rstrip()
+
+
+class CachedSecretProvider(SecretProvider):
+    """This provider caches the secrets of another provider and refreshes them in background.
+
+    A secret is read once and kept for its time to live. A little before it expires, a
+    background timer reads it again, so the callers only wait for the provider on the first
+    read of a secret, or if every refresh failed until its expiry. A failed refresh is logged
+    and retried.
+
+    Attributes:
+        provider (SecretProvider): Provider of the secrets.
+        ttl_seconds (float): Time to live of a secret.
+        refresh_margin_seconds (float): Time before the expiry of a secret its refresh starts.
+        retry_seconds (float): Delay before retrying a failed refresh.
+    """
+
+    provider: SecretProvider
+    ttl_seconds: float = 3600.0
+    refresh_margin_seconds: float = 300.0
+    retry_seconds: float = 30.0
+
+    _secrets: dict[str, tuple[str, float]] = PrivateAttr(default_factory=dict)
+    _locks: dict[str, threading.Lock] = PrivateAttr(default_factory=dict)
+    _timers: dict[str, threading.Timer] = PrivateAttr(default_factory=dict)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def get_secret(self, name: str) -> str:
+        """Return a secret from the cache, reading it from the provider if it is not cached."""
+        value = self._get_cached(name)
+        if value is not None:
+            return value
+        with self._get_lock(name):
+            value = self._get_cached(name)
+            if value is not None:
+                return value
+            return self._fetch(name)
+
+    def prefetch(self, name: str) -> None:
+        """Read a secret in background if it is not cached, the errors are only logged.
+
+        Args:
+            name (str): Name of the secret.
+        """
+        if self._get_cached(name) is None:
+            threading.Thread(target=self._prefetch, args=(name,), daemon=True).start()
+
+    def close(self) -> None:
+        """Cancel the background refreshes."""
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+
+    def _get_cached(self, name: str) -> Optional[str]:
+        """Return a secret if it is cached and not expired, else None."""
+        cached = self._secrets.get(name)
+        if cached is None or cached[1] <= self._now():
+            return None
+        return cached[0]
+
+    def _get_lock(self, name: str) -> threading.Lock:
+        """Return the lock of a secret, so it is read by one thread at a time."""
+        with self._lock:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def _fetch(self, name: str) -> str:
+        """Read a secret from the provider, cache it and schedule its refresh."""
+        value = self.provider.get_secret(name)
+        self._secrets[name] = (value, self._now() + self.ttl_seconds)
+        self._schedule_refresh(name, max(0.0, self.ttl_seconds - self.refresh_margin_seconds))
+        return value
+
+    def _refresh(self, name: str) -> None:
+        """Read a secret again before it expires, retrying later on failure."""
+        with self._get_lock(name):
+            try:
+                self._fetch(name)
+            except Exception:  # noqa: BLE001
+                logging.warning("Refresh of the secret %s failed.", name, exc_info=True)
+                self._schedule_refresh(name, self.retry_seconds)
+
+    def _prefetch(self, name: str) -> None:
+        """Read a secret, logging the errors."""
+        try:
+            self.get_secret(name)
+        except Exception:  # noqa: BLE001
+            logging.warning("Prefetch of the secret %s failed.", name, exc_info=True)
+
+    def _now(self) -> float:
+        """Return the time of the cache, in seconds."""
+        return time.monotonic()
+
+    def _create_timer(self, delay_seconds: float, name: str) -> threading.Timer:
+        """Return the timer refreshing a secret after a delay, not started."""
+        timer = threading.Timer(delay_seconds, self._refresh, args=(name,))
+        timer.daemon = True
+        return timer
+
+    def _schedule_refresh(self, name: str, delay_seconds: float) -> None:
+        """Start the timer refreshing a secret, replacing its previous timer."""
+        timer = self._create_timer(delay_seconds, name)
+        with self._lock:
+            previous = self._timers.pop(name, None)
+            if previous is not None:
+                previous.cancel()
+            self._timers[name] = timer
+        timer.start()
+
+
+_providers: dict[Optional[str], CachedSecretProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def get_secret_provider(kv_url: Optional[str] = None) -> CachedSecretProvider:
+    """Return the cached provider of the secrets, shared by all the models.
+
+    The secrets are read from the files of the directory given by the SECRETS_DIR environment
+    variable if it is set, else from the keyvault if any, else from the environment variables.
+
+    Args:
+        kv_url (Optional[str]): URI of the azure keyvault.
+
+    Returns:
+        CachedSecretProvider: The provider.
+    """
+    with _providers_lock:
+        if kv_url not in _providers:
+            secrets_dir = os.environ.get(SECRETS_DIR_ENV_VAR)
+            provider: SecretProvider
+            if secrets_dir:
+                provider = FileSecretProvider(directory=Path(secrets_dir))
+            elif kv_url is not None:
+                provider = KeyVaultSecretProvider(kv_url=kv_url)
+            else:
+                provider = EnvSecretProvider()
+            _providers[kv_url] = CachedSecretProvider(provider=provider)
+        return _providers[kv_url]
+
+
+class SecretNotFoundError(Exception):
+    """Custom exception for the secrets missing from a provider."""
@@ -0,0 +1,5 @@
+"""This modules implements the store of the texts extracted from the pdfs."""
+
+from summarizer.extraction.text_store import ExtractedDocument, SQLiteTextStore
+
+__all__ = ["ExtractedDocument", "SQLiteTextStore"]
@@ -0,0 +1,179 @@
+"""This module implements a persistent store for the texts extracted from the pdfs.
+
+The summary of a paper depends on the prompts and on the model, the text extracted from its
+pdf does not. Keeping the texts apart from the summaries lets a corpus be summarized again,
+after a prompt change, without downloading, extracting and tokenizing its papers again.
+"""
+import hashlib
+import json
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+from summarizer.sqlite_utils import transaction
+
+CREATE_TABLE_QUERIES = (
+    """
+    CREATE TABLE IF NOT EXISTS documents (
+        content_hash TEXT PRIMARY KEY,
+        nb_pages INTEGER NOT NULL,
+        pages BLOB NOT NULL,
+        created_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS urls (
+        url TEXT PRIMARY KEY,
+        content_hash TEXT NOT NULL REFERENCES documents (content_hash),
+        updated_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS page_token_counts (
+        content_hash TEXT NOT NULL REFERENCES documents (content_hash),
+        encoding TEXT NOT NULL,
+        counts BLOB NOT NULL,
+        PRIMARY KEY (content_hash, encoding)
+    )
+    """,
+)
+
+
+class ExtractedDocument(BaseModel):
+    """The text extracted from a pdf.
+
+    Attributes:
+        content_hash (str): Hash of the page texts, shared by the urls serving the same pdf.
+        pages (list[str]): Text of every page.
+    """
+
+    content_hash: str
+    pages: list[str]
+
+
+class SQLiteTextStore(BaseModel):
+    """This store keeps the extracted texts and their token counts in a SQLite database.
+
+    The texts are stored once per content hash, compressed, and the urls are an index to
+    them. The token counts are stored per encoding, since they depend on the tokenizer of the
+    model, as the number of tokens of every page in the order of the pages.
+
+    Attributes:
+        db_path (Path): Path of the SQLite database file.
+    """
+
+    db_path: Path
+
+    def get(self, url: str) -> Optional[ExtractedDocument]:
+        """Return the text extracted from a pdf.
+
+        Args:
+            url (str): Url of the pdf.
+
+        Returns:
+            Optional[ExtractedDocument]: The extracted text, None if the pdf is not stored.
+        """
+        with transaction(self.db_path, CREATE_TABLE_QUERIES) as connection:
+            row = connection.execute(
+                "SELECT documents.content_hash, documents.pages FROM urls "
+                "JOIN documents ON documents.content_hash = urls.content_hash WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        content_hash, pages = row
+        return ExtractedDocument(content_hash=content_hash, pages=_decompress(pages))
+
+    def put(self, url: str, pages: list[str]) -> ExtractedDocument:
+        """Store the text extracted from a pdf, the same text is stored once for all its urls.
+
+        Args:
+            url (str): Url of the pdf.
+            pages (list[str]): Text of every page.
+
+        Returns:
+            ExtractedDocument: The stored text.
+        """
+        document = ExtractedDocument(content_hash=hash_pages(pages), pages=pages)
+        now = time.time()
+        with transaction(self.db_path, CREATE_TABLE_QUERIES) as connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO documents (content_hash, nb_pages, pages, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (document.content_hash, len(pages), _compress(pages), now),
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO urls (url, content_hash, updated_at) VALUES (?, ?, ?)",
+                (url, document.content_hash, now),
+            )
+        return document
+
+    def get_token_counts(self, content_hash: str, encoding: str) -> Optional[list[int]]:
+        """Return the token counts of the pages of a document.
+
+        Args:
+            content_hash (str): Hash of the document.
+            encoding (str): Name of the encoding of the tokens.
+
+        Returns:
+            Optional[list[int]]: Number of tokens of every page, None if they were not stored.
+        """
+        with transaction(self.db_path, CREATE_TABLE_QUERIES) as connection:
+            row = connection.execute(
+                "SELECT counts FROM page_token_counts WHERE content_hash = ? AND encoding = ?",
+                (content_hash, encoding),
+            ).fetchone()
+        return None if row is None else _decompress(row[0])
+
+    def save_token_counts(self, content_hash: str, encoding: str, counts: list[int]) -> None:
+        """Store the token counts of the pages of a document.
+
+        Args:
+            content_hash (str): Hash of the document.
+            encoding (str): Name of the encoding of the tokens.
+            counts (list[int]): Number of tokens of every page.
+
+        Raises:
+            ValueError: If there is not one count per stored page.
+        """
+        with transaction(self.db_path, CREATE_TABLE_QUERIES) as connection:
+            row = connection.execute(
+                "SELECT nb_pages FROM documents WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+            if row is None or row[0] != len(counts):
+                msg = f"Expected one token count per page of document {content_hash}."
+                raise ValueError(msg)
+            connection.execute(
+                "INSERT OR REPLACE INTO page_token_counts (content_hash, encoding, counts) "
+                "VALUES (?, ?, ?)",
+                (content_hash, encoding, _compress(counts)),
+            )
+
+
+def hash_pages(pages: list[str]) -> str:
+    """Return the hash of the text of a document.
+
+    Args:
+        pages (list[str]): Text of every page.
+
+    Returns:
+        str: Hexadecimal sha256 of the pages.
+
+    Examples:
+        >>> hash_pages(["a", "b"]) == hash_pages(["a", "b"]) != hash_pages(["ab"])
+        True
+    """
+    return hashlib.sha256(json.dumps(pages).encode()).hexdigest()
+
+
+def _compress(value: object) -> bytes:
+    """Return the compressed json of a value."""
+    return zlib.compress(json.dumps(value).encode())
+
+
+def _decompress(data: bytes) -> Any:
+    """Return the value of a compressed json."""
+    return json.loads(zlib.decompress(data))
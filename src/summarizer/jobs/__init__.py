@@ -0,0 +1,6 @@
+"""This modules implements the summarization jobs."""
+
+from summarizer.jobs.job_queue import JobQueue
+from summarizer.jobs.job_store import Job, JobStatus, SQLiteJobStore
+
+__all__ = ["Job", "JobQueue", "JobStatus", "SQLiteJobStore"]
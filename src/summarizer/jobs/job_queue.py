@@ -0,0 +1,119 @@
+"""This module implements the worker pool draining the summarization jobs."""
+import logging
+import threading
+from typing import Callable, Optional
+
+from pydantic import BaseModel, PrivateAttr
+
+from summarizer.jobs.job_store import Job, JobStatus, SQLiteJobStore
+from summarizer.usage import SummaryResult
+from telemetry import get_trace_id, trace
+
+
+class JobQueue(BaseModel):
+    """This queue runs the jobs of a store with a bounded pool of worker threads.
+
+    Attributes:
+        store (SQLiteJobStore): Persistent store of the jobs.
+        runner (Callable[[str], SummaryResult]): Function returning the summary of a pdf url
+            with the tokens it used.
+        nb_workers (int): Number of jobs running at once.
+        poll_interval_seconds (float): Maximum time an idle worker waits before checking the
+            store for jobs submitted by another process.
+    """
+
+    store: SQLiteJobStore
+    runner: Callable[[str], SummaryResult]
+    nb_workers: int = 2
+    poll_interval_seconds: float = 5.0
+
+    _workers: list[threading.Thread] = PrivateAttr(default_factory=list)
+    _wake_up: threading.Condition = PrivateAttr(default_factory=threading.Condition)
+    _stopping: threading.Event = PrivateAttr(default_factory=threading.Event)
+    _trace_ids: dict[str, str] = PrivateAttr(default_factory=dict)
+
+    def start(self) -> None:
+        """Requeue the jobs interrupted by a previous stop and start the workers."""
+        nb_requeued = self.store.requeue_running()
+        if nb_requeued:
+            logging.warning("Requeued %d interrupted summarization jobs.", nb_requeued)
+        self._stopping.clear()
+        for worker_id in range(self.nb_workers):
+            worker = threading.Thread(
+                target=self._work, name=f"summarizer-job-worker-{worker_id}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the workers once their current job is finished.
+
+        Args:
+            timeout (Optional[float]): Maximum time to wait for each worker.
+        """
+        self._stopping.set()
+        with self._wake_up:
+            self._wake_up.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers.clear()
+
+    def submit(self, paper_url: str) -> Job:
+        """Submit a pdf to summarize, coalescing with the existing job of the same pdf.
+
+        Args:
+            paper_url (str): Url of the pdf to summarize.
+
+        Returns:
+            Job: The job in charge of this pdf.
+        """
+        job = self.store.submit(paper_url)
+        trace_id = get_trace_id()
+        if trace_id is not None and job.status == JobStatus.PENDING:
+            self._trace_ids.setdefault(job.job_id, trace_id)
+        with self._wake_up:
+            self._wake_up.notify()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Return a job by id.
+
+        Args:
+            job_id (str): Id of the job.
+
+        Returns:
+            Optional[Job]: The job, None if it does not exist.
+        """
+        return self.store.get(job_id)
+
+    def find(self, paper_url: str) -> Optional[Job]:
+        """Return the job covering a paper without submitting it.
+
+        Args:
+            paper_url (str): Url of the pdf.
+
+        Returns:
+            Optional[Job]: The pending, running or done job of the paper, None if there is none.
+        """
+        return self.store.find(paper_url)
+
+    def _work(self) -> None:
+        """Run pending jobs until the queue is stopped."""
+        while not self._stopping.is_set():
+            job = self.store.claim_next()
+            if job is None:
+                with self._wake_up:
+                    self._wake_up.wait(self.poll_interval_seconds)
+                continue
+            self._run_job(job)
+
+    def _run_job(self, job: Job) -> None:
+        """Run a job in the trace of its submission and store its outcome."""
+        try:
+            with trace(self._trace_ids.pop(job.job_id, None)):
+                result = self.runner(job.paper_url)
+        except Exception as e:
+            logging.exception("Summarization job %s failed.", job.job_id)
+            self.store.fail(job.job_id, str(e))
+        else:
+            self.store.complete(job.job_id, result.summary, result.usage)
@@ -0,0 +1,257 @@
+"""This module implements a persistent store for the summarization jobs."""
+import math
+import sqlite3
+import time
+import uuid
+from enum import Enum
+from pathlib import Path
+from typing import Optional
+
+from pydantic import BaseModel
+
+from summarizer.sqlite_utils import transaction
+from summarizer.usage import TokenUsage
+
+CREATE_TABLE_QUERY = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    paper_url TEXT NOT NULL,
+    status TEXT NOT NULL,
+    summary TEXT,
+    error TEXT,
+    usage TEXT,
+    fingerprint TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+CREATE_INDEX_QUERY = "CREATE INDEX IF NOT EXISTS jobs_paper_url ON jobs (paper_url, status)"
+JOB_COLUMNS = "job_id, paper_url, status, summary, error, usage, created_at, updated_at"
+JobRow = tuple[str, str, str, Optional[str], Optional[str], Optional[str], float, float]
+
+
+class JobStatus(str, Enum):
+    """Status of a summarization job."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class Job(BaseModel):
+    """A summarization job.
+
+    Attributes:
+        job_id (str): Unique id of the job.
+        paper_url (str): Url of the pdf to summarize.
+        status (JobStatus): Current status of the job.
+        summary (Optional[str]): Summary of the paper once the job is done.
+        error (Optional[str]): Error message if the job failed.
+        usage (Optional[TokenUsage]): Tokens used by the summary once the job is done.
+        created_at (float): Submission timestamp.
+        updated_at (float): Timestamp of the last status change.
+    """
+
+    job_id: str
+    paper_url: str
+    status: JobStatus
+    summary: Optional[str] = None
+    error: Optional[str] = None
+    usage: Optional[TokenUsage] = None
+    created_at: float
+    updated_at: float
+
+
+class SQLiteJobStore(BaseModel):
+    """This store keeps the summarization jobs in a local SQLite database.
+
+    The store can be shared between the api and the worker threads. The database and its
+    table are created with the store.
+
+    A job is coalesced only with the jobs submitted with the same fingerprint, the hash of
+    what the summary depends on, so a summary done before a change of the chain is not served.
+    A done job is served as a cached summary until it is older than done_ttl_seconds.
+
+    Attributes:
+        db_path (Path): Path of the SQLite database file.
+        fingerprint (str): Fingerprint of the chain summarizing the jobs.
+        done_ttl_seconds (Optional[float]): Time a done job is served to new submissions, for
+            ever if None.
+    """
+
+    db_path: Path
+    fingerprint: str = ""
+    done_ttl_seconds: Optional[float] = None
+
+    def model_post_init(self, __context: object) -> None:
+        """Create the database and its table."""
+        with transaction(self.db_path, (CREATE_TABLE_QUERY, CREATE_INDEX_QUERY)):
+            pass
+
+    def submit(self, paper_url: str) -> Job:
+        """Create a pending job, or return the job already covering this paper.
+
+        A paper with a pending, running or done job of the same fingerprint is not summarized
+        again, so duplicate submissions are coalesced and done jobs act as a summary cache until
+        their time to live expires. Failed jobs are retried.
+
+        Args:
+            paper_url (str): Url of the pdf to summarize.
+
+        Returns:
+            Job: The new or existing job.
+        """
+        with transaction(self.db_path) as connection:
+            row = self._find_row(connection, paper_url)
+            if row is not None:
+                return self._row_to_job(row)
+            now = time.time()
+            job = Job(
+                job_id=uuid.uuid4().hex,
+                paper_url=paper_url,
+                status=JobStatus.PENDING,
+                created_at=now,
+                updated_at=now,
+            )
+            connection.execute(
+                f"INSERT INTO jobs ({JOB_COLUMNS}, fingerprint) "  # noqa: S608
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job.job_id,
+                    paper_url,
+                    job.status.value,
+                    None,
+                    None,
+                    None,
+                    now,
+                    now,
+                    self.fingerprint,
+                ),
+            )
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Return a job by id.
+
+        Args:
+            job_id (str): Id of the job.
+
+        Returns:
+            Optional[Job]: The job, None if it does not exist.
+        """
+        with transaction(self.db_path) as connection:
+            row = connection.execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)  # noqa: S608
+            ).fetchone()
+        return None if row is None else self._row_to_job(row)
+
+    def find(self, paper_url: str) -> Optional[Job]:
+        """Return the job covering a paper without submitting it.
+
+        Args:
+            paper_url (str): Url of the pdf.
+
+        Returns:
+            Optional[Job]: The latest pending, running or done job of the paper which would be
+                coalesced with a submission, None if the paper has no such job.
+        """
+        with transaction(self.db_path) as connection:
+            row = self._find_row(connection, paper_url)
+        return None if row is None else self._row_to_job(row)
+
+    def claim_next(self) -> Optional[Job]:
+        """Mark the oldest pending job as running and return it.
+
+        Returns:
+            Optional[Job]: The claimed job, None if no job is pending.
+        """
+        with transaction(self.db_path) as connection:
+            row = connection.execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs WHERE status = ? "  # noqa: S608
+                "ORDER BY created_at LIMIT 1",
+                (JobStatus.PENDING.value,),
+            ).fetchone()
+            if row is None:
+                return None
+            job = self._row_to_job(row)
+            job.status = JobStatus.RUNNING
+            job.updated_at = time.time()
+            connection.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?",
+                (job.status.value, job.updated_at, job.job_id),
+            )
+        return job
+
+    def complete(self, job_id: str, summary: str, usage: Optional[TokenUsage] = None) -> None:
+        """Mark a job as done with its summary.
+
+        Args:
+            job_id (str): Id of the job.
+            summary (str): Summary of the paper.
+            usage (Optional[TokenUsage]): Tokens used by the summary.
+        """
+        usage_json = None if usage is None else usage.model_dump_json()
+        with transaction(self.db_path) as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, summary = ?, error = NULL, usage = ?, updated_at = ? "
+                "WHERE job_id = ?",
+                (JobStatus.DONE.value, summary, usage_json, time.time(), job_id),
+            )
+
+    def fail(self, job_id: str, error: str) -> None:
+        """Mark a job as failed.
+
+        Args:
+            job_id (str): Id of the job.
+            error (str): Error message.
+        """
+        self._update(job_id, JobStatus.FAILED, error=error)
+
+    def requeue_running(self) -> int:
+        """Put back in the queue the jobs left running by a stopped process.
+
+        Returns:
+            int: Number of requeued jobs.
+        """
+        with transaction(self.db_path) as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?",
+                (JobStatus.PENDING.value, time.time(), JobStatus.RUNNING.value),
+            )
+        return cursor.rowcount
+
+    def _update(self, job_id: str, status: JobStatus, error: Optional[str] = None) -> None:
+        """Update the status and error of a job."""
+        with transaction(self.db_path) as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (status.value, error, time.time(), job_id),
+            )
+
+    def _find_row(self, connection: sqlite3.Connection, paper_url: str) -> Optional[JobRow]:
+        """Return the row of the latest job of a paper which did not fail nor expire."""
+        done_after = (
+            -math.inf if self.done_ttl_seconds is None else time.time() - self.done_ttl_seconds
+        )
+        return connection.execute(
+            f"SELECT {JOB_COLUMNS} FROM jobs WHERE paper_url = ? AND fingerprint = ? "  # noqa: S608
+            "AND status != ? AND (status != ? OR updated_at >= ?) "
+            "ORDER BY created_at DESC LIMIT 1",
+            (paper_url, self.fingerprint, JobStatus.FAILED.value, JobStatus.DONE.value, done_after),
+        ).fetchone()
+
+    @staticmethod
+    def _row_to_job(row: JobRow) -> Job:
+        """Convert a database row to a job."""
+        job_id, paper_url, status, summary, error, usage, created_at, updated_at = row
+        return Job(
+            job_id=job_id,
+            paper_url=paper_url,
+            status=JobStatus(status),
+            summary=summary,
+            error=error,
+            usage=None if usage is None else TokenUsage.model_validate_json(usage),
+            created_at=created_at,
+            updated_at=updated_at,
+        )
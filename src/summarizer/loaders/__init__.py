@@ -0,0 +1,15 @@
+"""This modules implements the document loaders."""
+
+from summarizer.loaders.pdf_loader import (
+    DocumentDownloadError,
+    DocumentTooLargeError,
+    StreamingPDFLoader,
+    shutdown_extraction_pools,
+)
+
+__all__ = [
+    "DocumentDownloadError",
+    "DocumentTooLargeError",
+    "StreamingPDFLoader",
+    "shutdown_extraction_pools",
+]
@@ -0,0 +1,226 @@
+"""This module implements a streaming pdf loader."""
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Optional
+
+import requests
+from pydantic import BaseModel
+
+if TYPE_CHECKING:
+    from langchain.schema.document import Document
+    from pypdf import PdfReader
+
+SUCCESS_STATUS_CODE = 200
+
+
+class StreamingPDFLoader(BaseModel):
+    """This loader streams a pdf to a temporary file and lazily yields its pages.
+
+    The pdf is never fully held in memory: the download is written to disk by blocks and
+    `PdfReader` reads the objects it needs from the file when a page is extracted.
+
+    The text extraction is pure python and holds the GIL, so it runs in a pool of processes
+    shared by all the loaders: every task extracts a range of pages and the pages are yielded
+    in order as soon as their range is done, while the next ranges are extracted by the other
+    processes. The calling thread only waits, the model calls of the other threads go on.
+
+    Attributes:
+        max_size_bytes (int): Maximum size of the pdf, bigger documents are rejected.
+        timeout_seconds (float): Maximum time allowed to download the whole pdf.
+        download_block_size (int): Number of bytes read at once from the response.
+        nb_processes (Optional[int]): Number of processes extracting the text, all the cores
+            if None. The text is extracted by the calling thread if 0.
+        pages_per_task (int): Number of pages extracted by a task of the pool.
+    """
+
+    max_size_bytes: int = 100 * 1024 * 1024
+    timeout_seconds: float = 120
+    download_block_size: int = 64 * 1024
+    nb_processes: Optional[int] = None
+    pages_per_task: int = 4
+
+    def lazy_load(self, document_url: str) -> Iterator["Document"]:
+        """Yield the pages of the pdf one at a time.
+
+        Args:
+            document_url (str): Url or local path of the pdf.
+
+        Yields:
+            Document: Text of a page with its source and page number as metadata.
+        """
+        # Langchain is slow to import, it is only needed once a document is summarized.
+        from langchain.schema.document import Document
+
+        with self._open_document(document_url) as pdf_path:
+            for page_number, text in enumerate(self._extract_texts(pdf_path)):
+                yield Document(
+                    page_content=text,
+                    metadata={"source": document_url, "page": page_number},
+                )
+
+    def _extract_texts(self, pdf_path: Path) -> Iterator[str]:
+        """Yield the texts of the pages in order, extracted by the pool of processes.
+
+        Args:
+            pdf_path (Path): Path of the pdf.
+
+        Yields:
+            str: Text of a page.
+        """
+        if self.nb_processes == 0:
+            with open_reader(pdf_path) as reader:
+                for page in reader.pages:
+                    yield page.extract_text()
+            return
+
+        with open_reader(pdf_path) as reader:
+            nb_pages = len(reader.pages)
+        pool = get_extraction_pool(self.nb_processes)
+        # Enough ranges in flight to keep every process busy, not the whole document.
+        max_pending_tasks = 2 * (self.nb_processes or os.cpu_count() or 1)
+        pending: deque[Future[list[str]]] = deque()
+        try:
+            for start in range(0, nb_pages, self.pages_per_task):
+                stop = min(start + self.pages_per_task, nb_pages)
+                pending.append(pool.submit(extract_page_texts, pdf_path, start, stop))
+                if len(pending) >= max_pending_tasks:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    @contextmanager
+    def _open_document(self, document_url: str) -> Iterator[Path]:
+        """Return the path of the pdf, downloading it to a temporary file if it is not local.
+
+        Args:
+            document_url (str): Url or local path of the pdf.
+
+        Yields:
+            Path: Path of the pdf, readable by the processes of the extraction pool.
+        """
+        local_path = Path(document_url).expanduser()
+        if local_path.is_file():
+            if local_path.stat().st_size > self.max_size_bytes:
+                msg = f"Document {document_url} is bigger than {self.max_size_bytes} bytes."
+                raise DocumentTooLargeError(msg)
+            yield local_path
+            return
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pdf_path = Path(tmp_dir) / "document.pdf"
+            with pdf_path.open("wb") as pdf_file:
+                self._download(document_url, pdf_file)
+            yield pdf_path
+
+    def _download(self, document_url: str, output: BinaryIO) -> None:
+        """Stream the pdf into the output file while enforcing the size cap and timeout.
+
+        Args:
+            document_url (str): Url of the pdf.
+            output (BinaryIO): File the pdf is written to.
+        """
+        deadline = time.monotonic() + self.timeout_seconds
+        with requests.get(document_url, stream=True, timeout=self.timeout_seconds) as response:
+            if response.status_code != SUCCESS_STATUS_CODE:
+                msg = f"Request to {document_url} returned status code {response.status_code}"
+                raise DocumentDownloadError(msg)
+            content_length = int(response.headers.get("Content-Length", 0))
+            if content_length > self.max_size_bytes:
+                msg = f"Document {document_url} is bigger than {self.max_size_bytes} bytes."
+                raise DocumentTooLargeError(msg)
+
+            nb_bytes = 0
+            for block in response.iter_content(chunk_size=self.download_block_size):
+                nb_bytes += len(block)
+                if nb_bytes > self.max_size_bytes:
+                    msg = f"Document {document_url} is bigger than {self.max_size_bytes} bytes."
+                    raise DocumentTooLargeError(msg)
+                if time.monotonic() > deadline:
+                    msg = f"Download of {document_url} took more than {self.timeout_seconds}s."
+                    raise DocumentDownloadError(msg)
+                output.write(block)
+
+
+def extract_page_texts(pdf_path: Path, start: int = 0, stop: Optional[int] = None) -> list[str]:
+    """Return the texts of a range of pages of a pdf, run by the processes of the pool.
+
+    Args:
+        pdf_path (Path): Path of the pdf.
+        start (int): Index of the first page.
+        stop (Optional[int]): Index after the last page, the last page of the pdf if None.
+
+    Returns:
+        list[str]: Text of every page of the range.
+    """
+    with open_reader(pdf_path) as reader:
+        return [page.extract_text() for page in reader.pages[start:stop]]
+
+
+@contextmanager
+def open_reader(pdf_path: Path) -> Iterator["PdfReader"]:
+    """Open a reader of a pdf reading its objects from the file when they are needed.
+
+    The reader is given the open file, given a path it would read the whole pdf in memory.
+
+    Args:
+        pdf_path (Path): Path of the pdf.
+
+    Yields:
+        PdfReader: The reader, valid until the block exits.
+    """
+    # Pypdf is only needed once a document is summarized, the api starts without it.
+    from pypdf import PdfReader
+
+    with pdf_path.open("rb") as pdf_file:
+        yield PdfReader(pdf_file)
+
+
+_pools: dict[Optional[int], ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def get_extraction_pool(nb_processes: Optional[int] = None) -> ProcessPoolExecutor:
+    """Return the pool of processes extracting the texts, shared by all the loaders.
+
+    The processes are spawned rather than forked, forking the threads of the api is unsafe.
+
+    Args:
+        nb_processes (Optional[int]): Number of processes, all the cores if None.
+
+    Returns:
+        ProcessPoolExecutor: The pool.
+    """
+    with _pools_lock:
+        if nb_processes not in _pools:
+            _pools[nb_processes] = ProcessPoolExecutor(
+                max_workers=nb_processes or os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pools[nb_processes]
+
+
+def shutdown_extraction_pools() -> None:
+    """Stop the processes of the extraction pools."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(cancel_futures=True)
+        _pools.clear()
+
+
+class DocumentDownloadError(Exception):
+    """Custom exception raised when a document could not be downloaded."""
+
+
+class DocumentTooLargeError(DocumentDownloadError):
+    """Custom exception raised when a document is bigger than the allowed size."""
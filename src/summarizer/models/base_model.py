@@ -1,5 +1,6 @@
 """This module contains the BaseLLM class."""
 from abc import ABC, abstractmethod
+from collections.abc import Iterator
 from typing import ClassVar
 
 from pydantic import BaseModel
@@ -21,6 +22,11 @@ class BaseLLM(BaseModel, ABC):
         """Get the model name."""
         return self.name
 
+    @property
+    def token_encoding(self) -> str:
+        """Get the name of the tokenizer, the token counts are only valid for the same one."""
+        return type(self).__name__
+
     @abstractmethod
     def predict(self, prompt: str) -> str:
         """Return prediction from model."""
@@ -29,6 +35,13 @@ class BaseLLM(BaseModel, ABC):
     def random_predict(self, prompt: str) -> str:
         """Return prediction from model with random arguments."""
 
+    def stream_predict(self, prompt: str) -> Iterator[str]:
+        """Yield the prediction of the model as it is generated, in a single piece by default."""
+        yield self.predict(prompt)
+
     @abstractmethod
     def count_tokens(self, prompt: str) -> int:
         """Return the number of tokens in the prompt."""
+
+    def warmup(self) -> None:
+        """Load what the model loads lazily on its first call, nothing by default."""
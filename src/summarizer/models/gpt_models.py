@@ -1,13 +1,22 @@
-"""This module implements the gpt models."""
+"""This module implements the gpt models.
+
+Openai and tiktoken are slow to import, they are imported on the first call of the model so
+the summarizer starts quickly.
+"""
 import secrets
+from collections.abc import Iterator
 from typing import Any, ClassVar, Optional
 
-import openai
-import tiktoken
-from azure.identity import DefaultAzureCredential
-from azure.keyvault.secrets import SecretClient
+from pydantic import PrivateAttr
 
+from summarizer.credentials import CachedSecretProvider, get_secret_provider
 from summarizer.models.base_model import BaseLLM
+from summarizer.models.rate_limit import get_scheduler
+from summarizer.usage import check_token_budget, has_token_budget, record_llm_call
+from telemetry import span, traced
+
+SERVER_ERROR_STATUS_CODE = 500
+ENCODING_NAME = "cl100k_base"
 
 
 class GPTModel(BaseLLM):
@@ -17,6 +26,13 @@ class GPTModel(BaseLLM):
     max_temp: ClassVar[float] = 0.6
     default_temp: ClassVar[float] = 0
     model_api_name: ClassVar[str] = "gpt-3.5-turbo"
+    prompt_price_per_million: ClassVar[float] = 0.0
+    completion_price_per_million: ClassVar[float] = 0.0
+    expected_completion_tokens: ClassVar[int] = 500
+
+    _api_key: Optional[str] = PrivateAttr(default=None)
+    _secret_provider: Optional[CachedSecretProvider] = PrivateAttr(default=None)
+    _secret_name: Optional[str] = PrivateAttr(default=None)
 
     class Config:
         """This class is used to allow arbitrary types in pydantic."""
@@ -32,37 +48,46 @@ class GPTModel(BaseLLM):
     ) -> None:
         """Init method for all gpt model.
 
+        The secret is read in background by the provider shared by all the models, so the
+        construction of a model never waits for the keyvault. Without api key nor secret, the
+        key of the openai module is used.
+
         Args:
             api_key (str): OpenAI API key.
             kv_url (str, optional): URI of the azure keyvault. Defaults to None.
-            secret_name (str, optional): Name of the secret. Defaults to None.
+            secret_name (str, optional): Name of the secret holding the api key. Defaults to None.
         """
-        api_key = None
-        if api_key is not None:
-            openai.api_key = api_key
-
-        if kv_url is not None and secret_name is not None:
-            openai.api_key = GPTModel._get_secret_from_keyvault(kv_url, secret_name)
+        super().__init__()
+        self._api_key = api_key
+        if api_key is None and secret_name is not None:
+            self._secret_provider = get_secret_provider(kv_url)
+            self._secret_name = secret_name
+            self._secret_provider.prefetch(secret_name)
 
-        if openai.api_key is None:
-            msg = "Could not retrieve openai api key."
-            raise NoApiKeyAvailableError(msg)
+    def warmup(self) -> None:
+        """Read the api key and load the token encoding before the first call."""
+        self._get_api_key()
+        self.count_tokens("")
 
-    @staticmethod
-    def _get_secret_from_keyvault(kv_url: str, secret_name: str) -> Optional[str]:
-        """Return the OpenAI API key from azure vault.
-
-        Args:
-            kv_url (str): URI of the azure keyvault.
-            secret_name (str): Name of the secret.
+    def _get_api_key(self) -> str:
+        """Return the api key, from the cache of the secret provider after its first read.
 
         Returns:
-            str: secret value
+            str: The api key of the model, else the key of the openai module.
+
+        Raises:
+            NoApiKeyAvailableError: If no api key is available.
         """
-        credential = DefaultAzureCredential()
-        secret_client = SecretClient(vault_url=kv_url, credential=credential)
-        secret = secret_client.get_secret(secret_name)
-        return secret.value
+        import openai
+
+        api_key = self._api_key
+        if api_key is None and self._secret_provider is not None:
+            api_key = self._secret_provider.get_secret(self._secret_name)
+        api_key = api_key or openai.api_key
+        if api_key is None:
+            msg = "Could not retrieve openai api key."
+            raise NoApiKeyAvailableError(msg)
+        return api_key
 
     @classmethod
     def random_args(cls) -> dict[str, Any]:
@@ -77,25 +102,143 @@ class GPTModel(BaseLLM):
         """This method need to be implemented."""
         return {"temperature": cls.default_temp, "model": cls.model_api_name}
 
+    @traced("llm.predict")
     def predict(self, prompt: str) -> Any:
         """Return prediction from model."""
-        predict_args = self.default_args()
-        return openai.ChatCompletion.create(messages=prompt, **predict_args)["choices"][0][  # type: ignore[no-untyped-call]
-            "message"
-        ][
-            "content"
-        ]
+        return self._create_completion(prompt, self.default_args())
 
+    @traced("llm.predict")
     def random_predict(self, prompt: str) -> Any:
         """Return prediction from model with random parameters."""
-        predict_args = self.random_args()
-        return openai.ChatCompletion.create(messages=prompt, **predict_args)["choices"][0][
-            "message"
-        ]["content"]
+        return self._create_completion(prompt, self.random_args())
+
+    def stream_predict(self, prompt: Any) -> Iterator[str]:
+        """Yield the prediction of the model as its tokens are generated.
+
+        The api gives no usage for a streamed completion, the completion tokens are counted
+        once it is complete.
+        """
+        import openai
+
+        with span("llm.stream_predict"):
+            nb_prompt_tokens = self._count_prompt_tokens(prompt)
+            if has_token_budget():
+                check_token_budget(nb_prompt_tokens)
+            api_key = self._get_api_key()
+            predict_args = {**self.default_args(), "stream": True}
+            # The request is sent, and retried, before the first token is read.
+            response = get_scheduler(self.model_api_name).call(
+                lambda: openai.ChatCompletion.create(messages=prompt, api_key=api_key, **predict_args),  # type: ignore[no-untyped-call]
+                nb_prompt_tokens + self.expected_completion_tokens,
+                retry_delay=self._retry_delay,
+            )
+            parts = []
+            for chunk in response:
+                content = chunk["choices"][0].get("delta", {}).get("content")
+                if content:
+                    parts.append(content)
+                    yield content
+            completion_tokens = self.count_tokens("".join(parts))
+            record_llm_call(
+                self.model_api_name,
+                nb_prompt_tokens,
+                completion_tokens,
+                self.cost_usd(nb_prompt_tokens, completion_tokens),
+            )
+
+    def _create_completion(self, prompt: Any, predict_args: dict[str, Any]) -> Any:
+        """Call the model and record the tokens used by the call.
+
+        Args:
+            prompt (Any): Messages sent to the model.
+            predict_args (dict[str, Any]): Arguments of the completion.
+
+        Returns:
+            str: Content of the completion.
+        """
+        import openai
+
+        nb_prompt_tokens = self._count_prompt_tokens(prompt)
+        if has_token_budget():
+            check_token_budget(nb_prompt_tokens)
+        api_key = self._get_api_key()
+        response = get_scheduler(self.model_api_name).call(
+            lambda: openai.ChatCompletion.create(messages=prompt, api_key=api_key, **predict_args),  # type: ignore[no-untyped-call]
+            nb_prompt_tokens + self.expected_completion_tokens,
+            retry_delay=self._retry_delay,
+            used_tokens=lambda response: response.get("usage", {}).get("total_tokens", 0),
+        )
+        usage = response.get("usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        record_llm_call(
+            self.model_api_name,
+            prompt_tokens,
+            completion_tokens,
+            self.cost_usd(prompt_tokens, completion_tokens),
+        )
+        return response["choices"][0]["message"]["content"]
+
+    @staticmethod
+    def _retry_delay(error: Exception) -> Optional[float]:
+        """Return the minimum delay before retrying a failed call, None if it is not retryable.
+
+        Rate limits (429), server errors (5xx), timeouts and connection errors are retried, after
+        the Retry-After given by the api if any.
+        """
+        import openai
+
+        retryable_errors = (
+            openai.error.RateLimitError,
+            openai.error.ServiceUnavailableError,
+            openai.error.Timeout,
+            openai.error.APIConnectionError,
+            openai.error.TryAgain,
+        )
+        is_server_error = isinstance(error, openai.error.APIError) and (
+            (error.http_status or 0) >= SERVER_ERROR_STATUS_CODE
+        )
+        if not is_server_error and not isinstance(error, retryable_errors):
+            return None
+        headers = getattr(error, "headers", None) or {}
+        try:
+            return float(headers.get("retry-after", 0))
+        except ValueError:
+            return 0.0
+
+    @classmethod
+    def cost_usd(cls, prompt_tokens: int, completion_tokens: int) -> float:
+        """Return the cost of a call.
+
+        Args:
+            prompt_tokens (int): Number of tokens of the prompt.
+            completion_tokens (int): Number of tokens of the completion.
+
+        Returns:
+            float: Cost of the call in USD.
+        """
+        return (
+            prompt_tokens * cls.prompt_price_per_million
+            + completion_tokens * cls.completion_price_per_million
+        ) / 1_000_000
+
+    def _count_prompt_tokens(self, prompt: Any) -> int:
+        """Return the number of tokens of a prompt or of the contents of its messages."""
+        if isinstance(prompt, str):
+            return self.count_tokens(prompt)
+        return sum(self.count_tokens(message["content"]) for message in prompt)
+
+    @property
+    def token_encoding(self) -> str:
+        """Get the name of the tiktoken encoding of the gpt models."""
+        return ENCODING_NAME
 
     def count_tokens(self, prompt: str) -> int:
         """Return the number of tokens in the prompt."""
-        encoding = tiktoken.get_encoding("cl100k_base")
+        import tiktoken
+
+        # Tiktoken caches the encoding, only its first load reads the bpe ranks.
+        encoding = tiktoken.get_encoding(ENCODING_NAME)
         num_tokens = len(encoding.encode(prompt))
         return num_tokens
 
@@ -106,6 +249,8 @@ class GPT35Turbo4(GPTModel):
     max_token: ClassVar[int] = 4000
     name: ClassVar[str] = "GPT 3.5 turbo 4k context"
     model_api_name: ClassVar[str] = "gpt-3.5-turbo"
+    prompt_price_per_million: ClassVar[float] = 0.5
+    completion_price_per_million: ClassVar[float] = 1.5
 
 
 class GPT35Turbo16(GPTModel):
@@ -114,6 +259,8 @@ class GPT35Turbo16(GPTModel):
     max_token: ClassVar[int] = 16000
     name: ClassVar[str] = "GPT 3.5 turbo 16k context"
     model_api_name: ClassVar[str] = "gpt-3.5-turbo-16k"
+    prompt_price_per_million: ClassVar[float] = 3.0
+    completion_price_per_million: ClassVar[float] = 4.0
 
 
 class GPT4Turbo8(GPTModel):
@@ -122,6 +269,8 @@ class GPT4Turbo8(GPTModel):
     max_token: ClassVar[int] = 8000
     name: ClassVar[str] = "GPT 4 turbo 16k context"
     model_api_name: ClassVar[str] = "gpt-4"
+    prompt_price_per_million: ClassVar[float] = 30.0
+    completion_price_per_million: ClassVar[float] = 60.0
 
 
 class GPT4Turbo32(GPTModel):
@@ -130,6 +279,8 @@ class GPT4Turbo32(GPTModel):
     max_token: ClassVar[int] = 32000
     name: ClassVar[str] = "GPT 4 turbo 16k context"
     model_api_name: ClassVar[str] = "gpt-4-32k"
+    prompt_price_per_million: ClassVar[float] = 60.0
+    completion_price_per_million: ClassVar[float] = 120.0
 
 
 class GPT4Turbo128(GPTModel):
@@ -138,6 +289,8 @@ class GPT4Turbo128(GPTModel):
     max_token: ClassVar[int] = 128000
     name: ClassVar[str] = "GPT 4 turbo 128k context"
     model_api_name: ClassVar[str] = "gpt-4-1106-preview"
+    prompt_price_per_million: ClassVar[float] = 10.0
+    completion_price_per_million: ClassVar[float] = 30.0
 
 
 class GPT4oMini(GPTModel):
@@ -146,6 +299,8 @@ class GPT4oMini(GPTModel):
     max_token: ClassVar[int] = 128000
     name: ClassVar[str] = "GPT 4o mini"
     model_api_name: ClassVar[str] = "gpt-4o-mini"
+    prompt_price_per_million: ClassVar[float] = 0.15
+    completion_price_per_million: ClassVar[float] = 0.6
 
 
 class NoApiKeyAvailableError(Exception):
@@ -0,0 +1,241 @@
+"""This module implements the scheduler of the model calls under the api rate limits."""
+import secrets
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional, TypeVar
+
+from pydantic import BaseModel, PrivateAttr
+
+from telemetry import REGISTRY, get_trace_id
+
+T = TypeVar("T")
+
+
+class RateLimitScheduler(BaseModel):
+    """This scheduler runs the model calls within the requests and tokens per minute limits.
+
+    The limits are token buckets refilled continuously, a call waits until both buckets hold
+    its request and its estimated tokens. Waiting calls are granted in turn across the jobs,
+    a job being the trace of the summarization, so a long document does not starve the others.
+    A call failing with a retryable error is retried with a jittered exponential backoff, and
+    every call waits for the end of the backoff so the api is not hammered while it throttles.
+
+    Attributes:
+        requests_per_minute (Optional[int]): Maximum number of calls per period, no limit if None.
+        tokens_per_minute (Optional[int]): Maximum number of tokens per period, no limit if None.
+        period_seconds (float): Duration of the period of the limits.
+        max_retries (int): Maximum number of retries of a call.
+        min_backoff_seconds (float): Maximum backoff of the first retry.
+        max_backoff_seconds (float): Maximum backoff of any retry.
+    """
+
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+    period_seconds: float = 60.0
+    max_retries: int = 6
+    min_backoff_seconds: float = 1.0
+    max_backoff_seconds: float = 60.0
+
+    _condition: threading.Condition = PrivateAttr(default_factory=threading.Condition)
+    _available_requests: float = PrivateAttr(default=0.0)
+    _available_tokens: float = PrivateAttr(default=0.0)
+    _refilled_at: float = PrivateAttr(default=0.0)
+    _paused_until: float = PrivateAttr(default=0.0)
+    _queues: dict[str, deque[object]] = PrivateAttr(default_factory=dict)
+    _job_order: deque[str] = PrivateAttr(default_factory=deque)
+
+    def model_post_init(self, __context: object) -> None:
+        """Start with full buckets."""
+        self._available_requests = float(self.requests_per_minute or 0)
+        self._available_tokens = float(self.tokens_per_minute or 0)
+        self._refilled_at = self._now()
+
+    def configure(
+        self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None
+    ) -> None:
+        """Change the limits, the buckets start full.
+
+        The buckets are kept if the limits do not change, so rebuilding a chain with the same
+        config does not forget the calls in flight.
+
+        Args:
+            requests_per_minute (Optional[int]): Maximum number of calls per period.
+            tokens_per_minute (Optional[int]): Maximum number of tokens per period.
+        """
+        with self._condition:
+            if (self.requests_per_minute, self.tokens_per_minute) == (
+                requests_per_minute,
+                tokens_per_minute,
+            ):
+                return
+            self.requests_per_minute = requests_per_minute
+            self.tokens_per_minute = tokens_per_minute
+            self.model_post_init(None)
+            self._condition.notify_all()
+
+    def call(
+        self,
+        func: Callable[[], T],
+        nb_tokens: int,
+        retry_delay: Callable[[Exception], Optional[float]],
+        used_tokens: Optional[Callable[[T], int]] = None,
+    ) -> T:
+        """Run a model call within the limits, retrying it on retryable errors.
+
+        Args:
+            func (Callable[[], T]): The model call.
+            nb_tokens (int): Estimated number of tokens of the call.
+            retry_delay (Callable[[Exception], Optional[float]]): Return None if an error is not
+                retryable, else the minimum delay before retrying, e.g. from a Retry-After.
+            used_tokens (Optional[Callable[[T], int]]): Return the number of tokens actually
+                used by the call, the estimate is corrected with it.
+
+        Returns:
+            T: The result of the call.
+        """
+        attempt = 0
+        while True:
+            self.acquire(nb_tokens)
+            try:
+                result = func()
+            except Exception as e:  # noqa: BLE001
+                delay = retry_delay(e)
+                if delay is None or attempt >= self.max_retries:
+                    # The failed call did not use the tokens reserved for it.
+                    self._refund(nb_tokens)
+                    raise
+                REGISTRY.increment("llm_retries_total", error=type(e).__name__)
+                self.back_off(attempt, delay)
+                attempt += 1
+                continue
+            if used_tokens is not None:
+                self._refund(nb_tokens - used_tokens(result))
+            return result
+
+    def acquire(self, nb_tokens: int) -> None:
+        """Wait for the turn of the job of the caller and for the capacity of a call.
+
+        Args:
+            nb_tokens (int): Estimated number of tokens of the call.
+        """
+        job = get_trace_id() or ""
+        ticket = object()
+        start = self._now()
+        with self._condition:
+            queue = self._queues.setdefault(job, deque())
+            if not queue:
+                self._job_order.append(job)
+            queue.append(ticket)
+            try:
+                wait_seconds = self._wait_seconds(job, ticket, nb_tokens)
+                while wait_seconds != 0:
+                    self._wait(wait_seconds)
+                    wait_seconds = self._wait_seconds(job, ticket, nb_tokens)
+                self._available_requests -= 1
+                self._available_tokens -= nb_tokens
+            finally:
+                self._leave(job, ticket)
+        REGISTRY.observe("llm_scheduler_wait_seconds", self._now() - start)
+
+    def back_off(self, attempt: int, min_delay_seconds: float = 0.0) -> None:
+        """Pause all the calls before a retry.
+
+        The backoff is drawn uniformly up to an exponentially growing bound (full jitter) so the
+        retries of concurrent calls are spread.
+
+        Args:
+            attempt (int): Number of retries already done.
+            min_delay_seconds (float): Minimum delay, e.g. given by the api.
+        """
+        bound = min(self.max_backoff_seconds, self.min_backoff_seconds * 2**attempt)
+        delay = max(min_delay_seconds, bound * secrets.randbelow(1_000_000) / 1_000_000)
+        with self._condition:
+            self._paused_until = max(self._paused_until, self._now() + delay)
+        self._sleep(delay)
+
+    def _wait_seconds(self, job: str, ticket: object, nb_tokens: int) -> Optional[float]:
+        """Return how long a call must wait, 0 if it can run, None until the next notification."""
+        if self._job_order[0] != job or self._queues[job][0] is not ticket:
+            return None
+        now = self._now()
+        self._refill(now)
+        wait_seconds = max(0.0, self._paused_until - now)
+        if self.requests_per_minute is not None and self._available_requests < 1:
+            rate = self.requests_per_minute / self.period_seconds
+            wait_seconds = max(wait_seconds, (1 - self._available_requests) / rate)
+        if self.tokens_per_minute is not None:
+            # A call bigger than the limit runs alone once the bucket is full.
+            needed_tokens = min(nb_tokens, self.tokens_per_minute)
+            if self._available_tokens < needed_tokens:
+                rate = self.tokens_per_minute / self.period_seconds
+                wait_seconds = max(wait_seconds, (needed_tokens - self._available_tokens) / rate)
+        return wait_seconds
+
+    def _now(self) -> float:
+        """Return the time of the scheduler, in seconds."""
+        return time.monotonic()
+
+    def _sleep(self, seconds: float) -> None:
+        """Block the calling thread."""
+        time.sleep(seconds)
+
+    def _wait(self, seconds: Optional[float]) -> None:
+        """Wait for a notification of the scheduler, at most seconds if not None."""
+        self._condition.wait(seconds)
+
+    def _leave(self, job: str, ticket: object) -> None:
+        """Remove a ticket from the queues and give the turn to the next job."""
+        queue = self._queues[job]
+        is_head = queue[0] is ticket
+        queue.remove(ticket)
+        if not queue:
+            del self._queues[job]
+            self._job_order.remove(job)
+        elif is_head and self._job_order[0] == job:
+            self._job_order.rotate(-1)
+        self._condition.notify_all()
+
+    def _refill(self, now: float) -> None:
+        """Refill the buckets for the time elapsed since the last refill."""
+        elapsed = now - self._refilled_at
+        self._refilled_at = now
+        if self.requests_per_minute is not None:
+            self._available_requests = min(
+                float(self.requests_per_minute),
+                self._available_requests + elapsed * self.requests_per_minute / self.period_seconds,
+            )
+        if self.tokens_per_minute is not None:
+            self._available_tokens = min(
+                float(self.tokens_per_minute),
+                self._available_tokens + elapsed * self.tokens_per_minute / self.period_seconds,
+            )
+
+    def _refund(self, nb_tokens: int) -> None:
+        """Give back the tokens estimated but not used, or take the ones used in excess."""
+        if self.tokens_per_minute is None:
+            return
+        with self._condition:
+            self._available_tokens = min(
+                float(self.tokens_per_minute), self._available_tokens + nb_tokens
+            )
+            self._condition.notify_all()
+
+
+_schedulers: dict[str, RateLimitScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(model_api_name: str) -> RateLimitScheduler:
+    """Return the scheduler shared by the calls to a model, the api limits are per model.
+
+    Args:
+        model_api_name (str): Api name of the model.
+
+    Returns:
+        RateLimitScheduler: The scheduler of the model.
+    """
+    with _schedulers_lock:
+        if model_api_name not in _schedulers:
+            _schedulers[model_api_name] = RateLimitScheduler()
+        return _schedulers[model_api_name]
@@ -0,0 +1,5 @@
+"""This modules implements the preprocessing of the pages before they are chunked."""
+
+from summarizer.preprocessors.text_preprocessor import TextPreprocessor
+
+__all__ = ["TextPreprocessor"]
@@ -0,0 +1,131 @@
+"""This module implements the cleaning of the pages before they are chunked."""
+import re
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from typing import TYPE_CHECKING, Callable
+
+from pydantic import BaseModel
+
+from summarizer.usage import record_saved_tokens
+
+if TYPE_CHECKING:
+    from langchain.schema.document import Document
+
+REFERENCES_HEADING = re.compile(
+    r"^[ \t]*(?:[0-9IVX]+\.?[ \t]+)?(?:references|bibliography|works cited|literature cited)"
+    r"[ \t]*:?[ \t]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+HYPHENATED_LINE_BREAK = re.compile(r"(\w)-[ \t]*\n[ \t]*([a-z])")
+INLINE_WHITESPACE = re.compile(r"[^\S\n]+")
+BLANK_LINES = re.compile(r"\n{3,}")
+DIGITS = re.compile(r"\d+")
+
+
+class TextPreprocessor(BaseModel):
+    """This preprocessor removes the text of the pages which is not worth summarizing.
+
+    The pages are cleaned one at a time as the loader yields them:
+    - the lines repeated at the top or bottom of the pages, like the running headers, the
+      footers and the page numbers, are removed once they were seen on previous pages,
+    - the bibliography and everything after it, usually the appendices, are removed,
+    - the words hyphenated at a line break are joined and the whitespace is collapsed.
+
+    The number of tokens removed is recorded in the token usage of the summary.
+
+    Attributes:
+        remove_boilerplate (bool): Remove the lines repeated at the edges of the pages.
+        strip_bibliography (bool): Remove the references section and what follows it.
+        normalize_whitespace (bool): Join the hyphenated words and collapse the whitespace.
+        boilerplate_edge_lines (int): Number of lines at the top and at the bottom of a page
+            which can be boilerplate.
+        boilerplate_max_length (int): Maximum number of characters of a boilerplate line.
+        boilerplate_min_pages (int): Number of previous pages an edge line must be found on
+            to be removed.
+    """
+
+    remove_boilerplate: bool = True
+    strip_bibliography: bool = True
+    normalize_whitespace: bool = True
+    boilerplate_edge_lines: int = 2
+    boilerplate_max_length: int = 100
+    boilerplate_min_pages: int = 1
+
+    def clean_pages(
+        self, pages: Iterable["Document"], count_tokens: Callable[[str], int]
+    ) -> Iterator["Document"]:
+        """Yield the cleaned pages of a document, recording the number of tokens saved.
+
+        Args:
+            pages (Iterable[Document]): Pages of the document.
+            count_tokens (Callable[[str], int]): Function returning the number of tokens of a text.
+
+        Yields:
+            Document: A cleaned page with the metadata of the page, empty if nothing is left.
+        """
+        from langchain.schema.document import Document
+
+        edge_lines: Counter[str] = Counter()
+        in_bibliography = False
+        for page in pages:
+            text = "" if in_bibliography else page.page_content
+            if self.remove_boilerplate:
+                text = self._remove_boilerplate(text, edge_lines)
+            if self.strip_bibliography:
+                heading = REFERENCES_HEADING.search(text)
+                if heading is not None:
+                    text = text[: heading.start()]
+                    in_bibliography = True
+            if self.normalize_whitespace:
+                text = normalize_whitespace(text)
+            record_saved_tokens(count_tokens(page.page_content) - count_tokens(text))
+            yield Document(page_content=text, metadata=page.metadata)
+
+    def _remove_boilerplate(self, text: str, edge_lines: Counter[str]) -> str:
+        """Remove the edge lines of a page found at the edges of previous pages.
+
+        Args:
+            text (str): Text of the page.
+            edge_lines (Counter[str]): Number of previous pages having every edge line, updated
+                with the edge lines of this page.
+
+        Returns:
+            str: Text of the page without its boilerplate.
+        """
+        lines = text.split("\n")
+        content_indexes = [index for index, line in enumerate(lines) if line.strip()]
+        nb_edge_lines = self.boilerplate_edge_lines
+        edge_indexes = set(content_indexes[:nb_edge_lines] + content_indexes[-nb_edge_lines:])
+        removed = set()
+        keys = set()
+        for index in edge_indexes:
+            line = lines[index].strip()
+            if len(line) > self.boilerplate_max_length:
+                continue
+            # The page numbers change from page to page, the digits are ignored.
+            key = DIGITS.sub("#", line).lower()
+            keys.add(key)
+            if edge_lines[key] >= self.boilerplate_min_pages:
+                removed.add(index)
+        edge_lines.update(keys)
+        return "\n".join(line for index, line in enumerate(lines) if index not in removed)
+
+
+def normalize_whitespace(text: str) -> str:
+    r"""Join the words hyphenated at a line break and collapse the whitespace of a text.
+
+    The paragraphs stay separated by a blank line, the chunker cuts the pages on them.
+
+    Args:
+        text (str): A text extracted from a pdf.
+
+    Returns:
+        str: The normalized text.
+
+    Examples:
+        >>> normalize_whitespace("A  trans-\nformer   model.\n \n\n\nResults ")
+        'A transformer model.\n\nResults'
+    """
+    text = HYPHENATED_LINE_BREAK.sub(r"\1\2", text)
+    lines = (INLINE_WHITESPACE.sub(" ", line).strip() for line in text.split("\n"))
+    return BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
@@ -0,0 +1,40 @@
+"""This module implements the transactions shared by the SQLite stores of the summarizer.
+
+A connection is opened per operation, so a store can be shared between the threads of the
+api and of the workers, and between processes using the same database file.
+"""
+import sqlite3
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+
+@contextmanager
+def transaction(db_path: Path, schema_queries: Iterable[str] = ()) -> Iterator[sqlite3.Connection]:
+    """Open a connection holding a write lock until the block exits.
+
+    The database and the tables of the schema queries are created if they do not exist. The
+    transaction is committed when the block exits, rolled back if it raises.
+
+    Args:
+        db_path (Path): Path of the SQLite database file.
+        schema_queries (Iterable[str]): Queries creating the tables and indexes if they do not
+            exist, run before the transaction. Defaults to none, for a schema already created.
+
+    Yields:
+        sqlite3.Connection: The connection, in a transaction.
+    """
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        for query in schema_queries:
+            connection.execute(query)
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+    finally:
+        connection.close()
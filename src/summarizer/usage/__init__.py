@@ -0,0 +1,31 @@
+"""This modules implements the token accounting of the summaries."""
+
+from summarizer.usage.token_usage import (
+    TOKEN_BUCKETS,
+    LLMCall,
+    SummaryResult,
+    TokenBudgetExceededError,
+    TokenUsage,
+    UsageTracker,
+    check_token_budget,
+    has_token_budget,
+    record_llm_call,
+    record_saved_tokens,
+    track_usage,
+    usage_label,
+)
+
+__all__ = [
+    "TOKEN_BUCKETS",
+    "LLMCall",
+    "SummaryResult",
+    "TokenBudgetExceededError",
+    "TokenUsage",
+    "UsageTracker",
+    "check_token_budget",
+    "has_token_budget",
+    "record_llm_call",
+    "record_saved_tokens",
+    "track_usage",
+    "usage_label",
+]
@@ -0,0 +1,249 @@
+"""This module implements the token accounting of the model calls of a summarization."""
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+from telemetry import REGISTRY
+
+TOKEN_BUCKETS = (1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000)
+DEFAULT_CALL_LABEL = "predict"
+
+
+class LLMCall(BaseModel):
+    """The tokens used by a model call.
+
+    Attributes:
+        label (str): What the call was made for, e.g. the chunk it summarized.
+        model (str): Api name of the model.
+        prompt_tokens (int): Number of tokens of the prompt.
+        completion_tokens (int): Number of tokens of the completion.
+        cost_usd (float): Cost of the call.
+    """
+
+    label: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    cost_usd: float = 0.0
+
+
+class TokenUsage(BaseModel):
+    """The tokens used by a set of model calls.
+
+    Attributes:
+        nb_calls (int): Number of model calls.
+        prompt_tokens (int): Number of tokens of the prompts.
+        completion_tokens (int): Number of tokens of the completions.
+        cost_usd (float): Cost of the calls.
+        saved_tokens (int): Number of tokens removed from the document by the preprocessing
+            before the model calls.
+    """
+
+    nb_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    saved_tokens: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        """Return the number of prompt and completion tokens."""
+        return self.prompt_tokens + self.completion_tokens
+
+    @classmethod
+    def from_calls(cls, calls: list[LLMCall]) -> "TokenUsage":
+        """Return the total usage of model calls.
+
+        Args:
+            calls (list[LLMCall]): The model calls.
+
+        Returns:
+            TokenUsage: Their total usage.
+        """
+        return cls(
+            nb_calls=len(calls),
+            prompt_tokens=sum(call.prompt_tokens for call in calls),
+            completion_tokens=sum(call.completion_tokens for call in calls),
+            cost_usd=sum(call.cost_usd for call in calls),
+        )
+
+
+class SummaryResult(BaseModel):
+    """A summary with the tokens it used.
+
+    Attributes:
+        summary (str): Summary of the paper.
+        summaries (dict[str, str]): Summary of every requested style, empty if no style was
+            requested.
+        usage (TokenUsage): Total usage of the summarization.
+        calls (list[LLMCall]): Usage of every model call, in completion order.
+    """
+
+    summary: str
+    summaries: dict[str, str] = Field(default_factory=dict)
+    usage: TokenUsage = Field(default_factory=TokenUsage)
+    calls: list[LLMCall] = Field(default_factory=list)
+
+
+class UsageTracker(BaseModel):
+    """This tracker collects the model calls of a summarization and enforces its token budget.
+
+    It is shared by the threads of the summarization, so it is safe to use concurrently.
+
+    Attributes:
+        token_budget (Optional[int]): Maximum number of prompt and completion tokens.
+    """
+
+    token_budget: Optional[int] = None
+
+    _calls: list[LLMCall] = PrivateAttr(default_factory=list)
+    _saved_tokens: int = PrivateAttr(default=0)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def calls(self) -> list[LLMCall]:
+        """Return a copy of the recorded calls."""
+        with self._lock:
+            return list(self._calls)
+
+    def usage(self) -> TokenUsage:
+        """Return the total usage of the recorded calls."""
+        usage = TokenUsage.from_calls(self.calls)
+        usage.saved_tokens = self._saved_tokens
+        return usage
+
+    def check_budget(self, nb_prompt_tokens: int) -> None:
+        """Raise if a prompt would exceed the token budget.
+
+        Args:
+            nb_prompt_tokens (int): Number of tokens of the next prompt.
+        """
+        if self.token_budget is None:
+            return
+        nb_used_tokens = self.usage().total_tokens
+        if nb_used_tokens + nb_prompt_tokens > self.token_budget:
+            msg = (
+                f"A prompt of {nb_prompt_tokens} tokens would exceed the token budget of "
+                f"{self.token_budget}, {nb_used_tokens} tokens are already used."
+            )
+            raise TokenBudgetExceededError(msg)
+
+    def record(self, call: LLMCall) -> None:
+        """Record a model call, raising if it exceeded the token budget.
+
+        Args:
+            call (LLMCall): The model call.
+        """
+        with self._lock:
+            self._calls.append(call)
+        self.check_budget(0)
+
+    def record_saved_tokens(self, nb_tokens: int) -> None:
+        """Record tokens removed from the document before the model calls.
+
+        Args:
+            nb_tokens (int): Number of tokens removed.
+        """
+        with self._lock:
+            self._saved_tokens += nb_tokens
+
+
+_tracker: ContextVar[Optional[UsageTracker]] = ContextVar("usage_tracker", default=None)
+_call_label: ContextVar[str] = ContextVar("call_label", default=DEFAULT_CALL_LABEL)
+
+
+@contextmanager
+def track_usage(token_budget: Optional[int] = None) -> Iterator[UsageTracker]:
+    """Collect the model calls made in the block.
+
+    Args:
+        token_budget (Optional[int]): Maximum number of tokens used in the block.
+
+    Yields:
+        UsageTracker: The tracker of the block.
+    """
+    tracker = UsageTracker(token_budget=token_budget)
+    token = _tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _tracker.reset(token)
+
+
+@contextmanager
+def usage_label(label: str) -> Iterator[None]:
+    """Label the model calls made in the block.
+
+    Args:
+        label (str): The label.
+    """
+    token = _call_label.set(label)
+    try:
+        yield
+    finally:
+        _call_label.reset(token)
+
+
+def has_token_budget() -> bool:
+    """Return whether the current summarization has a token budget."""
+    tracker = _tracker.get()
+    return tracker is not None and tracker.token_budget is not None
+
+
+def check_token_budget(nb_prompt_tokens: int) -> None:
+    """Raise if a prompt would exceed the token budget of the current summarization.
+
+    Args:
+        nb_prompt_tokens (int): Number of tokens of the next prompt.
+    """
+    tracker = _tracker.get()
+    if tracker is not None:
+        tracker.check_budget(nb_prompt_tokens)
+
+
+def record_llm_call(
+    model: str, prompt_tokens: int, completion_tokens: int, cost_usd: float = 0.0
+) -> None:
+    """Record a model call in the metrics and in the tracker of the current summarization.
+
+    Args:
+        model (str): Api name of the model.
+        prompt_tokens (int): Number of tokens of the prompt.
+        completion_tokens (int): Number of tokens of the completion.
+        cost_usd (float, optional): Cost of the call. Defaults to 0.
+    """
+    REGISTRY.increment("llm_calls_total", model=model)
+    REGISTRY.increment("llm_tokens_total", prompt_tokens, model=model, kind="prompt")
+    REGISTRY.increment("llm_tokens_total", completion_tokens, model=model, kind="completion")
+    REGISTRY.increment("llm_cost_usd_total", cost_usd, model=model)
+    tracker = _tracker.get()
+    if tracker is not None:
+        tracker.record(
+            LLMCall(
+                label=_call_label.get(),
+                model=model,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                cost_usd=cost_usd,
+            )
+        )
+
+
+def record_saved_tokens(nb_tokens: int) -> None:
+    """Record in the metrics and in the current summarization tokens removed by the preprocessing.
+
+    Args:
+        nb_tokens (int): Number of tokens removed.
+    """
+    REGISTRY.increment("preprocessing_saved_tokens_total", nb_tokens)
+    tracker = _tracker.get()
+    if tracker is not None:
+        tracker.record_saved_tokens(nb_tokens)
+
+
+class TokenBudgetExceededError(Exception):
+    """Exception raised when a summarization uses more tokens than its budget."""
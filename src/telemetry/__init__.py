@@ -0,0 +1,29 @@
+"""This modules implements the tracing and metrics shared by the services."""
+
+from telemetry.instrumentation import instrument_app
+from telemetry.metrics import REGISTRY, Histogram, MetricsRegistry
+from telemetry.tracing import (
+    TRACE_ID_HEADER,
+    get_trace_id,
+    new_trace_id,
+    span,
+    trace,
+    trace_headers,
+    traced,
+    traced_iter,
+)
+
+__all__ = [
+    "REGISTRY",
+    "TRACE_ID_HEADER",
+    "Histogram",
+    "MetricsRegistry",
+    "get_trace_id",
+    "instrument_app",
+    "new_trace_id",
+    "span",
+    "trace",
+    "trace_headers",
+    "traced",
+    "traced_iter",
+]
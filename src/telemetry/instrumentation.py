@@ -0,0 +1,49 @@
+"""This module instruments the FastAPI apps of the services."""
+import time
+from collections.abc import Awaitable
+from typing import Callable
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import PlainTextResponse
+
+from telemetry.metrics import REGISTRY, MetricsRegistry
+from telemetry.tracing import TRACE_ID_HEADER, trace
+
+REQUEST_DURATION_METRIC = "http_request_duration_seconds"
+REQUESTS_METRIC = "http_requests_total"
+
+
+def instrument_app(app: FastAPI, registry: MetricsRegistry = REGISTRY) -> None:
+    """Trace the requests of an app and expose its metrics on /metrics.
+
+    Every request continues the trace of the X-Trace-Id header, or starts a new one, and the
+    trace id is sent back in the response headers.
+
+    Args:
+        app (FastAPI): The app.
+        registry (MetricsRegistry, optional): Registry of the metrics. Defaults to REGISTRY.
+    """
+
+    @app.middleware("http")
+    async def trace_request(
+        request: Request, call_next: Callable[[Request], Awaitable[Response]]
+    ) -> Response:
+        start = time.perf_counter()
+        with trace(request.headers.get(TRACE_ID_HEADER)) as trace_id:
+            response = await call_next(request)
+        # The router stores the matched endpoint in the scope, its name bounds the cardinality.
+        endpoint = request.scope.get("endpoint")
+        labels = {
+            "endpoint": getattr(endpoint, "__name__", "unmatched"),
+            "method": request.method,
+            "status": str(response.status_code),
+        }
+        registry.observe(REQUEST_DURATION_METRIC, time.perf_counter() - start, **labels)
+        registry.increment(REQUESTS_METRIC, **labels)
+        response.headers[TRACE_ID_HEADER] = trace_id
+        return response
+
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    def metrics() -> str:
+        """Return the metrics of the service in the Prometheus text format."""
+        return registry.render()
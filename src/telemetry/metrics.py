@@ -0,0 +1,223 @@
+"""This module implements in-memory latency histograms and counters."""
+import bisect
+import threading
+from typing import Optional, Union
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+DEFAULT_BUCKETS_SECONDS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    300.0,
+)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram(BaseModel):
+    """A cumulative histogram of observed values.
+
+    Attributes:
+        buckets (tuple[float, ...]): Upper bounds of the buckets, in increasing order.
+        bucket_counts (list[int]): Number of values in each bucket, the last one counting the
+            values above every bound.
+        total (float): Sum of the observed values.
+        count (int): Number of observed values.
+    """
+
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS_SECONDS
+    bucket_counts: list[int] = Field(default_factory=list)
+    total: float = 0.0
+    count: int = 0
+
+    def observe(self, value: float) -> None:
+        """Add a value to the histogram.
+
+        Args:
+            value (float): Observed value.
+        """
+        if not self.bucket_counts:
+            self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative_counts(self) -> list[int]:
+        """Return the number of values lower or equal to each bound, then the total.
+
+        Returns:
+            list[int]: Cumulative counts of the buckets.
+
+        Examples:
+            >>> histogram = Histogram(buckets=(1.0, 2.0))
+            >>> for value in (0.5, 1.5, 1.7, 3.0):
+            ...     histogram.observe(value)
+            >>> histogram.cumulative_counts()
+            [1, 3, 4]
+        """
+        counts = self.bucket_counts or [0] * (len(self.buckets) + 1)
+        cumulative = []
+        total = 0
+        for count in counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+
+class MetricsRegistry(BaseModel):
+    """This registry aggregates the histograms and counters of a process.
+
+    The metrics are identified by a name and labels, and rendered in the Prometheus text format.
+
+    Attributes:
+        buckets (tuple[float, ...]): Bucket bounds of the histograms.
+    """
+
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS_SECONDS
+
+    _histograms: dict[tuple[str, Labels], Histogram] = PrivateAttr(default_factory=dict)
+    _counters: dict[tuple[str, Labels], float] = PrivateAttr(default_factory=dict)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        buckets: Optional[tuple[float, ...]] = None,
+        **labels: str,
+    ) -> None:
+        """Add a value to a histogram.
+
+        Args:
+            name (str): Name of the histogram.
+            value (float): Observed value.
+            buckets (Optional[tuple[float, ...]]): Bucket bounds used if the histogram does not
+                exist yet. Defaults to the bounds of the registry.
+            **labels (str): Labels of the histogram.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets=buckets or self.buckets)
+            histogram.observe(value)
+
+    def increment(self, name: str, value: float = 1.0, **labels: str) -> None:
+        """Increment a counter.
+
+        Args:
+            name (str): Name of the counter.
+            value (float, optional): Increment. Defaults to 1.
+            **labels (str): Labels of the counter.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def get_histogram(self, name: str, **labels: str) -> Histogram:
+        """Return a copy of a histogram, empty if nothing was observed.
+
+        Args:
+            name (str): Name of the histogram.
+            **labels (str): Labels of the histogram.
+
+        Returns:
+            Histogram: The histogram.
+        """
+        with self._lock:
+            histogram = self._histograms.get((name, tuple(sorted(labels.items()))))
+            return (
+                Histogram(buckets=self.buckets)
+                if histogram is None
+                else histogram.model_copy(deep=True)
+            )
+
+    def get_counter(self, name: str, **labels: str) -> float:
+        """Return the value of a counter.
+
+        Args:
+            name (str): Name of the counter.
+            **labels (str): Labels of the counter.
+
+        Returns:
+            float: Value of the counter, 0 if it was never incremented.
+        """
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0.0)
+
+    def reset(self) -> None:
+        """Remove every metric."""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self) -> str:
+        """Render the metrics in the Prometheus text format.
+
+        Returns:
+            str: The metrics.
+
+        Examples:
+            >>> registry = MetricsRegistry(buckets=(1.0,))
+            >>> registry.observe("duration_seconds", 0.5, span="fetch")
+            >>> registry.increment("spans_total", span="fetch")
+            >>> print(registry.render())
+            # TYPE duration_seconds histogram
+            duration_seconds_bucket{span="fetch",le="1.0"} 1
+            duration_seconds_bucket{span="fetch",le="+Inf"} 1
+            duration_seconds_sum{span="fetch"} 0.5
+            duration_seconds_count{span="fetch"} 1
+            # TYPE spans_total counter
+            spans_total{span="fetch"} 1.0
+            <BLANKLINE>
+        """
+        lines: list[str] = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        typed: set[str] = set()
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            bounds: list[Union[float, str]] = [*histogram.buckets, "+Inf"]
+            for bound, count in zip(bounds, histogram.cumulative_counts()):
+                lines.append(f"{name}_bucket{_format_labels(labels, le=str(bound))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram.total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels, **extra_labels: str) -> str:
+    """Format labels in the Prometheus text format."""
+    all_labels = [*labels, *extra_labels.items()]
+    if not all_labels:
+        return ""
+    formatted = ",".join(f'{key}="{_escape(value)}"' for key, value in all_labels)
+    return "{" + formatted + "}"
+
+
+def _escape(value: str) -> str:
+    """Escape a label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY = MetricsRegistry()
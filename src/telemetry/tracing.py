@@ -0,0 +1,140 @@
+"""This module implements the spans timing the operations of a trace."""
+import functools
+import inspect
+import logging
+import time
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Optional, TypeVar
+
+from telemetry.metrics import REGISTRY, MetricsRegistry
+
+TRACE_ID_HEADER = "X-Trace-Id"
+SPAN_DURATION_METRIC = "span_duration_seconds"
+SPANS_METRIC = "spans_total"
+
+_trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+
+T = TypeVar("T")
+
+
+def new_trace_id() -> str:
+    """Return a new random trace id."""
+    return uuid.uuid4().hex
+
+
+def get_trace_id() -> Optional[str]:
+    """Return the trace id of the current context."""
+    return _trace_id.get()
+
+
+@contextmanager
+def trace(trace_id: Optional[str] = None) -> Iterator[str]:
+    """Set the trace id of the current context until the block exits.
+
+    Args:
+        trace_id (Optional[str]): Trace id to continue. Defaults to a new trace id.
+
+    Yields:
+        str: The trace id.
+    """
+    trace_id = trace_id or new_trace_id()
+    token = _trace_id.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        _trace_id.reset(token)
+
+
+def trace_headers() -> dict[str, str]:
+    """Return the headers propagating the current trace id to another service.
+
+    Returns:
+        dict[str, str]: The headers, empty outside of a trace.
+    """
+    trace_id = get_trace_id()
+    return {} if trace_id is None else {TRACE_ID_HEADER: trace_id}
+
+
+@contextmanager
+def span(name: str, registry: MetricsRegistry = REGISTRY) -> Iterator[None]:
+    """Time the operation run in the block.
+
+    The duration is added to the span_duration_seconds histogram and the spans_total counter
+    is incremented with the status of the operation.
+
+    Args:
+        name (str): Name of the operation.
+        registry (MetricsRegistry, optional): Registry of the metrics. Defaults to REGISTRY.
+    """
+    start = time.perf_counter()
+    status = "error"
+    try:
+        yield
+        status = "ok"
+    finally:
+        _record_span(name, time.perf_counter() - start, status, registry)
+
+
+def traced(name: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """Decorate a function or a coroutine function to time its calls in a span.
+
+    Args:
+        name (str): Name of the operation.
+
+    Returns:
+        Callable[[Callable[..., T]], Callable[..., T]]: The decorator.
+    """
+
+    def decorator(func: Callable[..., T]) -> Callable[..., T]:
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with span(name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def traced_iter(name: str, iterator: Iterator[T]) -> Iterator[T]:
+    """Time the production of every item of a lazy iterator in a span.
+
+    Args:
+        name (str): Name of the operation producing an item.
+        iterator (Iterator[T]): The iterator.
+
+    Yields:
+        T: The items of the iterator, the exhaustion of the iterator is not recorded.
+    """
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        except BaseException:
+            _record_span(name, time.perf_counter() - start, "error", REGISTRY)
+            raise
+        _record_span(name, time.perf_counter() - start, "ok", REGISTRY)
+        yield item
+
+
+def _record_span(name: str, duration: float, status: str, registry: MetricsRegistry) -> None:
+    """Add a finished span to the metrics and log it."""
+    registry.observe(SPAN_DURATION_METRIC, duration, span=name)
+    registry.increment(SPANS_METRIC, span=name, status=status)
+    logging.debug(
+        "trace_id=%s span=%s status=%s duration=%.4fs", get_trace_id(), name, status, duration
+    )
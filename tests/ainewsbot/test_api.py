@@ -1,9 +1,10 @@
 """Test ainewsbot REST API."""
 
 import httpx
+import pytest
 from fastapi.testclient import TestClient
 
-from ainewsbot import app
+from ainewsbot import api, app
 
 client = TestClient(app)
 
@@ -12,3 +13,12 @@ def test_read_root() -> None:
     """Test that reading the root is successful."""
     response = client.get("/")
     assert httpx.codes.is_success(response.status_code)
+
+
+def test_create_pipeline_speculation(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the speculation of the pipeline is configured by the environment."""
+    monkeypatch.setattr(api, "SPECULATIVE_TOP_N", 2)
+    monkeypatch.setattr(api, "SPECULATIVE_BUDGET_USD", 0.5)
+    pipeline = api.create_pipeline("http")
+    assert pipeline.speculative_top_n == 2  # noqa: PLR2004
+    assert pipeline.speculative_budget_usd == 0.5  # noqa: PLR2004
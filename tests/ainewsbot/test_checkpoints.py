@@ -0,0 +1,41 @@
+"""Test the checkpoints of the pipeline stages."""
+from datetime import date
+from pathlib import Path
+
+from ainewsbot.checkpoints import StageCheckpointStore, hash_inputs
+
+TODAY = date(2024, 1, 2)
+YESTERDAY = date(2024, 1, 1)
+
+
+def test_put_get(tmp_path: Path) -> None:
+    """Test that a result is kept by day, stage and inputs, a None result included."""
+    store = StageCheckpointStore(directory=tmp_path)
+    inputs_hash = hash_inputs({"papers": [1, 2]})
+    assert store.get(TODAY, "best_paper", inputs_hash) is None
+    store.put(TODAY, "best_paper", inputs_hash, {"URL": "/paper/a"})
+    store.put(TODAY, "empty", inputs_hash, None)
+    assert store.get(TODAY, "best_paper", inputs_hash).result == {"URL": "/paper/a"}
+    assert store.get(TODAY, "empty", inputs_hash).result is None
+    assert store.get(TODAY, "best_paper", hash_inputs({"papers": [1]})) is None
+    assert store.get(YESTERDAY, "best_paper", inputs_hash) is None
+
+
+def test_prune(tmp_path: Path) -> None:
+    """Test that the checkpoints of the previous days are deleted."""
+    store = StageCheckpointStore(directory=tmp_path)
+    store.put(YESTERDAY, "papers", hash_inputs({}), [1])
+    store.put(TODAY, "papers", hash_inputs({}), [2])
+    store.prune(before=TODAY)
+    assert store.get(YESTERDAY, "papers", hash_inputs({})) is None
+    assert store.get(TODAY, "papers", hash_inputs({})).result == [2]
+
+
+def test_prune_skips_stray_directories(tmp_path: Path) -> None:
+    """Test that a directory which is not a day is neither deleted nor failing the prune."""
+    store = StageCheckpointStore(directory=tmp_path)
+    store.put(YESTERDAY, "papers", hash_inputs({}), [1])
+    (tmp_path / "backup").mkdir()
+    store.prune(before=TODAY)
+    assert store.get(YESTERDAY, "papers", hash_inputs({})) is None
+    assert (tmp_path / "backup").is_dir()
@@ -0,0 +1,112 @@
+"""Test the ainewsbot DAG executor."""
+import asyncio
+from datetime import date
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from ainewsbot.checkpoints import StageCheckpointStore
+from ainewsbot.dag import Stage, run_dag
+from ainewsbot.exceptions import StageTimeOutError
+
+
+async def constant(value: Any = 1) -> Any:
+    """Return a constant after a short sleep."""
+    await asyncio.sleep(0.05)
+    return value
+
+
+async def add(**inputs: int) -> int:
+    """Return the sum of the inputs."""
+    return sum(inputs.values())
+
+
+def test_run_dag_results() -> None:
+    """Test that results are passed to the dependent stages."""
+    stages = [
+        Stage(name="a", func=constant),
+        Stage(name="b", func=constant),
+        Stage(name="c", func=add, dependencies=["a", "b"]),
+    ]
+    dag_run = asyncio.run(run_dag(stages))
+    expected_result = 2
+    assert dag_run.results["c"] == expected_result
+    assert [timing.name for timing in dag_run.timings][-1] == "c"
+
+
+def test_run_dag_independent_stages_overlap() -> None:
+    """Test that independent stages run concurrently."""
+    stages = [Stage(name=str(idx), func=constant) for idx in range(5)]
+    dag_run = asyncio.run(run_dag(stages))
+    last_start = max(timing.start_seconds for timing in dag_run.timings)
+    first_end = min(timing.start_seconds + timing.duration_seconds for timing in dag_run.timings)
+    assert last_start < first_end
+
+
+def test_run_dag_timeout() -> None:
+    """Test that a stage taking longer than its time out raises."""
+    stages = [Stage(name="slow", func=constant, timeout_seconds=0.001)]
+    with pytest.raises(StageTimeOutError, match="Stage slow took more than"):
+        asyncio.run(run_dag(stages))
+
+
+def test_run_dag_unknown_dependency() -> None:
+    """Test that an unknown dependency raises."""
+    with pytest.raises(ValueError, match="depends on unknown stages"):
+        asyncio.run(run_dag([Stage(name="a", func=add, dependencies=["b"])]))
+
+
+def test_run_dag_cycle() -> None:
+    """Test that cyclic dependencies raise."""
+    stages = [
+        Stage(name="a", func=add, dependencies=["b"]),
+        Stage(name="b", func=add, dependencies=["a"]),
+    ]
+    with pytest.raises(ValueError, match="cyclic dependencies"):
+        asyncio.run(run_dag(stages))
+
+
+def test_run_dag_resumes_from_checkpoints(tmp_path: Path) -> None:
+    """Test that a retried run only runs the stages which did not complete."""
+    store = StageCheckpointStore(directory=tmp_path)
+    calls: list[str] = []
+
+    async def count(name: str, **inputs: int) -> int:
+        calls.append(name)
+        if name == "c" and len(calls) == 3:  # noqa: PLR2004
+            msg = "Stage c failed."
+            raise RuntimeError(msg)
+        return sum(inputs.values()) + 1
+
+    stages = [
+        Stage(name="a", func=lambda: count("a")),
+        Stage(name="b", func=lambda a: count("b", a=a), dependencies=["a"]),
+        Stage(name="c", func=lambda b: count("c", b=b), dependencies=["b"]),
+    ]
+    with pytest.raises(RuntimeError, match="Stage c failed"):
+        asyncio.run(run_dag(stages, store, date(2024, 1, 1)))
+    dag_run = asyncio.run(run_dag(stages, store, date(2024, 1, 1)))
+    expected_result = 3
+    assert dag_run.results["c"] == expected_result
+    assert calls == ["a", "b", "c", "c"]
+    assert [timing.resumed for timing in dag_run.timings] == [True, True, False]
+    asyncio.run(run_dag(stages, store, date(2024, 1, 2)))
+    assert calls[4:] == ["a", "b", "c"]
+
+
+def test_run_dag_optional_stage_failure() -> None:
+    """Test that the failure or time out of a stage which is not required is ignored."""
+
+    async def fail() -> None:
+        msg = "Optional stage failed."
+        raise RuntimeError(msg)
+
+    stages = [
+        Stage(name="a", func=constant),
+        Stage(name="failed", func=fail, required=False),
+        Stage(name="slow", func=constant, timeout_seconds=0.001, required=False),
+        Stage(name="b", func=add, dependencies=["a"]),
+    ]
+    dag_run = asyncio.run(run_dag(stages))
+    assert dag_run.results == {"a": 1, "failed": None, "slow": None, "b": 1}
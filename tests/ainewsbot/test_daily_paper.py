@@ -0,0 +1,189 @@
+"""Test the daily paper service."""
+import asyncio
+from collections.abc import AsyncIterator
+from datetime import date
+from pathlib import Path
+from typing import Any, Optional
+
+import pytest
+
+from ainewsbot.daily_paper import DailyPaperService, JSONResultStore
+from ainewsbot.pipeline import PaperRetrieverPipeline
+
+TODAY = date(2024, 1, 2)
+YESTERDAY = date(2024, 1, 1)
+
+
+class FakePipelineRuns:
+    """Count the runs of the pipeline, each run lasting until released."""
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.nb_runs = 0
+        self.nb_cancelled = 0
+        self.release: Optional[asyncio.Event] = None
+
+    async def arun(self) -> dict[str, Any]:
+        """Return a new result once released."""
+        self.nb_runs += 1
+        if self.release is not None:
+            try:
+                await self.release.wait()
+            except asyncio.CancelledError:
+                self.nb_cancelled += 1
+                raise
+        return {"Title": f"Paper {self.nb_runs}"}
+
+    async def astream_run(self) -> AsyncIterator[dict[str, Any]]:
+        """Yield a progress event, then a new result."""
+        yield {"event": "token", "data": {"text": "Sum"}}
+        yield {"event": "done", "data": await self.arun()}
+
+
+class TestJSONResultStore:
+    """This class tests the JSONResultStore class."""
+
+    def test_put_get(self, tmp_path: Path) -> None:
+        """Test that a result is stored by day."""
+        store = JSONResultStore(directory=tmp_path)
+        assert store.get(TODAY) is None
+        assert store.latest() is None
+        store.put(YESTERDAY, {"Title": "Old"})
+        store.put(TODAY, {"Title": "New"})
+        assert store.get(YESTERDAY) == {"Title": "Old"}
+        assert store.latest() == (TODAY, {"Title": "New"})
+
+
+class TestDailyPaperService:
+    """This class tests the DailyPaperService class."""
+
+    @pytest.fixture()
+    def runs(self, monkeypatch: pytest.MonkeyPatch) -> FakePipelineRuns:
+        """Fixture fake pipeline runs on a fixed day."""
+        runs = FakePipelineRuns()
+        monkeypatch.setattr(PaperRetrieverPipeline, "arun", lambda self: runs.arun())
+        monkeypatch.setattr(PaperRetrieverPipeline, "astream_run", lambda self: runs.astream_run())
+        monkeypatch.setattr(DailyPaperService, "today", staticmethod(lambda: TODAY))
+        return runs
+
+    @pytest.fixture()
+    def service(self, tmp_path: Path) -> DailyPaperService:
+        """Fixture a service storing its results in a temporary directory."""
+        pipeline = PaperRetrieverPipeline(
+            summarizer_url="http://summarizer:8000",
+            scrapper_url="http://scrapper:8000",
+            paperchooser_url="http://paperchooser:8000",
+        )
+        return DailyPaperService(pipeline=pipeline, store=JSONResultStore(directory=tmp_path))
+
+    def test_get_coalesces_misses(self, service: DailyPaperService, runs: FakePipelineRuns) -> None:
+        """Test that concurrent misses share one run whose result is then served and stored."""
+
+        async def run() -> list[dict[str, Any]]:
+            runs.release = asyncio.Event()
+            requests = [asyncio.create_task(service.get()) for _ in range(3)]
+            await asyncio.sleep(0)
+            runs.release.set()
+            results = await asyncio.gather(*requests)
+            return [*results, await service.get()]
+
+        assert asyncio.run(run()) == [{"Title": "Paper 1"}] * 4
+        assert runs.nb_runs == 1
+        assert service.store.get(TODAY) == {"Title": "Paper 1"}
+
+    def test_start_loads_stored_result(
+        self, service: DailyPaperService, runs: FakePipelineRuns
+    ) -> None:
+        """Test that the result stored by a previous process is served without a run."""
+        service.store.put(TODAY, {"Title": "Stored"})
+
+        async def run() -> dict[str, Any]:
+            service.start()
+            try:
+                return await service.get()
+            finally:
+                await service.stop()
+
+        assert asyncio.run(run()) == {"Title": "Stored"}
+        assert runs.nb_runs == 0
+
+    def test_get_stale_while_revalidate(
+        self, service: DailyPaperService, runs: FakePipelineRuns
+    ) -> None:
+        """Test that the previous result is served while the day is computed."""
+        service.stale_while_revalidate = True
+        service.store.put(YESTERDAY, {"Title": "Stale"})
+
+        async def run() -> list[dict[str, Any]]:
+            service.start()
+            try:
+                stale = await service.get()
+                await service.refresh()
+                return [stale, await service.get()]
+            finally:
+                await service.stop()
+
+        assert asyncio.run(run()) == [{"Title": "Stale"}, {"Title": "Paper 1"}]
+        assert runs.nb_runs == 1
+
+    def test_stream(self, service: DailyPaperService, runs: FakePipelineRuns) -> None:
+        """Test that the progress of a miss is streamed, then the stored result is served."""
+
+        async def run() -> list[list[dict[str, Any]]]:
+            return [[event async for event in service.stream()] for _ in range(2)]
+
+        first, second = asyncio.run(run())
+        assert first == [
+            {"event": "token", "data": {"text": "Sum"}},
+            {"event": "done", "data": {"Title": "Paper 1"}},
+        ]
+        assert second == [{"event": "done", "data": {"Title": "Paper 1"}}]
+        assert service.store.get(TODAY) == {"Title": "Paper 1"}
+        assert runs.nb_runs == 1
+
+    def test_stream_coalesces_misses(
+        self, service: DailyPaperService, runs: FakePipelineRuns
+    ) -> None:
+        """Test that concurrent streams and requests share the streamed run."""
+
+        async def collect() -> list[dict[str, Any]]:
+            return [event async for event in service.stream()]
+
+        async def run() -> list[Any]:
+            runs.release = asyncio.Event()
+            streams = [asyncio.create_task(collect()) for _ in range(2)]
+            await asyncio.sleep(0)
+            request = asyncio.create_task(service.get())
+            await asyncio.sleep(0)
+            runs.release.set()
+            return [*await asyncio.gather(*streams), await request]
+
+        first, second, result = asyncio.run(run())
+        assert (
+            first
+            == second
+            == [
+                {"event": "token", "data": {"text": "Sum"}},
+                {"event": "done", "data": {"Title": "Paper 1"}},
+            ]
+        )
+        assert result == {"Title": "Paper 1"}
+        assert runs.nb_runs == 1
+
+    def test_stream_disconnect_cancels_run(
+        self, service: DailyPaperService, runs: FakePipelineRuns
+    ) -> None:
+        """Test that the streamed run is cancelled once its last stream disconnects."""
+
+        async def run() -> None:
+            runs.release = asyncio.Event()
+            events = service.stream()
+            assert await events.__anext__() == {"event": "token", "data": {"text": "Sum"}}
+            await asyncio.sleep(0)
+            await events.aclose()
+            await asyncio.sleep(0)
+
+        asyncio.run(run())
+        assert runs.nb_runs == 1
+        assert runs.nb_cancelled == 1
+        assert service.store.get(TODAY) is None
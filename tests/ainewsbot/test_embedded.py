@@ -0,0 +1,127 @@
+"""Test the embedded pipeline."""
+import asyncio
+import datetime
+from typing import Any
+
+import pytest
+from pydantic import Field
+
+from ainewsbot.embedded import EmbeddedPaperRetrieverPipeline
+from ainewsbot.exceptions import SummaryFailedError
+from paperchooser.managers import ManagerFactory
+from scrapper.papers_with_code_scrapper import PapersWithCodeTrendingScrapper
+from summarizer.chains import BaseChain
+
+PUBLICATION_DATE = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+TRENDING_PAPERS = [
+    {
+        "Title": f"Paper {idx}",
+        "URL": f"/paper/paper-{idx}",
+        "Publication date": PUBLICATION_DATE,
+        "Stars": 10 * idx,
+        "Stars per hour": float(idx),
+    }
+    for idx in range(5)
+]
+
+
+class FakeChain(BaseChain):
+    """Chain recording the summarized pdfs."""
+
+    summarized: list[str] = Field(default_factory=list)
+
+    def run_chain(self, pdf_url: str) -> str:
+        """Return a fake summary."""
+        self.summarized.append(pdf_url)
+        if pdf_url.endswith("paper-0.pdf"):
+            msg = "boom"
+            raise ValueError(msg)
+        return f"Summary of {pdf_url}"
+
+
+class TestEmbeddedPaperRetrieverPipeline:
+    """This class tests the EmbeddedPaperRetrieverPipeline class."""
+
+    @pytest.fixture()
+    def pipeline(self, monkeypatch: pytest.MonkeyPatch) -> EmbeddedPaperRetrieverPipeline:
+        """Fixture an embedded pipeline with a fake scrapper and chain."""
+        monkeypatch.setattr(
+            PapersWithCodeTrendingScrapper,
+            "get_best_papers",
+            lambda self, nb_papers: TRENDING_PAPERS[:nb_papers],
+        )
+        monkeypatch.setattr(
+            EmbeddedPaperRetrieverPipeline,
+            "_scrap_paper_info",
+            staticmethod(lambda path, url: {"pdf_url": f"https://arxiv.org/pdf/{path}.pdf"}),
+        )
+        manager = ManagerFactory.create_class(
+            {"evaluator": {"class": "SimpleEvaluator"}, "manager": {"class": "SimpleManager"}}
+        )
+        return EmbeddedPaperRetrieverPipeline(manager=manager, chain=FakeChain())
+
+    def test_arun(self, pipeline: EmbeddedPaperRetrieverPipeline) -> None:
+        """Test that the best paper is summarized without any api."""
+        assert asyncio.run(pipeline.arun()) == {
+            "pdf_url": "https://arxiv.org/pdf/paper/paper-4.pdf",
+            "Summary": "Summary of https://arxiv.org/pdf/paper/paper-4.pdf",
+        }
+
+    def test_arun_reuses_speculative_summaries(
+        self, pipeline: EmbeddedPaperRetrieverPipeline
+    ) -> None:
+        """Test that a paper is summarized once, even when speculatively submitted."""
+        pipeline.speculative_top_n = 2
+        pipeline.speculative_budget_usd = 2 * pipeline.speculative_summary_cost_usd
+
+        async def run() -> list[dict[str, Any]]:
+            return [await pipeline.arun(), await pipeline.arun()]
+
+        first_run, second_run = asyncio.run(run())
+        assert first_run == second_run
+        assert pipeline.chain is not None
+        assert sorted(pipeline.chain.summarized) == [
+            "https://arxiv.org/pdf/paper/paper-3.pdf",
+            "https://arxiv.org/pdf/paper/paper-4.pdf",
+        ]
+
+    def test_aget_summary_failed(self, pipeline: EmbeddedPaperRetrieverPipeline) -> None:
+        """Test that a failed summary raises and is retried on the next request."""
+
+        async def run() -> None:
+            async with pipeline.create_client() as client:
+                for _ in range(2):
+                    with pytest.raises(SummaryFailedError, match="boom"):
+                        await pipeline.aget_summary(
+                            client, "https://arxiv.org/pdf/paper/paper-0.pdf"
+                        )
+
+        asyncio.run(run())
+        assert pipeline.chain is not None
+        assert len(pipeline.chain.summarized) == 2  # noqa: PLR2004
+
+    def test_astream_run(self, pipeline: EmbeddedPaperRetrieverPipeline) -> None:
+        """Test that the streamed summary ends with the paper and is kept for the next runs."""
+
+        async def run() -> list[dict[str, Any]]:
+            return [event async for event in pipeline.astream_run()]
+
+        events = asyncio.run(run())
+        assert [event["event"] for event in events] == ["paper", "done"]
+        assert events[-1]["data"] == asyncio.run(pipeline.arun())
+        assert pipeline.chain is not None
+        assert pipeline.chain.summarized == ["https://arxiv.org/pdf/paper/paper-4.pdf"]
+
+    def test_summaries_cache_is_bounded(self, pipeline: EmbeddedPaperRetrieverPipeline) -> None:
+        """Test that the least recently used summary is dropped beyond the limit."""
+        pipeline.max_cached_summaries = 2
+        urls = [f"https://arxiv.org/pdf/paper/paper-{idx}.pdf" for idx in (1, 2, 1, 3, 2)]
+
+        async def run() -> None:
+            async with pipeline.create_client() as client:
+                for url in urls:
+                    await pipeline.aget_summary(client, url)
+
+        asyncio.run(run())
+        assert pipeline.chain is not None
+        assert pipeline.chain.summarized == [urls[0], urls[1], urls[3], urls[4]]
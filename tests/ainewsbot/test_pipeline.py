@@ -0,0 +1,390 @@
+"""Test the ainewsbot pipeline."""
+import asyncio
+import json
+from pathlib import Path
+from typing import Any
+
+import httpx
+import pytest
+
+from ainewsbot.checkpoints import StageCheckpointStore
+from ainewsbot.dag import DAGRun
+from ainewsbot.exceptions import SummaryFailedError, SummaryTimeOutError
+from ainewsbot.pipeline import PaperRetrieverPipeline
+
+PAPER_PDF_URL = "https://arxiv.org/pdf/1706.03762.pdf"
+TRENDING_PAPERS = [{"Title": f"Paper {idx}", "URL": f"/paper/paper-{idx}"} for idx in range(5)]
+
+
+class FakeServices:
+    """Fake scrapper, paperchooser and summarizer apis recording the requested paper infos."""
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.info_requests: list[str] = []
+        self.job_polls = 0
+        self.submitted_jobs: list[str] = []
+        self.summarized_papers: set[str] = set()
+        self.trace_ids: set[str] = set()
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        """Answer a request like the ainewsbot services."""
+        path = request.url.path
+        self.trace_ids.add(request.headers.get("X-Trace-Id", ""))
+        if path == "/paper/":
+            paper_url = request.url.params["paper_url"]
+            self.info_requests.append(paper_url)
+            return httpx.Response(200, json={"pdf_url": f"https://arxiv.org/pdf/{paper_url}.pdf"})
+        if path == "/jobs" and request.method == "GET":
+            if request.url.params["paper_url"] in self.summarized_papers:
+                return httpx.Response(200, json={"job_id": "0", "status": "done"})
+            return httpx.Response(404, json={"detail": "No job"})
+        if path == "/jobs":
+            self.submitted_jobs.append(request.url.params["paper_url"])
+        if path == "/summarize/stream":
+            events = [("chunks", {"nb_chunks": 1}), ("token", {"text": "Sum"})]
+            events.append(("done", {"summary": "Sum"}))
+            content = "".join(f"event: {e}\ndata: {json.dumps(d)}\n\n" for e, d in events)
+            return httpx.Response(200, text=content, headers={"Content-Type": "text/event-stream"})
+        if path == "/jobs/1":
+            self.job_polls += 1
+            return httpx.Response(200, json={"job_id": "1", "status": "done", "summary": "Sum"})
+        routes: dict[str, tuple[int, Any]] = {
+            "/paper/trending_papers": (200, TRENDING_PAPERS),
+            "/selection/best": (200, TRENDING_PAPERS[-1]),
+            "/selection/ranker": (200, TRENDING_PAPERS),
+            "/jobs": (202, {"job_id": "1", "status": "pending"}),
+        }
+        status_code, content = routes.get(path, (404, None))
+        return httpx.Response(status_code, json=content)
+
+
+class TestPaperRetrieverPipeline:
+    """This class tests the PaperRetrieverPipeline class."""
+
+    @pytest.fixture()
+    def pipeline(self) -> PaperRetrieverPipeline:
+        """Fixture a pipeline which does not wait between two polls."""
+        return PaperRetrieverPipeline(
+            summarizer_url="http://summarizer:8000",
+            scrapper_url="http://scrapper:8000",
+            paperchooser_url="http://paperchooser:8000",
+            summary_poll_interval_seconds=0,
+        )
+
+    def test_aget_summary_polls_until_done(self, pipeline: PaperRetrieverPipeline) -> None:
+        """Test that the summary job is polled until it is done."""
+        statuses = iter(["pending", "running", "done"])
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(
+                200, json={"job_id": "1", "status": next(statuses), "summary": "summary"}
+            )
+
+        async def run() -> Any:
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handle)) as client:
+                return await pipeline.aget_summary(client, PAPER_PDF_URL)
+
+        assert asyncio.run(run()) == "summary"
+        assert next(statuses, None) is None
+
+    def test_aget_summary_cached(self, pipeline: PaperRetrieverPipeline) -> None:
+        """Test that a done job is returned without polling."""
+        requests: list[httpx.Request] = []
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return httpx.Response(200, json={"job_id": "1", "status": "done", "summary": "summary"})
+
+        async def run() -> Any:
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handle)) as client:
+                return await pipeline.aget_summary(client, PAPER_PDF_URL)
+
+        assert asyncio.run(run()) == "summary"
+        assert [request.method for request in requests] == ["POST"]
+
+    def test_aget_summary_failed(self, pipeline: PaperRetrieverPipeline) -> None:
+        """Test that a failed job raises."""
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, json={"job_id": "1", "status": "failed", "error": "boom"})
+
+        async def run() -> None:
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handle)) as client:
+                await pipeline.aget_summary(client, PAPER_PDF_URL)
+
+        with pytest.raises(SummaryFailedError, match="boom"):
+            asyncio.run(run())
+
+    def test_aget_summary_timeout(self, pipeline: PaperRetrieverPipeline) -> None:
+        """Test that a job still running after the timeout raises in the async pipeline."""
+        pipeline.summary_timeout_seconds = 0
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, json={"job_id": "1", "status": "running"})
+
+        async def run() -> None:
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handle)) as client:
+                await pipeline.aget_summary(client, PAPER_PDF_URL)
+
+        with pytest.raises(SummaryTimeOutError, match="not ready"):
+            asyncio.run(run())
+
+    def test_arun(self, pipeline: PaperRetrieverPipeline) -> None:
+        """Test that the async run returns the best paper info with its summary."""
+        services = FakeServices()
+
+        async def run() -> dict[str, Any]:
+            transport = httpx.MockTransport(services.handle)
+            async with httpx.AsyncClient(transport=transport) as client:
+                return await pipeline.arun(client)
+
+        paper_info = asyncio.run(run())
+        assert paper_info == {
+            "pdf_url": "https://arxiv.org/pdf/paper/paper-4.pdf",
+            "Summary": "Sum",
+        }
+        assert services.job_polls == 1
+        assert len(services.trace_ids) == 1
+        assert "" not in services.trace_ids
+
+    def test_arun_stages_prefetch_candidates(self, pipeline: PaperRetrieverPipeline) -> None:
+        """Test that the info of the best paper is fetched once, with the top candidates."""
+        services = FakeServices()
+
+        async def run() -> None:
+            transport = httpx.MockTransport(services.handle)
+            async with httpx.AsyncClient(transport=transport) as client:
+                dag_run = await pipeline.arun_stages(client)
+            assert {timing.name for timing in dag_run.timings} == {
+                "papers",
+                "best_paper",
+                "ranked_papers",
+                "speculative_summaries",
+                "paper_info",
+                "summary",
+            }
+
+        asyncio.run(run())
+        assert services.info_requests.count("paper/paper-4") == 1
+        assert set(services.info_requests) <= {"paper/paper-4", "paper/paper-3", "paper/paper-2"}
+
+    def test_arun_stages_speculative_summaries(self, pipeline: PaperRetrieverPipeline) -> None:
+        """Test that the top candidates are submitted within the budget, cached ones for free."""
+        pipeline.speculative_top_n = 3
+        pipeline.speculative_budget_usd = pipeline.speculative_summary_cost_usd
+        services = FakeServices()
+        services.summarized_papers.add("https://arxiv.org/pdf/paper/paper-4.pdf")
+
+        async def run() -> DAGRun:
+            transport = httpx.MockTransport(services.handle)
+            async with httpx.AsyncClient(transport=transport) as client:
+                return await pipeline.arun_stages(client)
+
+        dag_run = asyncio.run(run())
+        assert dag_run.results["speculative_summaries"] == [
+            "https://arxiv.org/pdf/paper/paper-3.pdf"
+        ]
+        assert "https://arxiv.org/pdf/paper/paper-2.pdf" not in services.submitted_jobs
+
+    def test_arun_stages_speculation_cost(self, pipeline: PaperRetrieverPipeline) -> None:
+        """Test that the speculation budget is spent at the cost of the latest summaries."""
+        pipeline.speculative_top_n = 3
+        pipeline.speculative_budget_usd = 0.05
+        services = FakeServices()
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/jobs/1":
+                usage = {"nb_calls": 3, "prompt_tokens": 900, "completion_tokens": 90}
+                job = {"job_id": "1", "status": "done", "summary": "Sum"}
+                return httpx.Response(200, json={**job, "usage": {**usage, "cost_usd": 0.02}})
+            return services.handle(request)
+
+        async def run() -> DAGRun:
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handle)) as client:
+                await pipeline.aget_summary(client, PAPER_PDF_URL)
+                return await pipeline.arun_stages(client)
+
+        dag_run = asyncio.run(run())
+        assert pipeline.estimate_summary_cost_usd() == pytest.approx(0.02)
+        assert dag_run.results["speculative_summaries"] == [
+            "https://arxiv.org/pdf/paper/paper-4.pdf",
+            "https://arxiv.org/pdf/paper/paper-3.pdf",
+        ]
+
+    def test_arun_stages_speculation_disabled(self, pipeline: PaperRetrieverPipeline) -> None:
+        """Test that only the best paper is summarized by default."""
+        services = FakeServices()
+
+        async def run() -> DAGRun:
+            transport = httpx.MockTransport(services.handle)
+            async with httpx.AsyncClient(transport=transport) as client:
+                return await pipeline.arun_stages(client)
+
+        dag_run = asyncio.run(run())
+        assert dag_run.results["speculative_summaries"] == []
+        assert services.submitted_jobs == ["https://arxiv.org/pdf/paper/paper-4.pdf"]
+
+    def test_arun_speculation_failure(self, pipeline: PaperRetrieverPipeline) -> None:
+        """Test that a failing speculation does not fail the run."""
+        pipeline.speculative_top_n = 2
+        services = FakeServices()
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/jobs" and request.method == "GET":
+                return httpx.Response(500)
+            return services.handle(request)
+
+        async def run() -> dict[str, Any]:
+            transport = httpx.MockTransport(handle)
+            async with httpx.AsyncClient(transport=transport) as client:
+                return await pipeline.arun(client)
+
+        assert asyncio.run(run())["Summary"] == "Sum"
+
+    def test_arun_digest(
+        self, pipeline: PaperRetrieverPipeline, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Test that the digest summarizes the top papers concurrently within the limit."""
+        pipeline.max_concurrent_summaries = 2
+        services = FakeServices()
+        in_progress: list[str] = []
+        max_in_progress = 0
+
+        async def aget_summary(
+            self: PaperRetrieverPipeline, client: httpx.AsyncClient, paper_url: str
+        ) -> str:
+            nonlocal max_in_progress
+            in_progress.append(paper_url)
+            max_in_progress = max(max_in_progress, len(in_progress))
+            await asyncio.sleep(0.01)
+            in_progress.remove(paper_url)
+            if paper_url.endswith("paper-2.pdf"):
+                msg = "boom"
+                raise SummaryFailedError(msg)
+            return f"Summary of {paper_url}"
+
+        monkeypatch.setattr(PaperRetrieverPipeline, "aget_summary", aget_summary)
+
+        async def run() -> dict[str, Any]:
+            transport = httpx.MockTransport(services.handle)
+            async with httpx.AsyncClient(transport=transport) as client:
+                return await pipeline.arun_digest(4, client)
+
+        digest = asyncio.run(run())
+        assert [paper["pdf_url"] for paper in digest["Papers"]] == [
+            "https://arxiv.org/pdf/paper/paper-4.pdf",
+            "https://arxiv.org/pdf/paper/paper-3.pdf",
+            "https://arxiv.org/pdf/paper/paper-1.pdf",
+        ]
+        assert (
+            digest["Papers"][0]["Summary"] == "Summary of https://arxiv.org/pdf/paper/paper-4.pdf"
+        )
+        assert digest["Failed"] == ["/paper/paper-2"]
+        assert max_in_progress == pipeline.max_concurrent_summaries
+
+    def test_astream_run(self, pipeline: PaperRetrieverPipeline) -> None:
+        """Test that the streamed run relays the summary events and ends with the paper."""
+        services = FakeServices()
+
+        async def run() -> list[dict[str, Any]]:
+            transport = httpx.MockTransport(services.handle)
+            async with httpx.AsyncClient(transport=transport) as client:
+                return [event async for event in pipeline.astream_run(client)]
+
+        events = asyncio.run(run())
+        paper_info = {"pdf_url": "https://arxiv.org/pdf/paper/paper-4.pdf"}
+        assert events == [
+            {"event": "paper", "data": paper_info},
+            {"event": "chunks", "data": {"nb_chunks": 1}},
+            {"event": "token", "data": {"text": "Sum"}},
+            {"event": "done", "data": {**paper_info, "Summary": "Sum"}},
+        ]
+        assert services.submitted_jobs == []
+        assert len(services.trace_ids) == 1
+
+    def test_arun_resumes_after_summary_failure(
+        self, pipeline: PaperRetrieverPipeline, tmp_path: Path
+    ) -> None:
+        """Test that a run retried after a failed summary only requests the summary again."""
+        services = FakeServices()
+        pipeline.checkpoint_store = StageCheckpointStore(directory=tmp_path)
+        handle = services.handle
+        nb_failures = [1]
+
+        def fail_summary_once(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/jobs/1" and nb_failures[0]:
+                nb_failures[0] -= 1
+                return httpx.Response(200, json={"job_id": "1", "status": "failed", "error": "!"})
+            return handle(request)
+
+        async def run() -> dict[str, Any]:
+            transport = httpx.MockTransport(fail_summary_once)
+            async with httpx.AsyncClient(transport=transport) as client:
+                with pytest.raises(SummaryFailedError):
+                    await pipeline.arun(client)
+                nb_info_requests = len(services.info_requests)
+                paper_info = await pipeline.arun(client)
+                assert len(services.info_requests) == nb_info_requests
+                return paper_info
+
+        paper_info = asyncio.run(run())
+        assert paper_info["Summary"] == "Sum"
+        assert len(services.submitted_jobs) == 2  # noqa: PLR2004
+
+    def test_arun_optional_stages_failure(
+        self, pipeline: PaperRetrieverPipeline, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Test that a failed ranking and a failed speculation do not fail the run."""
+        services = FakeServices()
+        pipeline.speculative_top_n = 2
+
+        async def fail_speculation(*_: object) -> None:
+            msg = "Speculation failed."
+            raise RuntimeError(msg)
+
+        monkeypatch.setattr(PaperRetrieverPipeline, "aspeculate_summaries", fail_speculation)
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/selection/ranker":
+                return httpx.Response(500, json={"detail": "Ranker failed."})
+            return services.handle(request)
+
+        async def run() -> DAGRun:
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handle)) as client:
+                return await pipeline.arun_stages(client)
+
+        dag_run = asyncio.run(run())
+        assert dag_run.results["ranked_papers"] is None
+        assert dag_run.results["speculative_summaries"] is None
+        assert dag_run.results["summary"] == "Sum"
+
+    @pytest.mark.parametrize(
+        ("failed_path", "nb_submitted_jobs"),
+        [
+            ("/paper/trending_papers", 0),
+            ("/selection/best", 0),
+            ("/paper/", 0),
+            ("/jobs", 0),
+            ("/jobs/1", 1),
+        ],
+    )
+    def test_arun_service_error(
+        self, pipeline: PaperRetrieverPipeline, failed_path: str, nb_submitted_jobs: int
+    ) -> None:
+        """Test that an error status of a service fails the stage calling it."""
+        services = FakeServices()
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            if request.url.path == failed_path:
+                return httpx.Response(500, json={"detail": "Service failed."})
+            return services.handle(request)
+
+        async def run() -> None:
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handle)) as client:
+                await pipeline.arun(client)
+
+        with pytest.raises(httpx.HTTPStatusError) as exc_info:
+            asyncio.run(run())
+        assert exc_info.value.request.url.path == failed_path
+        assert len(services.submitted_jobs) == nb_submitted_jobs
@@ -0,0 +1,34 @@
+"""Test the offline benchmark harness."""
+import requests
+
+from benchmarks.bench_offline import BENCHMARKS, BenchmarkContext, run_suite
+from benchmarks.fake_llm import DeterministicFakeLLM
+from benchmarks.stub_server import serve_recorded_site
+from scrapper.papers_with_code_scrapper import PapersWithCodePaperScrapper
+
+
+def test_fake_llm_is_deterministic() -> None:
+    """Test that the fake model gives the same completion to the same prompt."""
+    llm = DeterministicFakeLLM(completion_tokens=13)
+    prompt = [{"role": "user", "content": "one two three four five"}]
+    assert llm.predict(prompt) == llm.predict(prompt)
+    assert llm.count_tokens(llm.predict(prompt)) <= 13  # noqa: PLR2004
+
+
+def test_stub_server_replays_paper_pages() -> None:
+    """Test that any paper page is served with its pdf link pointing to the stub server."""
+    with serve_recorded_site() as site_url:
+        scrapper = PapersWithCodePaperScrapper(paper_url_path="paper/any-paper", url=site_url)
+        paper_info = scrapper.get_all_paper_info()
+        assert paper_info["pdf_url"].startswith(f"{site_url}pdf/")
+        response = requests.get(paper_info["pdf_url"], timeout=10)
+        assert response.content.startswith(b"%PDF")
+
+
+def test_run_suite() -> None:
+    """Test that every benchmark runs at a small scale."""
+    with serve_recorded_site() as site_url:
+        context = BenchmarkContext(site_url, DeterministicFakeLLM())
+        results = list(run_suite(context, list(BENCHMARKS), [5], [1], nb_runs=1))
+    assert [result["benchmark"] for result in results] == list(BENCHMARKS)
+    assert all(result["p50_seconds"] > 0 for result in results)
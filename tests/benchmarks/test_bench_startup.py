@@ -0,0 +1,11 @@
+"""Test the cold start benchmark of the summarizer."""
+from benchmarks.bench_startup import DEFERRED_MODULES, PHASES, run_cold_starts
+
+
+def test_run_cold_starts() -> None:
+    """Test that a new process is measured and the api does not import the slow modules."""
+    (measure,) = run_cold_starts(nb_runs=1, warmup=False)
+    assert all(measure[phase] > 0 for phase in PHASES)
+    assert measure["process_seconds"] > measure["import_seconds"]
+    assert "pypdf" in DEFERRED_MODULES
+    assert measure["imported_modules"] == []
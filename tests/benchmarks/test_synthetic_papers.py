@@ -0,0 +1,33 @@
+"""Test the synthetic papers generator and the paperchooser load test."""
+import datetime
+
+from benchmarks.load_paperchooser import load_test
+from benchmarks.synthetic_papers import SCORED_KEYS, generate_papers
+from paperchooser.managers import ManagerFactory
+
+NOW = datetime.datetime(2024, 1, 10, tzinfo=datetime.timezone.utc)
+
+
+def test_generate_papers() -> None:
+    """Test that the papers are generated by batches, reproducibly and with missing keys."""
+    batches = list(generate_papers(2500, seed=1, missing_rate=0.1, batch_size=1000, now=NOW))
+    assert [len(batch) for batch in batches] == [1000, 1000, 500]
+    assert batches == list(
+        generate_papers(2500, seed=1, missing_rate=0.1, batch_size=1000, now=NOW)
+    )
+    papers = [paper for batch in batches for paper in batch]
+    nb_missing = sum(not all(key in paper for key in SCORED_KEYS) for paper in papers)
+    assert 150 < nb_missing < 350  # noqa: PLR2004
+    assert all(
+        paper["Publication date"] < "2024-01-10" for paper in papers if "Publication date" in paper
+    )
+
+
+def test_load_test_manager() -> None:
+    """Test that the managers rank the synthetic papers."""
+    manager = ManagerFactory.create_class(
+        {"evaluator": {"class": "SimpleEvaluator"}, "manager": {"class": "SimpleManager"}}
+    )
+    result = load_test(manager.rank_papers, nb_papers=300, request_size=100, seed=0)
+    assert result["nb_requests"] == 3  # noqa: PLR2004
+    assert result["p99_seconds"] >= result["p50_seconds"]
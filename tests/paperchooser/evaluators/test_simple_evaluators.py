@@ -156,6 +156,23 @@ class TestSimpleEvaluator:
         expected = np.array([2.0, 4.0, 6.0])
         assert (custom_simple_evaluator.evaluate_batch(paper_infos) == expected).all()
 
+    def test_evaluate_batch_missing_attributes(
+        self,
+        bad_paper_infos: list[dict[str, Any]],
+        default_simple_evaluator: SimpleEvaluator,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        """Test that a paper missing attributes keeps its place with the lowest score."""
+        monkeypatch.setattr(
+            SimpleEvaluator,
+            "_days_since",
+            lambda x, y: 2.0,
+        )
+        scores = default_simple_evaluator.evaluate_batch(bad_paper_infos)
+        assert len(scores) == len(bad_paper_infos)
+        assert scores[0] == -np.inf
+        assert np.argmax(scores) != 0
+
     @freeze_time("2021-01-04")
     def test_days_since(self) -> None:
         """Test days counter."""
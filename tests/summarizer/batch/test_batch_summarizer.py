@@ -0,0 +1,84 @@
+"""Test the summarization of a batch of papers."""
+from pathlib import Path
+
+from pydantic import Field
+
+from benchmarks.fake_llm import DeterministicFakeLLM
+from summarizer.batch import BatchItemResult, BatchSummarizer
+from summarizer.batch.cli import load_config, read_items
+from summarizer.chains import BaseChain, MapReduceChain
+from summarizer.prompts import MapReduceNormal
+from summarizer.usage import record_llm_call
+
+SAMPLE_PDF_PATH = "tests/summarizer/fixtures/sample_paper.pdf"
+
+
+class FakeChain(BaseChain):
+    """Chain recording the summarized pdfs, failing on the pdfs named broken."""
+
+    summarized: list[str] = Field(default_factory=list)
+
+    def run_chain(self, pdf_url: str) -> str:
+        """Return a fake summary using 10 tokens."""
+        self.summarized.append(pdf_url)
+        if "broken" in pdf_url:
+            msg = "Unreadable pdf."
+            raise ValueError(msg)
+        record_llm_call("fake", 8, 2)
+        return f"Summary of {pdf_url}"
+
+
+def test_run_batch(tmp_path: Path) -> None:
+    """Test that the results are written as jsonl with the throughput of the batch."""
+    output_path = tmp_path / "summaries.jsonl"
+    batch = BatchSummarizer(chain=FakeChain(), output_path=output_path, max_concurrency=2)
+    report = batch.run(["a.pdf", "b.pdf", "broken.pdf", "a.pdf"])
+    assert (report.nb_done, report.nb_failed, report.nb_skipped) == (2, 1, 0)
+    assert report.total_tokens == 20  # noqa: PLR2004
+    assert report.papers_per_minute > 0
+    assert report.tokens_per_second > 0
+    lines = output_path.read_text(encoding="utf-8").splitlines()
+    results = {r.item: r for r in map(BatchItemResult.model_validate_json, lines)}
+    assert results["a.pdf"].summary == "Summary of a.pdf"
+    assert results["broken.pdf"].error == "ValueError: Unreadable pdf."
+
+
+def test_resume_batch(tmp_path: Path) -> None:
+    """Test that a batch run again only summarizes the papers not done."""
+    output_path = tmp_path / "summaries.jsonl"
+    BatchSummarizer(chain=FakeChain(), output_path=output_path).run(["a.pdf", "broken.pdf"])
+    with output_path.open("a", encoding="utf-8") as output:
+        output.write('{"item": "b.pdf", "sta')
+    chain = FakeChain()
+    report = BatchSummarizer(chain=chain, output_path=output_path).run(
+        ["a.pdf", "b.pdf", "broken.pdf"]
+    )
+    assert sorted(chain.summarized) == ["b.pdf", "broken.pdf"]
+    assert (report.nb_done, report.nb_failed, report.nb_skipped) == (1, 1, 1)
+
+
+def test_read_items(tmp_path: Path) -> None:
+    """Test that the pdfs are read from a list file or from a directory."""
+    list_path = tmp_path / "papers.txt"
+    list_path.write_text("# Backfill\nhttps://arxiv.org/pdf/1.pdf\n\n local.pdf \n")
+    assert read_items(list_path) == ["https://arxiv.org/pdf/1.pdf", "local.pdf"]
+    (tmp_path / "b.pdf").touch()
+    (tmp_path / "a.pdf").touch()
+    assert read_items(tmp_path) == [str(tmp_path / "a.pdf"), str(tmp_path / "b.pdf")]
+
+
+def test_load_config_rate_limit(tmp_path: Path) -> None:
+    """Test that the rate limit of the batch overrides the configured one."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("rate-limit:\n  requests_per_minute: 500\n  tokens_per_minute: 1000\n")
+    config = load_config(config_path, tokens_per_minute=10)
+    assert config["rate-limit"] == {"requests_per_minute": 500, "tokens_per_minute": 10}
+
+
+def test_run_batch_with_map_reduce(tmp_path: Path) -> None:
+    """Test that a local pdf is summarized by the map reduce chain."""
+    chain = MapReduceChain(model=DeterministicFakeLLM(), prompt=MapReduceNormal())
+    batch = BatchSummarizer(chain=chain, output_path=tmp_path / "summaries.jsonl")
+    report = batch.run([SAMPLE_PDF_PATH])
+    assert report.nb_done == 1
+    assert report.total_tokens > 0
@@ -0,0 +1,504 @@
+"""Test the MapReduceChain class."""
+# ruff: noqa : SLF001
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any, ClassVar, Optional
+
+import pytest
+from langchain.schema.document import Document
+from pydantic import Field, PrivateAttr
+
+from summarizer.chains import (
+    ChainStage,
+    CombineDepthExceededError,
+    EmptyDocumentError,
+    MapReduceChain,
+    UnknownStyleError,
+)
+from summarizer.chains.progress import ProgressListener, SummaryEvent
+from summarizer.checkpoints import SQLiteChunkCheckpointStore
+from summarizer.chunkers import TokenChunker
+from summarizer.extraction import SQLiteTextStore
+from summarizer.loaders import StreamingPDFLoader
+from summarizer.models.base_model import BaseLLM
+from summarizer.preprocessors import TextPreprocessor
+from summarizer.prompts import MapReduceChild, MapReduceNormal
+from summarizer.usage import TokenBudgetExceededError, check_token_budget, record_llm_call
+
+SAMPLE_PDF_PATH = "tests/summarizer/fixtures/sample_paper.pdf"
+
+
+class FakeLLM(BaseLLM):
+    """Fake model counting one token per word and echoing the end of the prompt."""
+
+    max_token: ClassVar[int] = 40
+    name: ClassVar[str] = "Fake LLM"
+
+    def predict(self, prompt: list[dict[str, str]]) -> str:  # type: ignore[override]
+        """Return the last words of the user message."""
+        return " ".join(prompt[-1]["content"].split()[-3:])
+
+    def random_predict(self, prompt: list[dict[str, str]]) -> str:  # type: ignore[override]
+        """Return the last words of the user message."""
+        return self.predict(prompt)
+
+    def count_tokens(self, prompt: str) -> int:
+        """Return the number of words in the prompt."""
+        return len(prompt.split())
+
+
+class OtherFakeLLM(FakeLLM):
+    """Fake model registered under another name."""
+
+    name: ClassVar[str] = "Other fake LLM"
+
+
+class RecordingFakeLLM(FakeLLM):
+    """Fake model recording the number of tokens of every prompt it receives."""
+
+    max_token: ClassVar[int] = 80
+    prompt_sizes: list[int] = Field(default_factory=list)
+
+    def predict(self, prompt: list[dict[str, str]]) -> str:  # type: ignore[override]
+        """Record the prompt size and return the last words of the user message."""
+        self.prompt_sizes.append(sum(self.count_tokens(msg["content"]) for msg in prompt))
+        return super().predict(prompt)
+
+
+class VerboseFakeLLM(RecordingFakeLLM):
+    """Fake model whose summaries are as long as what it summarizes."""
+
+    def predict(self, prompt: list[dict[str, str]]) -> str:  # type: ignore[override]
+        """Record the prompt size and return a long summary."""
+        super().predict(prompt)
+        return " ".join(["summary"] * 20)
+
+
+class CountingFakeLLM(FakeLLM):
+    """Fake model counting the calls of its tokenizer."""
+
+    nb_counts: int = 0
+
+    def count_tokens(self, prompt: str) -> int:
+        """Count the call and return the number of words in the prompt."""
+        self.nb_counts += 1
+        return super().count_tokens(prompt)
+
+
+class ConcurrencyFakeLLM(FakeLLM):
+    """Slow fake model recording its calls and how many of them ran at once."""
+
+    nb_calls: int = 0
+    nb_running: int = 0
+    max_running: int = 0
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def predict(self, prompt: list[dict[str, str]]) -> str:  # type: ignore[override]
+        """Record the call and return the last words of the user message after a delay."""
+        with self._lock:
+            self.nb_calls += 1
+            self.nb_running += 1
+            self.max_running = max(self.max_running, self.nb_running)
+        time.sleep(0.01)
+        with self._lock:
+            self.nb_running -= 1
+        return super().predict(prompt)
+
+
+class MeteredFakeLLM(FakeLLM):
+    """Fake model recording the tokens of its calls like the GPT models do."""
+
+    def predict(self, prompt: list[dict[str, str]]) -> str:  # type: ignore[override]
+        """Record the call usage and return the last words of the user message."""
+        prompt_tokens = sum(self.count_tokens(msg["content"]) for msg in prompt)
+        check_token_budget(prompt_tokens)
+        prediction = super().predict(prompt)
+        record_llm_call("fake", prompt_tokens, self.count_tokens(prediction), cost_usd=0.5)
+        return prediction
+
+
+class StreamingFakeLLM(FakeLLM):
+    """Fake model streaming its prediction word by word."""
+
+    def stream_predict(self, prompt: list[dict[str, str]]) -> Iterator[str]:  # type: ignore[override]
+        """Yield the words of the prediction."""
+        words = self.predict(prompt).split(" ")
+        yield from [words[0], *(f" {word}" for word in words[1:])]
+
+
+class FailingFakeLLM(MeteredFakeLLM):
+    """Fake model failing after a number of calls."""
+
+    max_calls: Optional[int] = None
+
+    _nb_calls: int = PrivateAttr(default=0)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def predict(self, prompt: list[dict[str, str]]) -> str:  # type: ignore[override]
+        """Fail once the calls are exhausted, else record the call and return the prediction."""
+        with self._lock:
+            self._nb_calls += 1
+            nb_calls = self._nb_calls
+        if self.max_calls is not None and nb_calls > self.max_calls:
+            msg = "Model unavailable."
+            raise RuntimeError(msg)
+        return super().predict(prompt)
+
+
+class GatedFakeLLM(FakeLLM):
+    """Fake model whose calls after the first wait until the gate is open."""
+
+    nb_calls: int = 0
+
+    _gate: threading.Event = PrivateAttr(default_factory=threading.Event)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def predict(self, prompt: list[dict[str, str]]) -> str:  # type: ignore[override]
+        """Count the call and return the last words of the user message once allowed."""
+        with self._lock:
+            self.nb_calls += 1
+            nb_calls = self.nb_calls
+        if nb_calls > 1:
+            self._gate.wait(timeout=10)
+        return super().predict(prompt)
+
+
+class TestMapReduceChain:
+    """This class tests the MapReduceChain class."""
+
+    @pytest.fixture()
+    def chain(self) -> MapReduceChain:
+        """Fixture a MapReduceChain with a fake model."""
+        return MapReduceChain(model=FakeLLM(), prompt=MapReduceNormal(), text_buffer=10)
+
+    def test_load_document_page_is_lazy(self, chain: MapReduceChain) -> None:
+        """Test that pages are yielded one at a time."""
+        pages = chain.load_document_page(SAMPLE_PDF_PATH)
+        assert isinstance(pages, Iterator)
+        assert next(pages).metadata["page"] == 0
+
+    def test_create_document_chunk_is_lazy(self, chain: MapReduceChain) -> None:
+        """Test that a chunk is yielded before the following pages are consumed."""
+        consumed: list[int] = []
+
+        def pages() -> Iterator[Document]:
+            for page_number in range(3):
+                consumed.append(page_number)
+                yield Document(page_content="word " * 20, metadata={"page": page_number})
+
+        chunks = chain.create_document_chunk(pages())
+        assert next(chunks).split() == ["word"] * 20
+        expected_consumed = [0, 1]
+        assert consumed == expected_consumed
+
+    def test_run_chain(self, chain: MapReduceChain) -> None:
+        """Test that the chain summarizes a local pdf."""
+        summary = chain.run_chain(SAMPLE_PDF_PATH)
+        assert isinstance(summary, str)
+        assert summary
+
+    def test_run_reduce_streaming_dispatches_early(self, chain: MapReduceChain) -> None:
+        """Test that a chunk is sent to the model before the next chunk is created."""
+        first_chunk_summarized = threading.Event()
+        original_reduce_chunk = chain._reduce_chunk
+
+        def reduce_chunk(chunk: str) -> str:
+            first_chunk_summarized.set()
+            return original_reduce_chunk(chunk)
+
+        def chunks() -> Iterator[str]:
+            yield "first chunk"
+            assert first_chunk_summarized.wait(timeout=5)
+            yield "second chunk"
+
+        object.__setattr__(chain, "_reduce_chunk", reduce_chunk)
+        predictions = chain.run_reduce_streaming(chunks())
+        assert predictions[0].endswith("first chunk")
+        assert predictions[1].endswith("second chunk")
+
+    def test_run_reduce_streaming_keeps_order(self, chain: MapReduceChain) -> None:
+        """Test that streaming returns the same predictions as the sequential mode."""
+        chunks = [f"chunk number {idx}" for idx in range(10)]
+        assert chain.run_reduce_streaming(iter(chunks)) == chain.run_reduce(chunks)
+
+    def test_run_map_tree_reduce(self) -> None:
+        """Test that too many summaries are combined by levels within the model budget."""
+        model = RecordingFakeLLM()
+        chain = MapReduceChain(model=model, prompt=MapReduceNormal(), text_buffer=10)
+        budget = model.max_token - chain.text_buffer
+        summaries = [" ".join(["summary"] * 10) for _ in range(12)]
+        assert chain._count_prompt_tokens(summaries, model, chain.prompt) > budget
+
+        chain.run_map(summaries)
+
+        expected_nb_calls = 7  # 6 groups of 2 summaries, then the final combine
+        assert len(model.prompt_sizes) == expected_nb_calls
+        assert max(model.prompt_sizes) <= budget
+
+    def test_run_map_depth_exceeded(self) -> None:
+        """Test that summaries still over the budget at the depth limit raise an error."""
+        model = VerboseFakeLLM()
+        chain = MapReduceChain(
+            model=model, prompt=MapReduceNormal(), text_buffer=10, max_combine_depth=2
+        )
+        summaries = [" ".join(["summary"] * 10) for _ in range(12)]
+        with pytest.raises(CombineDepthExceededError, match="after 2 combine levels"):
+            chain.run_map(summaries)
+        assert len(model.prompt_sizes) == 9  # noqa: PLR2004
+
+    def test_collapse_fits_style_prompt(self) -> None:
+        """Test that the summaries are collapsed until they fit the prompt of the style."""
+        model = RecordingFakeLLM()
+        chain = MapReduceChain(model=model, prompt=MapReduceNormal(), text_buffer=10)
+        budget = model.max_token - chain.text_buffer
+        summaries = [" ".join(["summary"] * 5) for _ in range(4)]
+        long_prompt = MapReduceChild()
+        assert chain._count_prompt_tokens(summaries, model, chain.prompt) <= budget
+        assert chain._count_prompt_tokens(summaries, model, long_prompt) > budget
+        assert chain._collapse_summaries(summaries, [chain.prompt]) == summaries
+        assert len(chain._collapse_summaries(summaries, [long_prompt])) < len(summaries)
+
+    def test_run_chain_empty_document(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test that a document without text is rejected without any model call."""
+        model = RecordingFakeLLM()
+        chain = MapReduceChain(model=model, prompt=MapReduceNormal(), text_buffer=10)
+        pages = [Document(page_content=" \n\n "), Document(page_content="")]
+        monkeypatch.setattr(StreamingPDFLoader, "lazy_load", lambda *_: iter(pages))
+        with pytest.raises(EmptyDocumentError, match="No text to summarize"):
+            chain.run_chain(SAMPLE_PDF_PATH)
+        assert model.prompt_sizes == []
+
+    def test_run_map_single_prompt_when_fitting(self) -> None:
+        """Test that summaries fitting the budget are combined in one call."""
+        model = RecordingFakeLLM()
+        chain = MapReduceChain(model=model, prompt=MapReduceNormal(), text_buffer=10)
+        chain.run_map(["short summary", "other summary"])
+        assert len(model.prompt_sizes) == 1
+
+    def test_run_chain_with_usage(self) -> None:
+        """Test that the usage of every chunk and of the combine is returned."""
+        chain = MapReduceChain(model=MeteredFakeLLM(), prompt=MapReduceNormal(), text_buffer=10)
+        result = chain.run_chain_with_usage(SAMPLE_PDF_PATH)
+        labels = [call.label for call in result.calls]
+        chunk_labels = [label for label in labels if label.startswith("chunk-")]
+        assert chunk_labels == [f"chunk-{index}" for index in range(len(chunk_labels))]
+        assert labels[-1] == "combine"
+        assert result.usage.nb_calls == len(result.calls)
+        assert result.usage.prompt_tokens == sum(call.prompt_tokens for call in result.calls)
+        assert result.usage.cost_usd == pytest.approx(0.5 * len(result.calls))
+        assert result.summary == chain.run_chain(SAMPLE_PDF_PATH)
+
+    def test_run_chain_with_preprocessor(self) -> None:
+        """Test that the pages are cleaned before they are chunked and the saving reported."""
+        chain = MapReduceChain(
+            model=MeteredFakeLLM(),
+            prompt=MapReduceNormal(),
+            text_buffer=10,
+            preprocessor=TextPreprocessor(),
+        )
+        pages = [
+            Document(page_content="Paper\nMethod.\n\nReferences\n[1] A paper.", metadata={}),
+            Document(page_content="Paper\n[2] Another paper.", metadata={}),
+        ]
+        assert list(chain.create_document_chunk(pages)) == ["Paper\nMethod."]
+        result = chain.run_chain_with_usage(SAMPLE_PDF_PATH)
+        assert result.usage.saved_tokens == 0
+
+    def test_run_chain_with_usage_budget(self) -> None:
+        """Test that a document exceeding the token budget is aborted."""
+        chain = MapReduceChain(
+            model=MeteredFakeLLM(), prompt=MapReduceNormal(), text_buffer=10, token_budget=50
+        )
+        with pytest.raises(TokenBudgetExceededError):
+            chain.run_chain_with_usage(SAMPLE_PDF_PATH)
+
+    def test_run_chain_with_text_store(
+        self, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+    ) -> None:
+        """Test that a stored document is not loaded again, nor are its pages tokenized."""
+        store = SQLiteTextStore(db_path=tmp_path / "texts.sqlite")
+        model = CountingFakeLLM()
+        chain = MapReduceChain(
+            model=model,
+            prompt=MapReduceNormal(),
+            text_buffer=10,
+            preprocessor=TextPreprocessor(normalize_whitespace=True),
+        )
+        expected_chunks = list(
+            chain.create_document_chunk(chain.load_document_page(SAMPLE_PDF_PATH))
+        )
+        expected_summary = chain.run_chain(SAMPLE_PDF_PATH)
+
+        chain.text_store = store
+        model.nb_counts = 0
+        assert list(chain.create_stored_document_chunk(SAMPLE_PDF_PATH, store)) == expected_chunks
+        nb_counts = model.nb_counts
+        document = store.get(SAMPLE_PDF_PATH)
+        page_counts = store.get_token_counts(document.content_hash, model.token_encoding)
+        assert page_counts == [model.count_tokens(page) for page in document.pages]
+        assert chain.run_chain(SAMPLE_PDF_PATH) == expected_summary
+
+        def fail_loading(*_: object) -> None:
+            raise AssertionError
+
+        monkeypatch.setattr(StreamingPDFLoader, "lazy_load", fail_loading)
+        model.nb_counts = 0
+        assert list(chain.create_stored_document_chunk(SAMPLE_PDF_PATH, store)) == expected_chunks
+        assert model.nb_counts == nb_counts - len(document.pages)
+
+    def test_run_chain_styles_shares_map_phase(self) -> None:
+        """Test that every extra style costs a single combine call."""
+        chain = MapReduceChain(
+            model=MeteredFakeLLM(),
+            prompt=MapReduceNormal(),
+            text_buffer=10,
+            styles={"normal": MapReduceNormal(), "child": MapReduceChild()},
+        )
+        single = chain.run_chain_with_usage(SAMPLE_PDF_PATH)
+        result = chain.run_chain_with_usage(SAMPLE_PDF_PATH, styles=["child", "normal"])
+        assert list(result.summaries) == ["child", "normal"]
+        assert result.summary == result.summaries["child"]
+        assert result.summaries["normal"] == single.summary
+        assert result.usage.nb_calls == single.usage.nb_calls + 1
+        labels = sorted(call.label for call in result.calls if call.label.startswith("combine"))
+        assert labels == ["combine-child", "combine-normal"]
+
+    def test_run_chain_unknown_style(self, chain: MapReduceChain) -> None:
+        """Test that a style missing from the chain is rejected before any model call."""
+        with pytest.raises(UnknownStyleError):
+            chain.run_chain_styles(SAMPLE_PDF_PATH, ["pirate"])
+
+    def test_run_chain_with_stage_models(self) -> None:
+        """Test that every stage calls its own model within its own concurrency."""
+        chunk_model = ConcurrencyFakeLLM()
+        combine_model = ConcurrencyFakeLLM()
+        chain = MapReduceChain(
+            model=FakeLLM(),
+            prompt=MapReduceNormal(),
+            text_buffer=10,
+            streaming=True,
+            stages={
+                "chunk": ChainStage(model=chunk_model, max_concurrency=2),
+                "combine": ChainStage(model=combine_model),
+            },
+        )
+        summaries = chain.run_reduce_streaming(f"chunk number {index}" for index in range(8))
+        assert summaries[3] == "chunk number 3"
+        assert chunk_model.nb_calls == 8  # noqa: PLR2004
+        assert chunk_model.max_running == 2  # noqa: PLR2004
+        chain.run_map(summaries)
+        assert combine_model.nb_calls == 1
+
+    def test_fingerprint(self) -> None:
+        """Test that the fingerprint changes with the prompt and the model of a stage."""
+        chain = MapReduceChain(model=FakeLLM(), prompt=MapReduceNormal())
+        fingerprint = chain.fingerprint()
+        assert (
+            MapReduceChain(model=FakeLLM(), prompt=MapReduceNormal()).fingerprint() == fingerprint
+        )
+        assert MapReduceChain(model=FakeLLM(), prompt=MapReduceChild()).fingerprint() != fingerprint
+        staged = MapReduceChain(
+            model=FakeLLM(),
+            prompt=MapReduceNormal(),
+            stages={"combine": ChainStage(model=OtherFakeLLM())},
+        )
+        assert staged.fingerprint() != fingerprint
+
+    def test_unknown_stage(self) -> None:
+        """Test that a stage which is not a stage of the chain is rejected."""
+        with pytest.raises(ValueError, match="Unknown stages"):
+            MapReduceChain(model=FakeLLM(), prompt=MapReduceNormal(), stages={"map": ChainStage()})
+
+    def test_stream_chain_with_usage(self) -> None:
+        """Test that the progress is streamed, then the tokens of the summary and its result."""
+        chain = MapReduceChain(model=StreamingFakeLLM(), prompt=MapReduceNormal(), text_buffer=10)
+        events = list(chain.stream_chain_with_usage(SAMPLE_PDF_PATH))
+        kinds = [event.event for event in events]
+        pages = [event.data["nb_pages"] for event in events if event.event == "page"]
+        assert pages == list(range(1, len(pages) + 1))
+        nb_chunks = events[kinds.index("chunks")].data["nb_chunks"]
+        mapped = [event.data for event in events if event.event == "chunk_mapped"]
+        assert [data["nb_mapped"] for data in mapped] == list(range(1, nb_chunks + 1))
+        assert {data["nb_chunks"] for data in mapped} <= {None, nb_chunks}
+        assert kinds.index("combine") > kinds.index("chunks")
+        tokens = [event.data["text"] for event in events if event.event == "token"]
+        assert len(tokens) > 1
+        assert events[-1].event == "done"
+        assert events[-1].data["summary"] == "".join(tokens) == chain.run_chain(SAMPLE_PDF_PATH)
+
+    def test_stream_chain_with_usage_budget(self) -> None:
+        """Test that a summary exceeding its budget ends the stream with an error event."""
+        chain = MapReduceChain(model=MeteredFakeLLM(), prompt=MapReduceNormal(), text_buffer=10)
+        events = list(chain.stream_chain_with_usage(SAMPLE_PDF_PATH, token_budget=50))
+        assert events[-1].event == "error"
+        assert events[-1].data["status_code"] == 413  # noqa: PLR2004
+
+    def test_stream_chain_with_usage_cancel(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test that closing the events stops the summary at its next report."""
+        closed = threading.Event()
+        last_events: list[SummaryEvent] = []
+
+        def close(listener: ProgressListener, event: str, **data: Any) -> None:
+            last_events.append(SummaryEvent(event=event, data=data))
+            closed.set()
+
+        monkeypatch.setattr(ProgressListener, "close", close)
+        model = ConcurrencyFakeLLM()
+        chain = MapReduceChain(model=model, prompt=MapReduceNormal(), text_buffer=10)
+        events = chain.stream_chain_with_usage(SAMPLE_PDF_PATH)
+        assert next(events).event == "page"
+        events.close()
+        assert closed.wait(timeout=10)
+        assert last_events[0].data["status_code"] == 499  # noqa: PLR2004
+        nb_calls = model.nb_calls
+        chain.run_chain(SAMPLE_PDF_PATH)
+        assert nb_calls < model.nb_calls - nb_calls
+
+    def test_stream_chain_with_usage_cancel_stops_model_calls(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Test that the chunks not started when the summary is cancelled are not summarized."""
+        closed = threading.Event()
+        monkeypatch.setattr(ProgressListener, "close", lambda *_, **__: closed.set())
+        model = GatedFakeLLM()
+        chain = MapReduceChain(
+            model=model,
+            prompt=MapReduceNormal(),
+            text_buffer=10,
+            streaming=True,
+            max_concurrency=2,
+            chunker=TokenChunker(chunk_size=10),
+        )
+        events = chain.stream_chain_with_usage(SAMPLE_PDF_PATH)
+        # Every chunk is submitted, the first one is summarized and the next ones are waiting.
+        kinds = set()
+        while not {"chunks", "chunk_mapped"} <= kinds:
+            kinds.add(next(events).event)
+        events.close()
+        model._gate.set()
+        assert closed.wait(timeout=10)
+        nb_chunks = len(
+            list(chain.create_document_chunk(chain.load_document_page(SAMPLE_PDF_PATH)))
+        )
+        assert model.nb_calls <= 1 + chain.max_concurrency < nb_chunks
+
+    def test_run_chain_resumes_from_chunk_checkpoints(self, tmp_path: Path) -> None:
+        """Test that a summary retried after a failure only summarizes the remaining chunks."""
+        model = FailingFakeLLM(max_calls=2)
+        chain = MapReduceChain(
+            model=model,
+            prompt=MapReduceNormal(),
+            text_buffer=10,
+            chunk_checkpoints=SQLiteChunkCheckpointStore(db_path=tmp_path / "checkpoints.sqlite"),
+        )
+        expected = MapReduceChain(model=MeteredFakeLLM(), prompt=MapReduceNormal(), text_buffer=10)
+        expected_result = expected.run_chain_with_usage(SAMPLE_PDF_PATH)
+        with pytest.raises(RuntimeError, match="unavailable"):
+            chain.run_chain(SAMPLE_PDF_PATH)
+        model.max_calls = None
+        result = chain.run_chain_with_usage(SAMPLE_PDF_PATH)
+        assert result.summary == expected_result.summary
+        assert result.usage.nb_calls == expected_result.usage.nb_calls - 2
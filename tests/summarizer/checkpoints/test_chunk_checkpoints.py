@@ -0,0 +1,30 @@
+"""Test the store of the chunk summaries."""
+from pathlib import Path
+
+import pytest
+
+from summarizer.checkpoints import SQLiteChunkCheckpointStore, chunk_key
+
+
+@pytest.fixture()
+def store(tmp_path: Path) -> SQLiteChunkCheckpointStore:
+    """Return a store in a temporary directory."""
+    return SQLiteChunkCheckpointStore(db_path=tmp_path / "checkpoints.sqlite")
+
+
+def test_put_and_get(store: SQLiteChunkCheckpointStore) -> None:
+    """Test that a chunk summary is read back by its key."""
+    key = chunk_key("Fake LLM", [{"role": "user", "content": "chunk"}])
+    assert store.get(key) is None
+    store.put(key, "summary")
+    assert store.get(key) == "summary"
+
+
+def test_expired_summaries(store: SQLiteChunkCheckpointStore) -> None:
+    """Test that the summaries older than the max age are neither served nor kept."""
+    store.put("key", "summary")
+    store.max_age_seconds = 0
+    assert store.get("key") is None
+    assert store.prune() == 1
+    store.max_age_seconds = 3600
+    assert store.get("key") is None
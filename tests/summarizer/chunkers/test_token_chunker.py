@@ -0,0 +1,84 @@
+"""Test the TokenChunker class."""
+import pytest
+from langchain.schema.document import Document
+
+from summarizer.chunkers import TokenChunker
+
+
+def count_words(text: str) -> int:
+    """Count one token per word."""
+    return len(text.split())
+
+
+def make_pages(*contents: str) -> list[Document]:
+    """Create documents from page contents."""
+    return [Document(page_content=content) for content in contents]
+
+
+class TestTokenChunker:
+    """This class tests the TokenChunker class."""
+
+    def test_split_packs_pages(self) -> None:
+        """Test that small pages are packed together up to the budget."""
+        pages = make_pages("a b c", "d e f", "g h i")
+        chunks = list(TokenChunker().split(pages, count_words, max_tokens=6))
+        assert chunks == ["a b c\nd e f", "g h i"]
+
+    def test_split_no_empty_leading_chunk(self) -> None:
+        """Test that a first page bigger than the budget does not create an empty chunk."""
+        pages = make_pages("one two three four five six seven eight")
+        chunks = list(TokenChunker().split(pages, count_words, max_tokens=3))
+        assert all(chunks)
+        assert chunks == ["one two three", "four five six", "seven eight"]
+
+    def test_split_on_paragraphs(self) -> None:
+        """Test that a big page is cut on paragraph boundaries."""
+        pages = make_pages("a b c\n\nd e f\n\ng h")
+        chunks = list(TokenChunker().split(pages, count_words, max_tokens=5))
+        assert chunks == ["a b c", "d e f\ng h"]
+
+    def test_split_on_sentences(self) -> None:
+        """Test that a big paragraph is cut on sentence boundaries."""
+        pages = make_pages("First sentence here. Second one now. Third.")
+        chunks = list(TokenChunker().split(pages, count_words, max_tokens=4))
+        assert chunks == ["First sentence here.", "Second one now.\nThird."]
+
+    def test_chunk_size_smaller_than_model_budget(self) -> None:
+        """Test that the chunk size gives more chunks than the model context would."""
+        pages = make_pages(*["word " * 10] * 10)
+        chunks = list(TokenChunker(chunk_size=20).split(pages, count_words, max_tokens=1000))
+        expected_nb_chunks = 5
+        assert len(chunks) == expected_nb_chunks
+
+    def test_chunk_size_capped_by_model_budget(self) -> None:
+        """Test that the model context wins over a bigger chunk size."""
+        pages = make_pages(*["word " * 10] * 4)
+        chunks = list(TokenChunker(chunk_size=1000).split(pages, count_words, max_tokens=10))
+        expected_nb_chunks = 4
+        assert len(chunks) == expected_nb_chunks
+
+    def test_split_with_overlap(self) -> None:
+        """Test that the end of a chunk is repeated at the start of the next one."""
+        pages = make_pages("a b\n\nc d\n\ne f\n\ng h")
+        chunker = TokenChunker(chunk_size=4, chunk_overlap=2)
+        chunks = list(chunker.split(pages, count_words, max_tokens=100))
+        assert chunks == ["a b\nc d", "c d\ne f", "e f\ng h"]
+
+    def test_split_with_overlap_long_last_sentence(self) -> None:
+        """Test that the last words of a sentence longer than the overlap are repeated."""
+        pages = make_pages("One two three four five six. Seven eight nine ten eleven twelve.")
+        chunker = TokenChunker(chunk_size=9, chunk_overlap=3)
+        chunks = list(chunker.split(pages, count_words, max_tokens=100))
+        assert chunks == [
+            "One two three four five six.",
+            "four five six.\nSeven eight nine ten eleven twelve.",
+        ]
+
+    def test_split_empty_document(self) -> None:
+        """Test that an empty document gives no chunk."""
+        assert list(TokenChunker().split(make_pages("", " \n"), count_words, max_tokens=10)) == []
+
+    def test_invalid_overlap(self) -> None:
+        """Test that an overlap bigger than the chunk size raises."""
+        with pytest.raises(ValueError, match="Chunk overlap must be smaller than the chunk size"):
+            TokenChunker(chunk_size=10, chunk_overlap=10)
@@ -0,0 +1,165 @@
+"""Test the secret providers."""
+# ruff: noqa : SLF001
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Optional
+
+import pytest
+from pydantic import PrivateAttr
+
+from summarizer.credentials import (
+    CachedSecretProvider,
+    EnvSecretProvider,
+    FileSecretProvider,
+    SecretNotFoundError,
+    SecretProvider,
+    get_secret_provider,
+)
+
+
+class CountingSecretProvider(SecretProvider):
+    """Provider returning a new version of the secret at every read, once the gate is open."""
+
+    fail: bool = False
+
+    _gate: Optional[threading.Event] = PrivateAttr(default=None)
+    _nb_reads: int = PrivateAttr(default=0)
+
+    def get_secret(self, name: str) -> str:
+        """Return the name of the secret and the number of reads."""
+        if self._gate is not None:
+            self._gate.wait(timeout=10)
+        if self.fail:
+            raise SecretNotFoundError(name)
+        self._nb_reads += 1
+        return f"{name}-{self._nb_reads}"
+
+
+class ManualTimer(threading.Timer):
+    """Timer which runs only when fired by the test."""
+
+    def start(self) -> None:
+        """Do not start the thread of the timer."""
+
+    def fire(self) -> None:
+        """Run the function of the timer unless it was cancelled."""
+        if not self.finished.is_set():
+            self.function(*self.args)
+
+
+class FakeClockSecretProvider(CachedSecretProvider):
+    """Cached provider on a fake clock whose refreshes are run by the test."""
+
+    _time: float = PrivateAttr(default=0.0)
+
+    def _now(self) -> float:
+        """Return the fake time."""
+        return self._time
+
+    def _create_timer(self, delay_seconds: float, name: str) -> threading.Timer:
+        """Return a timer run by the test."""
+        return ManualTimer(delay_seconds, self._refresh, args=(name,))
+
+    def advance(self, seconds: float) -> None:
+        """Advance the fake time, running the refreshes which are due."""
+        self._time += seconds
+        for timer in list(self._timers.values()):
+            assert isinstance(timer, ManualTimer)
+            if timer.interval <= seconds:
+                timer.fire()
+
+
+@pytest.fixture()
+def cached_provider() -> Iterator[FakeClockSecretProvider]:
+    """Return a cached provider on a fake clock."""
+    provider = FakeClockSecretProvider(
+        provider=CountingSecretProvider(),
+        ttl_seconds=0.4,
+        refresh_margin_seconds=0.3,
+        retry_seconds=0.05,
+    )
+    yield provider
+    provider.close()
+
+
+def test_env_secret_provider(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the secrets are read from the environment variables."""
+    monkeypatch.setenv("SECRET_OPENAI_KEY", "key")
+    provider = EnvSecretProvider()
+    assert provider.get_secret("openai-key") == "key"
+    with pytest.raises(SecretNotFoundError):
+        provider.get_secret("missing")
+
+
+def test_file_secret_provider(tmp_path: Path) -> None:
+    """Test that the secrets are read from the files of the directory."""
+    (tmp_path / "openai").write_text("key\n", encoding="utf-8")
+    provider = FileSecretProvider(directory=tmp_path)
+    assert provider.get_secret("openai") == "key"
+    with pytest.raises(SecretNotFoundError):
+        provider.get_secret("missing")
+
+
+def test_cache_secrets(cached_provider: CachedSecretProvider) -> None:
+    """Test that a secret is read once while it is cached."""
+    assert [cached_provider.get_secret("openai") for _ in range(3)] == ["openai-1"] * 3
+    assert cached_provider.get_secret("other") == "other-2"
+
+
+def test_refresh_before_expiry(cached_provider: FakeClockSecretProvider) -> None:
+    """Test that a secret is refreshed in background before it expires."""
+    assert cached_provider.get_secret("openai") == "openai-1"
+    cached_provider.advance(0.2)
+    cached_provider.provider.fail = True
+    assert cached_provider.get_secret("openai") == "openai-2"
+
+
+def test_retry_failed_refresh(cached_provider: FakeClockSecretProvider) -> None:
+    """Test that the cached secret is kept when its refresh fails and the refresh retried."""
+    assert cached_provider.get_secret("openai") == "openai-1"
+    cached_provider.provider.fail = True
+    cached_provider.advance(0.2)
+    assert cached_provider.get_secret("openai") == "openai-1"
+    cached_provider.provider.fail = False
+    cached_provider.advance(0.1)
+    assert cached_provider.get_secret("openai") == "openai-2"
+
+
+def test_failed_read_is_not_cached(cached_provider: CachedSecretProvider) -> None:
+    """Test that a secret whose read failed is read again by the next caller."""
+    cached_provider.provider.fail = True
+    with pytest.raises(SecretNotFoundError):
+        cached_provider.get_secret("openai")
+    cached_provider.provider.fail = False
+    assert cached_provider.get_secret("openai") == "openai-1"
+
+
+def test_prefetch_does_not_block(cached_provider: FakeClockSecretProvider) -> None:
+    """Test that a prefetch returns at once and the readers wait for a single read."""
+    gate = threading.Event()
+    cached_provider.provider._gate = gate
+    cached_provider.prefetch("openai")
+    assert cached_provider.provider._nb_reads == 0
+    values = []
+    threads = [
+        threading.Thread(target=lambda: values.append(cached_provider.get_secret("openai")))
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert values == ["openai-1"] * 3
+
+
+def test_get_secret_provider(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    """Test that the provider is shared and the secrets directory replaces the keyvault."""
+    monkeypatch.setattr("summarizer.credentials.secret_provider._providers", {})
+    monkeypatch.setenv("SECRETS_DIR", str(tmp_path))
+    provider = get_secret_provider("https://vault")
+    assert isinstance(provider.provider, FileSecretProvider)
+    assert get_secret_provider("https://vault") is provider
+    monkeypatch.delenv("SECRETS_DIR")
+    assert isinstance(get_secret_provider().provider, EnvSecretProvider)
@@ -0,0 +1,51 @@
+"""Test the store of the extracted texts."""
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from summarizer.extraction import SQLiteTextStore
+
+
+@pytest.fixture()
+def store(tmp_path: Path) -> SQLiteTextStore:
+    """Return a store in a temporary directory."""
+    return SQLiteTextStore(db_path=tmp_path / "texts.sqlite")
+
+
+def test_put_and_get(store: SQLiteTextStore) -> None:
+    """Test that the pages of a pdf are read back by its url."""
+    assert store.get("https://paper.pdf") is None
+    document = store.put("https://paper.pdf", ["first page", "second page"])
+    stored = store.get("https://paper.pdf")
+    assert stored == document
+    assert stored.pages == ["first page", "second page"]
+
+
+def test_same_content_stored_once(store: SQLiteTextStore) -> None:
+    """Test that the urls of the same pdf share its text, compressed."""
+    pages = [" ".join(["word"] * 1000)]
+    first = store.put("https://arxiv/paper.pdf", pages)
+    second = store.put("https://mirror/paper.pdf", pages)
+    assert first.content_hash == second.content_hash
+    with sqlite3.connect(store.db_path) as connection:
+        rows = connection.execute("SELECT length(pages) FROM documents").fetchall()
+    assert len(rows) == 1
+    assert rows[0][0] < len(pages[0])
+
+
+def test_token_counts_per_encoding(store: SQLiteTextStore) -> None:
+    """Test that the token counts of the pages are kept per encoding."""
+    document = store.put("https://paper.pdf", ["a b", "c"])
+    assert store.get_token_counts(document.content_hash, "words") is None
+    store.save_token_counts(document.content_hash, "words", [2, 1])
+    store.save_token_counts(document.content_hash, "cl100k_base", [3, 1])
+    assert store.get_token_counts(document.content_hash, "words") == [2, 1]
+    assert store.get_token_counts(document.content_hash, "cl100k_base") == [3, 1]
+
+
+def test_token_counts_aligned_with_pages(store: SQLiteTextStore) -> None:
+    """Test that the token counts must match the stored pages."""
+    document = store.put("https://paper.pdf", ["a b", "c"])
+    with pytest.raises(ValueError, match="one token count per page"):
+        store.save_token_counts(document.content_hash, "words", [2])
@@ -0,0 +1,100 @@
+"""Test the JobQueue class."""
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from summarizer.jobs import Job, JobQueue, JobStatus, SQLiteJobStore
+from summarizer.usage import SummaryResult, TokenUsage
+
+PAPER_URL = "https://arxiv.org/pdf/1706.03762.pdf"
+
+
+def wait_for_job(queue: JobQueue, job_id: str, timeout: float = 5) -> Job:
+    """Wait until a job is done or failed."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        assert job is not None
+        if job.status in (JobStatus.DONE, JobStatus.FAILED):
+            return job
+        time.sleep(0.01)
+    msg = f"Job {job_id} not finished after {timeout}s"
+    raise TimeoutError(msg)
+
+
+class TestJobQueue:
+    """This class tests the JobQueue class."""
+
+    @pytest.fixture()
+    def store(self, tmp_path: Path) -> SQLiteJobStore:
+        """Fixture a store in a temporary directory."""
+        return SQLiteJobStore(db_path=tmp_path / "jobs.sqlite")
+
+    @pytest.fixture()
+    def calls(self) -> list[str]:
+        """Fixture the list of pdf urls given to the runner."""
+        return []
+
+    @pytest.fixture()
+    def queue(self, store: SQLiteJobStore, calls: list[str]) -> Iterator[JobQueue]:
+        """Fixture a started queue with a runner failing on urls containing fail."""
+
+        def runner(paper_url: str) -> SummaryResult:
+            calls.append(paper_url)
+            if "fail" in paper_url:
+                msg = "Cannot summarize"
+                raise ValueError(msg)
+            return SummaryResult(summary=f"summary of {paper_url}", usage=TokenUsage(nb_calls=1))
+
+        queue = JobQueue(store=store, runner=runner, nb_workers=2, poll_interval_seconds=0.05)
+        queue.start()
+        yield queue
+        queue.stop(timeout=5)
+
+    def test_submit_runs_job(self, queue: JobQueue) -> None:
+        """Test that a submitted job is run by a worker."""
+        job = wait_for_job(queue, queue.submit(PAPER_URL).job_id)
+        assert job.status == JobStatus.DONE
+        assert job.summary == f"summary of {PAPER_URL}"
+        assert job.usage == TokenUsage(nb_calls=1)
+
+    def test_failed_job(self, queue: JobQueue) -> None:
+        """Test that a runner error marks the job as failed."""
+        job = wait_for_job(queue, queue.submit("https://arxiv.org/pdf/fail.pdf").job_id)
+        assert job.status == JobStatus.FAILED
+        assert job.error == "Cannot summarize"
+
+    def test_duplicates_run_once(self, queue: JobQueue, calls: list[str]) -> None:
+        """Test that duplicate submissions are summarized once."""
+        job_ids = {queue.submit(PAPER_URL).job_id for _ in range(5)}
+        assert len(job_ids) == 1
+        wait_for_job(queue, job_ids.pop())
+        assert calls == [PAPER_URL]
+
+    def test_bounded_workers(self, store: SQLiteJobStore) -> None:
+        """Test that no more jobs than workers run at once."""
+        lock = threading.Lock()
+        running = [0]
+        max_running = [0]
+
+        def runner(paper_url: str) -> SummaryResult:
+            with lock:
+                running[0] += 1
+                max_running[0] = max(max_running[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return SummaryResult(summary=paper_url)
+
+        queue = JobQueue(store=store, runner=runner, nb_workers=2, poll_interval_seconds=0.05)
+        queue.start()
+        try:
+            jobs = [queue.submit(f"https://arxiv.org/pdf/{idx}.pdf") for idx in range(6)]
+            for job in jobs:
+                wait_for_job(queue, job.job_id)
+        finally:
+            queue.stop(timeout=5)
+        assert max_running[0] <= queue.nb_workers
@@ -0,0 +1,113 @@
+"""Test the SQLiteJobStore class."""
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from summarizer.jobs import JobStatus, SQLiteJobStore
+from summarizer.usage import TokenUsage
+
+PAPER_URL = "https://arxiv.org/pdf/1706.03762.pdf"
+
+
+class TestSQLiteJobStore:
+    """This class tests the SQLiteJobStore class."""
+
+    @pytest.fixture()
+    def store(self, tmp_path: Path) -> SQLiteJobStore:
+        """Fixture a store in a temporary directory."""
+        return SQLiteJobStore(db_path=tmp_path / "jobs.sqlite")
+
+    def test_submit(self, store: SQLiteJobStore) -> None:
+        """Test that a submitted job is pending and persisted."""
+        job = store.submit(PAPER_URL)
+        assert job.status == JobStatus.PENDING
+        assert store.get(job.job_id) == job
+
+    def test_submit_coalesces_duplicates(self, store: SQLiteJobStore) -> None:
+        """Test that the same pdf submitted twice gives the same job."""
+        assert store.submit(PAPER_URL).job_id == store.submit(PAPER_URL).job_id
+
+    def test_submit_returns_done_job(self, store: SQLiteJobStore) -> None:
+        """Test that a done job is served as a cached summary."""
+        job = store.submit(PAPER_URL)
+        store.complete(job.job_id, "summary")
+        cached_job = store.submit(PAPER_URL)
+        assert cached_job.job_id == job.job_id
+        assert cached_job.status == JobStatus.DONE
+        assert cached_job.summary == "summary"
+
+    def test_submit_coalesces_same_fingerprint(self, store: SQLiteJobStore) -> None:
+        """Test that a job done by another chain is not served."""
+        job = store.submit(PAPER_URL)
+        store.complete(job.job_id, "summary")
+        other_store = store.model_copy(update={"fingerprint": "other chain"})
+        other_job = other_store.submit(PAPER_URL)
+        assert other_job.job_id != job.job_id
+        assert other_job.status == JobStatus.PENDING
+        assert store.submit(PAPER_URL).job_id == job.job_id
+
+    def test_submit_expires_done_job(self, store: SQLiteJobStore) -> None:
+        """Test that a done job older than its time to live is summarized again."""
+        store.done_ttl_seconds = 3600
+        job = store.submit(PAPER_URL)
+        store.complete(job.job_id, "summary")
+        assert store.submit(PAPER_URL).job_id == job.job_id
+        with sqlite3.connect(store.db_path) as connection:
+            connection.execute("UPDATE jobs SET updated_at = updated_at - 7200")
+        connection.close()
+        new_job = store.submit(PAPER_URL)
+        assert new_job.job_id != job.job_id
+        assert new_job.status == JobStatus.PENDING
+
+    def test_complete_stores_usage(self, store: SQLiteJobStore) -> None:
+        """Test that the token usage of a done job is persisted."""
+        usage = TokenUsage(nb_calls=3, prompt_tokens=1200, completion_tokens=300, cost_usd=0.01)
+        job = store.submit(PAPER_URL)
+        store.complete(job.job_id, "summary", usage)
+        stored_job = store.get(job.job_id)
+        assert stored_job is not None
+        assert stored_job.usage == usage
+
+    def test_submit_retries_failed_job(self, store: SQLiteJobStore) -> None:
+        """Test that a failed job is not coalesced."""
+        job = store.submit(PAPER_URL)
+        store.fail(job.job_id, "error")
+        new_job = store.submit(PAPER_URL)
+        assert new_job.job_id != job.job_id
+        assert new_job.status == JobStatus.PENDING
+
+    def test_find(self, store: SQLiteJobStore) -> None:
+        """Test that a job is found by pdf without submitting a new one."""
+        assert store.find(PAPER_URL) is None
+        assert store.claim_next() is None
+        job = store.submit(PAPER_URL)
+        assert store.find(PAPER_URL) == job
+        store.fail(job.job_id, "error")
+        assert store.find(PAPER_URL) is None
+
+    def test_claim_next(self, store: SQLiteJobStore) -> None:
+        """Test that jobs are claimed once, oldest first."""
+        first_job = store.submit(PAPER_URL)
+        second_job = store.submit("https://arxiv.org/pdf/other.pdf")
+        claimed_job = store.claim_next()
+        assert claimed_job is not None
+        assert claimed_job.job_id == first_job.job_id
+        assert claimed_job.status == JobStatus.RUNNING
+        next_job = store.claim_next()
+        assert next_job is not None
+        assert next_job.job_id == second_job.job_id
+        assert store.claim_next() is None
+
+    def test_requeue_running(self, store: SQLiteJobStore) -> None:
+        """Test that jobs interrupted while running are pending again."""
+        job = store.submit(PAPER_URL)
+        store.claim_next()
+        assert store.requeue_running() == 1
+        requeued_job = store.get(job.job_id)
+        assert requeued_job is not None
+        assert requeued_job.status == JobStatus.PENDING
+
+    def test_get_unknown_job(self, store: SQLiteJobStore) -> None:
+        """Test that an unknown job id returns None."""
+        assert store.get("unknown") is None
@@ -0,0 +1 @@
+"""Test suites for summarizer document loaders."""
@@ -0,0 +1,139 @@
+"""Test the StreamingPDFLoader class."""
+import io
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import pytest
+import requests
+from pypdf import PdfReader, PdfWriter
+
+from summarizer.loaders import DocumentDownloadError, DocumentTooLargeError, StreamingPDFLoader
+from summarizer.loaders.pdf_loader import extract_page_texts
+
+SAMPLE_PDF_PATH = Path("tests/summarizer/fixtures/sample_paper.pdf")
+SAMPLE_PDF_URL = "https://arxiv.org/pdf/sample_paper.pdf"
+
+
+class MockStreamResponse:
+    """Mock a streamed requests response."""
+
+    def __init__(self, content: bytes, status_code: int = 200, send_length: bool = True):
+        """Initialize."""
+        self.content = content
+        self.status_code = status_code
+        self.headers = {"Content-Length": str(len(content))} if send_length else {}
+
+    def __enter__(self) -> "MockStreamResponse":
+        """Enter the context."""
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        """Exit the context."""
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        """Yield the content by blocks."""
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start : start + chunk_size]
+
+
+class TestStreamingPDFLoader:
+    """This class tests the StreamingPDFLoader class."""
+
+    @pytest.fixture()
+    def pdf_bytes(self) -> bytes:
+        """Fixture the bytes of the sample pdf."""
+        return SAMPLE_PDF_PATH.read_bytes()
+
+    def test_lazy_load_local_file(self) -> None:
+        """Test that a local pdf is loaded page by page."""
+        pages = StreamingPDFLoader().lazy_load(str(SAMPLE_PDF_PATH))
+        assert isinstance(pages, Iterator)
+        first_page = next(pages)
+        assert first_page.page_content.startswith("Attention Is All You Need")
+        assert first_page.metadata == {"source": str(SAMPLE_PDF_PATH), "page": 0}
+        expected_remaining_pages = 2
+        assert len(list(pages)) == expected_remaining_pages
+
+    def test_lazy_load_url(self, pdf_bytes: bytes, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test that a remote pdf is streamed before being loaded."""
+        monkeypatch.setattr(requests, "get", lambda *args, **kwargs: MockStreamResponse(pdf_bytes))
+        loader = StreamingPDFLoader(download_block_size=128)
+        pages = list(loader.lazy_load(SAMPLE_PDF_URL))
+        expected_nb_pages = 3
+        assert len(pages) == expected_nb_pages
+        assert pages[-1].page_content.startswith("Conclusion")
+
+    def test_lazy_load_bad_status_code(
+        self, pdf_bytes: bytes, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Test that a bad status code raises."""
+        monkeypatch.setattr(
+            requests, "get", lambda *args, **kwargs: MockStreamResponse(pdf_bytes, 404)
+        )
+        with pytest.raises(DocumentDownloadError, match="returned status code 404"):
+            list(StreamingPDFLoader().lazy_load(SAMPLE_PDF_URL))
+
+    def test_lazy_load_too_large_content_length(
+        self, pdf_bytes: bytes, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Test that an announced size over the cap raises before downloading."""
+        monkeypatch.setattr(requests, "get", lambda *args, **kwargs: MockStreamResponse(pdf_bytes))
+        with pytest.raises(DocumentTooLargeError, match="is bigger than"):
+            list(StreamingPDFLoader(max_size_bytes=100).lazy_load(SAMPLE_PDF_URL))
+
+    def test_lazy_load_too_large_stream(
+        self, pdf_bytes: bytes, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Test that a stream going over the cap raises even without Content-Length."""
+        monkeypatch.setattr(
+            requests,
+            "get",
+            lambda *args, **kwargs: MockStreamResponse(pdf_bytes, send_length=False),
+        )
+        loader = StreamingPDFLoader(max_size_bytes=100, download_block_size=64)
+        with pytest.raises(DocumentTooLargeError, match="is bigger than"):
+            list(loader.lazy_load(SAMPLE_PDF_URL))
+
+    def test_lazy_load_local_file_too_large(self) -> None:
+        """Test that a local pdf over the cap raises."""
+        with pytest.raises(DocumentTooLargeError, match="is bigger than"):
+            list(StreamingPDFLoader(max_size_bytes=100).lazy_load(str(SAMPLE_PDF_PATH)))
+
+    def test_lazy_load_with_process_pool(self, tmp_path: Path) -> None:
+        """Test that the pages extracted by several processes are yielded in order."""
+        reader = PdfReader(SAMPLE_PDF_PATH)
+        writer = PdfWriter()
+        for _ in range(4):
+            for page in reader.pages:
+                writer.add_page(page)
+        pdf_path = tmp_path / "repeated.pdf"
+        with pdf_path.open("wb") as pdf_file:
+            writer.write(pdf_file)
+
+        in_thread = list(StreamingPDFLoader(nb_processes=0).lazy_load(str(pdf_path)))
+        loader = StreamingPDFLoader(nb_processes=2, pages_per_task=2)
+        in_pool = list(loader.lazy_load(str(pdf_path)))
+        assert [page.metadata["page"] for page in in_pool] == list(range(12))
+        assert [page.page_content for page in in_pool] == [page.page_content for page in in_thread]
+
+    def test_lazy_load_with_process_pool_closed_early(self) -> None:
+        """Test that the extraction stops when the pages are no longer consumed."""
+        pages = StreamingPDFLoader(nb_processes=1, pages_per_task=1).lazy_load(str(SAMPLE_PDF_PATH))
+        assert next(pages).page_content.startswith("Attention Is All You Need")
+        pages.close()
+
+    def test_reader_is_given_a_stream(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test that the readers read the open file rather than loading the whole pdf."""
+        streams: list[Any] = []
+
+        def recording_reader(stream: Any) -> PdfReader:
+            streams.append(stream)
+            return PdfReader(stream)
+
+        monkeypatch.setattr("pypdf.PdfReader", recording_reader)
+        pages = list(StreamingPDFLoader(nb_processes=0).lazy_load(str(SAMPLE_PDF_PATH)))
+        assert extract_page_texts(SAMPLE_PDF_PATH, 0, 1) == [pages[0].page_content]
+        assert len(streams) == 2  # noqa: PLR2004
+        assert all(isinstance(stream, io.BufferedReader) for stream in streams)
+        assert all(stream.closed for stream in streams)
@@ -0,0 +1,104 @@
+"""Test the gpt models against a local fake of the api."""
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+import pytest
+
+from benchmarks.fake_openai import COMPLETION, serve_fake_openai
+from summarizer.models import GPT35Turbo16
+from summarizer.models.rate_limit import get_scheduler
+from summarizer.usage import track_usage
+from telemetry import REGISTRY
+
+PROMPT = [{"role": "user", "content": "Summarize this paper about sparse attention."}]
+
+
+@pytest.fixture(autouse=True)
+def _fake_api(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Use a new scheduler, a fake api key and count the tokens as words."""
+    REGISTRY.reset()
+    monkeypatch.setattr("summarizer.models.rate_limit._schedulers", {})
+    monkeypatch.setattr(openai, "api_key", "fake-key")
+    monkeypatch.setattr(GPT35Turbo16, "count_tokens", lambda _, prompt: len(prompt.split()))
+    scheduler = get_scheduler(GPT35Turbo16.model_api_name)
+    scheduler.period_seconds = 0.5
+    scheduler.min_backoff_seconds = 0.01
+
+
+def summarize_concurrently(nb_calls: int) -> list[str]:
+    """Run calls to the model from several threads."""
+    model = GPT35Turbo16()
+    with ThreadPoolExecutor(max_workers=nb_calls) as executor:
+        return list(executor.map(lambda _: model.predict(PROMPT), range(nb_calls)))
+
+
+def test_retry_rate_limited_calls(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the calls rejected by an unknown rate limit are retried until they succeed."""
+    with serve_fake_openai(requests_per_minute=3, period_seconds=0.5) as (api_base, state):
+        monkeypatch.setattr(openai, "api_base", api_base)
+        assert summarize_concurrently(6) == [COMPLETION] * 6
+    assert state.nb_completions == 6  # noqa: PLR2004
+    assert state.nb_rate_limited > 0
+    assert REGISTRY.get_counter("llm_retries_total", error="RateLimitError") > 0
+
+
+def test_stay_under_configured_limits(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that no call is rejected once the scheduler knows the limits of the api."""
+    # A little under the api limit, the requests reach the api later than they are granted.
+    get_scheduler(GPT35Turbo16.model_api_name).configure(requests_per_minute=3)
+    with serve_fake_openai(requests_per_minute=4, period_seconds=0.5) as (api_base, state):
+        monkeypatch.setattr(openai, "api_base", api_base)
+        assert summarize_concurrently(6) == [COMPLETION] * 6
+    assert state.nb_rate_limited == 0
+
+
+def test_retry_server_errors(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the server errors are retried and the usage of the call recorded once."""
+    with serve_fake_openai(server_errors=[500, 503]) as (api_base, state):
+        monkeypatch.setattr(openai, "api_base", api_base)
+        with track_usage() as tracker:
+            assert GPT35Turbo16().predict(PROMPT) == COMPLETION
+    assert state.nb_requests == 3  # noqa: PLR2004
+    assert tracker.usage().nb_calls == 1
+
+
+def test_no_retry_on_client_errors(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the client errors are raised without retry."""
+    with serve_fake_openai(server_errors=[400]) as (api_base, state):
+        monkeypatch.setattr(openai, "api_base", api_base)
+        with pytest.raises(openai.error.InvalidRequestError):
+            GPT35Turbo16().predict(PROMPT)
+    assert state.nb_requests == 1
+
+
+def test_api_key_from_secret_provider(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the api key is read from the secret provider rather than the openai module."""
+    monkeypatch.setattr("summarizer.credentials.secret_provider._providers", {})
+    monkeypatch.setenv("SECRET_OPENAI", "secret-key")
+    model = GPT35Turbo16(secret_name="openai")  # noqa: S106
+    with serve_fake_openai() as (api_base, state):
+        monkeypatch.setattr(openai, "api_base", api_base)
+        assert model.predict(PROMPT) == COMPLETION
+    assert state.api_keys == {"secret-key"}
+
+
+def test_api_key_given(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the api key given to the model is used."""
+    model = GPT35Turbo16(api_key="given-key")
+    with serve_fake_openai() as (api_base, state):
+        monkeypatch.setattr(openai, "api_base", api_base)
+        assert model.predict(PROMPT) == COMPLETION
+    assert state.api_keys == {"given-key"}
+
+
+def test_stream_predict(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a streamed completion is yielded word by word and its usage recorded."""
+    with serve_fake_openai() as (api_base, _):
+        monkeypatch.setattr(openai, "api_base", api_base)
+        with track_usage() as tracker:
+            tokens = list(GPT35Turbo16().stream_predict(PROMPT))
+    assert len(tokens) == len(COMPLETION.split())
+    assert "".join(tokens) == COMPLETION
+    usage = tracker.usage()
+    assert usage.nb_calls == 1
+    assert usage.completion_tokens == len(COMPLETION.split())
@@ -0,0 +1,152 @@
+"""Test the scheduler of the model calls."""
+# ruff: noqa : SLF001
+import threading
+import time
+from typing import Optional
+
+import pytest
+from pydantic import PrivateAttr
+
+from summarizer.models.rate_limit import RateLimitScheduler
+from telemetry import REGISTRY, trace
+
+
+@pytest.fixture(autouse=True)
+def _reset_registry() -> None:
+    """Reset the metrics between tests."""
+    REGISTRY.reset()
+
+
+class FakeClockScheduler(RateLimitScheduler):
+    """Scheduler of a single thread on a fake clock, waiting advances the clock."""
+
+    _time: float = PrivateAttr(default=0.0)
+    _waits: list[float] = PrivateAttr(default_factory=list)
+
+    def _now(self) -> float:
+        """Return the fake time."""
+        return self._time
+
+    def _sleep(self, seconds: float) -> None:
+        """Return at once, the sleep of another thread is not waited for."""
+
+    def _wait(self, seconds: Optional[float]) -> None:
+        """Record the wait and advance the fake time."""
+        assert seconds is not None
+        self._waits.append(seconds)
+        self._time += seconds
+
+
+def test_requests_per_minute() -> None:
+    """Test that the calls beyond the burst wait for the refill of the bucket."""
+    scheduler = FakeClockScheduler(requests_per_minute=5, period_seconds=0.5)
+    for _ in range(10):
+        scheduler.acquire(1)
+    assert sum(scheduler._waits) == pytest.approx(0.5)
+
+
+def test_tokens_per_minute() -> None:
+    """Test that a call waits for its estimated tokens, a call bigger than the limit runs."""
+    scheduler = FakeClockScheduler(tokens_per_minute=100, period_seconds=0.5)
+    scheduler.acquire(80)
+    scheduler.acquire(1000)
+    assert sum(scheduler._waits) == pytest.approx(0.4)
+
+
+def test_refund_unused_tokens() -> None:
+    """Test that the tokens estimated but not used are given back."""
+    scheduler = FakeClockScheduler(tokens_per_minute=100, period_seconds=10)
+    for _ in range(5):
+        scheduler.call(lambda: "summary", 50, retry_delay=lambda _: None, used_tokens=lambda _: 10)
+    assert scheduler._waits == []
+
+
+def test_refund_failed_call() -> None:
+    """Test that the tokens reserved by a call which is not retried are given back."""
+    scheduler = FakeClockScheduler(tokens_per_minute=100, period_seconds=10)
+
+    def failing() -> str:
+        raise ValueError
+
+    for _ in range(3):
+        with pytest.raises(ValueError):  # noqa: PT011
+            scheduler.call(failing, 80, retry_delay=lambda _: None)
+    assert scheduler._waits == []
+
+
+def test_configure_same_limits_keeps_buckets() -> None:
+    """Test that configuring the same limits again does not refill the buckets."""
+    scheduler = FakeClockScheduler(requests_per_minute=5, period_seconds=0.5)
+    for _ in range(5):
+        scheduler.acquire(1)
+    scheduler.configure(requests_per_minute=5)
+    scheduler.acquire(1)
+    assert sum(scheduler._waits) == pytest.approx(0.1)
+    scheduler.configure(requests_per_minute=10)
+    scheduler.acquire(1)
+    assert sum(scheduler._waits) == pytest.approx(0.1)
+
+
+def test_fair_between_jobs() -> None:
+    """Test that the calls of the jobs are granted in turn."""
+    scheduler = RateLimitScheduler(requests_per_minute=1, period_seconds=0.1)
+    scheduler.acquire(1)
+    granted = []
+
+    def run(job: str) -> None:
+        with trace(job):
+            scheduler.acquire(1)
+        granted.append(job)
+
+    threads = []
+    for job, nb_calls in (("long", 4), ("short", 2)):
+        for _ in range(nb_calls):
+            thread = threading.Thread(target=run, args=(job,))
+            thread.start()
+            threads.append(thread)
+        while len(scheduler._queues.get(job, ())) < nb_calls:
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join()
+    assert granted == ["long", "short", "long", "short", "long", "long"]
+
+
+def test_retry_with_backoff() -> None:
+    """Test that the retryable errors are retried and counted."""
+    scheduler = RateLimitScheduler(min_backoff_seconds=0.01)
+    nb_failures = [2]
+
+    def flaky() -> str:
+        if nb_failures[0]:
+            nb_failures[0] -= 1
+            raise ConnectionError
+        return "summary"
+
+    assert scheduler.call(flaky, 1, retry_delay=lambda _: 0.0) == "summary"
+    retries = REGISTRY.get_counter("llm_retries_total", error="ConnectionError")
+    assert retries == 2  # noqa: PLR2004
+
+
+def test_no_retry() -> None:
+    """Test that the errors which are not retryable and the last retry are raised."""
+    scheduler = RateLimitScheduler(max_retries=2, min_backoff_seconds=0.01)
+    calls = []
+
+    def failing() -> str:
+        calls.append(None)
+        raise ValueError
+
+    with pytest.raises(ValueError):  # noqa: PT011
+        scheduler.call(failing, 1, retry_delay=lambda _: None)
+    assert len(calls) == 1
+    with pytest.raises(ValueError):  # noqa: PT011
+        scheduler.call(failing, 1, retry_delay=lambda _: 0.0)
+    assert len(calls) == 4  # noqa: PLR2004
+
+
+def test_back_off_pauses_all_calls() -> None:
+    """Test that the calls wait for the end of the backoff, at least the given delay."""
+    scheduler = FakeClockScheduler(min_backoff_seconds=0.01)
+    scheduler.back_off(0, 0.2)
+    scheduler.acquire(1)
+    assert sum(scheduler._waits) == pytest.approx(0.2)
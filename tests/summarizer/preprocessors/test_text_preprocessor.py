@@ -0,0 +1,74 @@
+"""Test the TextPreprocessor class."""
+from langchain.schema.document import Document
+
+from summarizer.preprocessors import TextPreprocessor
+from summarizer.usage import track_usage
+
+
+def count_words(text: str) -> int:
+    """Return the number of words of a text."""
+    return len(text.split())
+
+
+def make_pages(*texts: str) -> list[Document]:
+    """Return the pages of a document."""
+    return [
+        Document(page_content=text, metadata={"source": "paper.pdf", "page": page_number})
+        for page_number, text in enumerate(texts)
+    ]
+
+
+def clean(preprocessor: TextPreprocessor, *texts: str) -> list[str]:
+    """Return the cleaned texts of the pages."""
+    pages = preprocessor.clean_pages(make_pages(*texts), count_words)
+    return [page.page_content for page in pages]
+
+
+def test_remove_boilerplate() -> None:
+    """Test that the headers and page numbers repeated on the pages are removed."""
+    sections = ("Introduction.\nMotivation.", "Method.\nModel.", "Results.\nAblation.")
+    pages = [
+        f"Under review at ICLR\n{section}\n{page_number}"
+        for page_number, section in enumerate(sections, start=1)
+    ]
+    assert clean(TextPreprocessor(), *pages) == [pages[0], sections[1], sections[2]]
+
+
+def test_keep_long_edge_lines() -> None:
+    """Test that long repeated lines are kept, they are content and not boilerplate."""
+    sentence = " ".join(["word"] * 30)
+    assert clean(TextPreprocessor(), sentence, sentence) == [sentence, sentence]
+
+
+def test_strip_bibliography() -> None:
+    """Test that the references and the following pages are removed."""
+    cleaned = clean(
+        TextPreprocessor(remove_boilerplate=False),
+        "Method.",
+        "Conclusion.\n\n7 References\n[1] A paper.",
+        "[2] Another paper.",
+        "Appendix A.",
+    )
+    assert cleaned == ["Method.", "Conclusion.", "", ""]
+
+
+def test_normalize_whitespace() -> None:
+    """Test that the hyphenated words are joined and the paragraphs kept."""
+    cleaned = clean(TextPreprocessor(), "A  self-\nattention   layer.\n\n\n\nResults  ")
+    assert cleaned == ["A selfattention layer.\n\nResults"]
+
+
+def test_disabled_steps() -> None:
+    """Test that a preprocessor with every step disabled keeps the pages."""
+    preprocessor = TextPreprocessor(
+        remove_boilerplate=False, strip_bibliography=False, normalize_whitespace=False
+    )
+    pages = ["Header\nText", "Header\nReferences\n[1] A  paper."]
+    assert clean(preprocessor, *pages) == pages
+
+
+def test_record_saved_tokens() -> None:
+    """Test that the tokens removed are recorded in the usage of the summary."""
+    with track_usage() as tracker:
+        clean(TextPreprocessor(), "Method.\nReferences\n[1] A paper.", "[2] Another paper.")
+    assert tracker.usage().saved_tokens == 7  # noqa: PLR2004
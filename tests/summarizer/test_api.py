@@ -0,0 +1,144 @@
+"""Test the summarizer api."""
+# ruff: noqa : SLF001
+import asyncio
+import importlib
+import json
+import logging
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from pydantic import PrivateAttr
+
+from summarizer import api
+from summarizer.chains import BaseChain
+from summarizer.chains.progress import get_progress_listener
+
+DOCKERFILE_PATH = Path("src/summarizer/Dockerfile")
+PAPER_URL = "https://arxiv.org/pdf/1706.03762.pdf"
+
+
+class FakeChain(BaseChain):
+    """Chain reporting a page loaded and returning a fake summary."""
+
+    def run_chain(self, pdf_url: str) -> str:
+        """Return a fake summary."""
+        listener = get_progress_listener()
+        if listener is not None:
+            listener.page_loaded()
+        return f"Summary of {pdf_url}"
+
+
+class EndlessChain(BaseChain):
+    """Chain reporting pages until its summary is cancelled."""
+
+    nb_pages: int = 0
+
+    _stopped: threading.Event = PrivateAttr(default_factory=threading.Event)
+
+    def run_chain(self, pdf_url: str) -> str:
+        """Report a page every few milliseconds until the listener raises."""
+        listener = get_progress_listener()
+        assert listener is not None
+        try:
+            while True:
+                listener.page_loaded()
+                self.nb_pages += 1
+                time.sleep(0.001)
+        finally:
+            self._stopped.set()
+
+
+@pytest.fixture()
+def client(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[TestClient]:
+    """Fixture a client of the api with a fake chain and a job queue without workers."""
+    monkeypatch.setattr(api, "JOBS_DB_PATH", tmp_path / "jobs.sqlite")
+    monkeypatch.setattr(api, "NB_JOB_WORKERS", 0)
+    monkeypatch.setattr(
+        api.ChainFactory, "build_chain_from_yaml", classmethod(lambda cls, path: FakeChain())
+    )
+    # The startup event replaces the handlers of the root logger.
+    handlers = list(logging.root.handlers)
+    with TestClient(api.app) as test_client:
+        yield test_client
+    logging.root.handlers = handlers
+
+
+def test_dockerfile_entrypoint_imports() -> None:
+    """Test that the ASGI app served by the container can be imported."""
+    entrypoint_line = next(
+        line
+        for line in DOCKERFILE_PATH.read_text(encoding="utf-8").splitlines()
+        if line.startswith("ENTRYPOINT")
+    )
+    entrypoint = json.loads(entrypoint_line.removeprefix("ENTRYPOINT"))
+    module_name, app_name = entrypoint[entrypoint.index("uvicorn") + 1].split(":")
+    app = getattr(importlib.import_module(module_name), app_name)
+    assert isinstance(app, FastAPI)
+
+
+def test_summarize(client: TestClient) -> None:
+    """Test that the summary of a paper is returned."""
+    response = client.post("/summarize", params={"paper_url": PAPER_URL})
+    assert response.status_code == httpx.codes.OK
+    assert response.json() == f"Summary of {PAPER_URL}"
+
+
+def test_submit_summary_job(client: TestClient) -> None:
+    """Test that a job is accepted, coalesced with a second submission and readable."""
+    response = client.post("/jobs", params={"paper_url": PAPER_URL})
+    assert response.status_code == httpx.codes.ACCEPTED
+    job = response.json()
+    assert job["paper_url"] == PAPER_URL
+    assert job["status"] == "pending"
+    assert client.post("/jobs", params={"paper_url": PAPER_URL}).json() == job
+    assert client.get("/jobs", params={"paper_url": PAPER_URL}).json() == job
+    assert client.get(f"/jobs/{job['job_id']}").json() == job
+
+
+def test_unknown_job(client: TestClient) -> None:
+    """Test that an unknown job id or paper is not found."""
+    assert client.get("/jobs/unknown").status_code == httpx.codes.NOT_FOUND
+    response = client.get("/jobs", params={"paper_url": PAPER_URL})
+    assert response.status_code == httpx.codes.NOT_FOUND
+
+
+def test_stream_summary(client: TestClient) -> None:
+    """Test that the progress and the summary are framed as server-sent events."""
+    response = client.post("/summarize/stream", params={"paper_url": PAPER_URL})
+    assert response.status_code == httpx.codes.OK
+    assert response.headers["Content-Type"].startswith("text/event-stream")
+    assert response.text.endswith("\n\n")
+    events = []
+    for frame in response.text.removesuffix("\n\n").split("\n\n"):
+        event_line, data_line = frame.split("\n")
+        assert event_line.startswith("event: ")
+        assert data_line.startswith("data: ")
+        events.append(
+            (event_line.removeprefix("event: "), json.loads(data_line.removeprefix("data: ")))
+        )
+    assert events[0] == ("page", {"nb_pages": 1})
+    assert [event for event, _ in events] == ["page", "done"]
+    assert events[-1][1]["summary"] == f"Summary of {PAPER_URL}"
+
+
+def test_stream_summary_disconnect(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the summary is cancelled once the client disconnects."""
+    chain = EndlessChain()
+    monkeypatch.setattr(api.app.state, "chain", chain, raising=False)
+
+    async def receive() -> dict[str, str]:
+        return {"type": "http.disconnect"}
+
+    async def run() -> list[str]:
+        request = Request({"type": "http", "method": "POST", "headers": []}, receive)
+        response = await api.stream_summary(request, PAPER_URL, None)
+        return [event async for event in response.body_iterator]
+
+    assert asyncio.run(run()) == []
+    assert chain._stopped.wait(timeout=10)
@@ -0,0 +1,32 @@
+"""Test the transactions of the SQLite stores."""
+from pathlib import Path
+
+import pytest
+
+from summarizer.sqlite_utils import transaction
+
+SCHEMA_QUERIES = ("CREATE TABLE IF NOT EXISTS items (name TEXT PRIMARY KEY)",)
+
+
+def test_transaction_commits(tmp_path: Path) -> None:
+    """Test that the database is created and the block committed."""
+    db_path = tmp_path / "store" / "items.sqlite"
+    with transaction(db_path, SCHEMA_QUERIES) as connection:
+        connection.execute("INSERT INTO items (name) VALUES ('a')")
+    with transaction(db_path, SCHEMA_QUERIES) as connection:
+        assert connection.execute("SELECT name FROM items").fetchall() == [("a",)]
+
+
+def test_transaction_rolls_back(tmp_path: Path) -> None:
+    """Test that a block raising is rolled back."""
+    db_path = tmp_path / "items.sqlite"
+
+    def insert_and_fail() -> None:
+        with transaction(db_path, SCHEMA_QUERIES) as connection:
+            connection.execute("INSERT INTO items (name) VALUES ('a')")
+            raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        insert_and_fail()
+    with transaction(db_path, SCHEMA_QUERIES) as connection:
+        assert connection.execute("SELECT name FROM items").fetchall() == []
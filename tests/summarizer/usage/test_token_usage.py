@@ -0,0 +1,54 @@
+"""Test the token usage tracking."""
+import pytest
+
+from summarizer.usage import (
+    TokenBudgetExceededError,
+    check_token_budget,
+    has_token_budget,
+    record_llm_call,
+    track_usage,
+    usage_label,
+)
+from telemetry import REGISTRY
+
+
+@pytest.fixture(autouse=True)
+def _reset_registry() -> None:
+    """Reset the metrics between tests."""
+    REGISTRY.reset()
+
+
+def test_track_usage() -> None:
+    """Test that the calls of the block are labelled and totalled."""
+    with track_usage() as tracker:
+        record_llm_call("gpt", 100, 10, cost_usd=0.1)
+        with usage_label("combine"):
+            record_llm_call("gpt", 50, 5, cost_usd=0.2)
+    record_llm_call("gpt", 1000, 100)
+    assert [call.label for call in tracker.calls] == ["predict", "combine"]
+    usage = tracker.usage()
+    assert (usage.nb_calls, usage.prompt_tokens, usage.completion_tokens) == (2, 150, 15)
+    assert usage.cost_usd == pytest.approx(0.3)
+
+
+def test_record_llm_call_metrics() -> None:
+    """Test that every call is counted in the metrics, with or without tracker."""
+    record_llm_call("gpt", 100, 10)
+    record_llm_call("gpt", 50, 5)
+    assert REGISTRY.get_counter("llm_calls_total", model="gpt") == 2  # noqa: PLR2004
+    nb_prompt_tokens = REGISTRY.get_counter("llm_tokens_total", model="gpt", kind="prompt")
+    assert nb_prompt_tokens == 150  # noqa: PLR2004
+
+
+def test_token_budget() -> None:
+    """Test that a prompt exceeding the remaining budget is refused."""
+    assert not has_token_budget()
+    check_token_budget(10**9)
+    with track_usage(token_budget=200):
+        assert has_token_budget()
+        record_llm_call("gpt", 100, 10)
+        check_token_budget(90)
+        with pytest.raises(TokenBudgetExceededError):
+            check_token_budget(91)
+        with pytest.raises(TokenBudgetExceededError):
+            record_llm_call("gpt", 100, 10)
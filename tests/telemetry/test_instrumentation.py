@@ -0,0 +1,27 @@
+"""Test the instrumentation of the apps."""
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from telemetry import MetricsRegistry, get_trace_id, instrument_app
+
+
+def test_instrument_app() -> None:
+    """Test that the requests are traced and exposed on /metrics."""
+    app = FastAPI()
+    registry = MetricsRegistry()
+    instrument_app(app, registry)
+
+    @app.get("/trace_id")
+    def read_trace_id() -> str:
+        return str(get_trace_id())
+
+    client = TestClient(app)
+    response = client.get("/trace_id", headers={"X-Trace-Id": "abc"})
+    assert response.json() == "abc"
+    assert response.headers["X-Trace-Id"] == "abc"
+    new_trace_response = client.get("/trace_id")
+    assert new_trace_response.json() == new_trace_response.headers["X-Trace-Id"] != "abc"
+
+    metrics = client.get("/metrics").text
+    assert 'http_requests_total{endpoint="read_trace_id",method="GET",status="200"} 2.0' in metrics
+    assert "http_request_duration_seconds_count" in metrics
@@ -0,0 +1,41 @@
+"""Test the metrics registry."""
+import pytest
+
+from telemetry import Histogram, MetricsRegistry
+
+
+class TestHistogram:
+    """This class tests the Histogram class."""
+
+    def test_observe(self) -> None:
+        """Test that values are counted in the first bucket whose bound they do not exceed."""
+        histogram = Histogram(buckets=(1.0, 2.0))
+        for value in (1.0, 2.0, 2.5):
+            histogram.observe(value)
+        assert histogram.bucket_counts == [1, 1, 1]
+        assert histogram.count == 3  # noqa: PLR2004
+        assert histogram.total == pytest.approx(5.5)
+
+
+class TestMetricsRegistry:
+    """This class tests the MetricsRegistry class."""
+
+    def test_metrics_by_labels(self) -> None:
+        """Test that the metrics are aggregated by name and labels."""
+        registry = MetricsRegistry()
+        registry.observe("duration_seconds", 0.2, span="fetch")
+        registry.observe("duration_seconds", 0.4, span="fetch")
+        registry.observe("duration_seconds", 1.0, span="parse")
+        registry.increment("spans_total", span="fetch")
+        registry.increment("spans_total", 2, span="fetch")
+        assert registry.get_histogram("duration_seconds", span="fetch").count == 2  # noqa: PLR2004
+        assert registry.get_histogram("duration_seconds", span="other").count == 0
+        assert registry.get_counter("spans_total", span="fetch") == 3  # noqa: PLR2004
+        registry.reset()
+        assert registry.get_counter("spans_total", span="fetch") == 0
+
+    def test_render_escapes_labels(self) -> None:
+        """Test that the label values are escaped."""
+        registry = MetricsRegistry()
+        registry.increment("requests_total", endpoint='say "hi"')
+        assert 'requests_total{endpoint="say \\"hi\\""} 1.0' in registry.render()
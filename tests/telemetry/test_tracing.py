@@ -0,0 +1,66 @@
+"""Test the spans and the trace ids."""
+import asyncio
+
+import pytest
+
+from telemetry import REGISTRY, get_trace_id, span, trace, trace_headers, traced, traced_iter
+
+
+@pytest.fixture(autouse=True)
+def _reset_registry() -> None:
+    """Start every test with empty metrics."""
+    REGISTRY.reset()
+
+
+def test_span_records_duration_and_status() -> None:
+    """Test that a span is recorded with its status, even when it fails."""
+    with span("operation"):
+        pass
+
+    def fail() -> None:
+        with span("operation"):
+            msg = "boom"
+            raise ValueError(msg)
+
+    with pytest.raises(ValueError, match="boom"):
+        fail()
+    histogram = REGISTRY.get_histogram("span_duration_seconds", span="operation")
+    assert histogram.count == 2  # noqa: PLR2004
+    assert REGISTRY.get_counter("spans_total", span="operation", status="ok") == 1
+    assert REGISTRY.get_counter("spans_total", span="operation", status="error") == 1
+
+
+def test_traced_functions() -> None:
+    """Test that sync and async functions are traced."""
+
+    @traced("sync")
+    def add(a: int, b: int) -> int:
+        return a + b
+
+    @traced("async")
+    async def async_add(a: int, b: int) -> int:
+        return a + b
+
+    assert add(1, 2) == 3  # noqa: PLR2004
+    assert asyncio.run(async_add(1, 2)) == 3  # noqa: PLR2004
+    assert REGISTRY.get_counter("spans_total", span="sync", status="ok") == 1
+    assert REGISTRY.get_counter("spans_total", span="async", status="ok") == 1
+
+
+def test_traced_iter() -> None:
+    """Test that every item of an iterator is timed."""
+    assert list(traced_iter("item", iter([1, 2, 3]))) == [1, 2, 3]
+    assert REGISTRY.get_histogram("span_duration_seconds", span="item").count == 3  # noqa: PLR2004
+
+
+def test_trace() -> None:
+    """Test that a trace id is set for the block and propagated in the headers."""
+    assert get_trace_id() is None
+    assert trace_headers() == {}
+    with trace("abc") as trace_id:
+        assert trace_id == "abc"
+        assert trace_headers() == {"X-Trace-Id": "abc"}
+    with trace() as new_trace_id:
+        assert new_trace_id
+        assert get_trace_id() == new_trace_id
+    assert get_trace_id() is None